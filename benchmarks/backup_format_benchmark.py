@@ -0,0 +1,74 @@
+"""
+Benchmark for the backup archive formats.
+Archives a real world folder in every backup format (zip_deflate, zip_store, tar_zstd, tar_xz) the way the automation
+does, then restores it with extract_archive_folder, and reports the write and restore throughput and the compression
+ratio of each, so backup_format can be chosen from measurements on the machine that runs the server.
+The world is read once before the first format so every format starts from a warm page cache. Point it at a copy of
+the world, or at the world of a stopped server, so it does not change while it is being read.
+
+Usage (from the repository root):
+    python benchmarks/backup_format_benchmark.py <world_folder> [workers] [scratch_folder]
+"""
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+from time import perf_counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from utils import ZIP_DEFLATE, ZIP_STORE, TAR_ZSTD, TAR_XZ, ZSTD_AVAILABLE, make_backup_archive, extract_archive_folder
+
+
+# Constants
+DEFAULT_WORKERS = os.cpu_count() or 1
+COMPRESSION_LEVEL = 6       # The default compression_level, the deflate level for zips and the xz preset
+ZSTD_LEVEL = 3              # The default zstd_level
+MEGABYTE = 1024 * 1024
+
+
+def world_size(world_dir):
+    """Read every file of the world once, warming the page cache, and return their total size in bytes."""
+    total = 0
+    for root, _, names in os.walk(world_dir):
+        for name in names:
+            with open(Path(root) / name, "rb") as f:
+                while chunk := f.read(MEGABYTE):
+                    total += len(chunk)
+    return total
+
+
+def run(backup_format, world_dir, scratch_dir, workers):
+    """Archive and restore the world in one format, returning the seconds taken by each and the archive's size."""
+    start = perf_counter()
+    archive_path = make_backup_archive(scratch_dir / "backup", world_dir.parent, world_dir.name, backup_format, workers, COMPRESSION_LEVEL, ZSTD_LEVEL)
+    written = perf_counter()
+    extract_archive_folder(archive_path, scratch_dir / "restore")
+    restored = perf_counter()
+    archive_size = os.path.getsize(archive_path)
+    # Leave the scratch folder empty for the next format
+    os.remove(archive_path)
+    shutil.rmtree(scratch_dir / "restore")
+    return written - start, restored - written, archive_size
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__.strip())
+        sys.exit(1)
+    world_dir = Path(sys.argv[1]).resolve()
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_WORKERS
+    scratch_parent = sys.argv[3] if len(sys.argv) > 3 else None
+
+    size = world_size(world_dir)
+    print(f"World: {world_dir.name}, {size / MEGABYTE:.1f}MB, {workers} workers")
+    formats = (ZIP_DEFLATE, ZIP_STORE, TAR_ZSTD, TAR_XZ)
+    with tempfile.TemporaryDirectory(dir=scratch_parent) as scratch:
+        for backup_format in formats:
+            if backup_format == TAR_ZSTD and not ZSTD_AVAILABLE:
+                print(f"{backup_format:12} skipped, the zstandard package is not installed")
+                continue
+            write_seconds, restore_seconds, archive_size = run(backup_format, world_dir, Path(scratch), workers)
+            print(f"{backup_format:12} write {size / MEGABYTE / write_seconds:8.1f} MB/s ({write_seconds:.2f}s)"
+                  f"  restore {size / MEGABYTE / restore_seconds:8.1f} MB/s ({restore_seconds:.2f}s)"
+                  f"  archive {archive_size / MEGABYTE:8.1f}MB  ratio {size / max(archive_size, 1):.2f}x")
@@ -0,0 +1,94 @@
+"""
+Microbenchmark for log line parsing and colouring.
+Measures the per-line cost of the original process_line/add_colour pair, which compiled both regular expressions and
+called datetime.now() twice for every line, against the precompiled fast path in format_helper, where the CLI reads the
+timestamp and level straight from the LogPrefix instead of parsing the prefix again.
+
+Usage (from the repository root):
+    python benchmarks/format_benchmark.py [line_count]
+"""
+import os
+import re
+import sys
+from datetime import datetime
+from time import perf_counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from utils import process_line, get_prefix, LogLevel
+from cli.cli import add_colour
+
+
+# Constants
+DEFAULT_LINE_COUNT = 200_000
+# A mix of server lines, including one without a timestamp that takes the RAW path
+SAMPLE_LINES = [
+    "[2026-01-01 12:00:00:000 INFO] [Chat] <fred_the_frog> spam spam spam spam spam spam spam spam",
+    "[2026-01-01 12:00:00,001 INFO] Player connected: fred_the_frog, xuid: 2535412345678901",
+    "[2026-01-01 12:00:00:002 WARN] Level storage is being accessed, please wait",
+    "Data saved. Files are now ready to be copied.",
+]
+
+
+def old_get_timestamp():
+    """The original get_timestamp."""
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S") + f":{datetime.now().microsecond // 1000:03d}"
+
+
+def old_process_line(line):
+    """The original process_line, compiling its pattern on every call."""
+    pattern = re.compile(r"\[(?P<timestamp>\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}[:,]\d{3}) (?P<level>\w+)\](?: (?P<message>.*))?")
+    match = pattern.match(line)
+    if match:
+        timestamp = match.group("timestamp").replace(",", ":")
+        level = match.group("level")
+        spacing = " " * (max(9 - len(level), 1))
+        return [f"{timestamp} {level}{spacing}", match.group("message") or ""]
+    return [f"{old_get_timestamp()} RAW      ", line]
+
+
+def old_add_colour(prefix, message):
+    """The original add_colour, parsing the prefix again with a pattern compiled on every call."""
+    pattern = re.compile(r"(?P<timestamp>\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}[:,]\d{3}) (?P<level>\w+)")
+    match = pattern.match(prefix)
+    if match:
+        timestamp = match.group("timestamp")
+        level = match.group("level")
+        match level:
+            case "RAW":
+                ansi_code = "\033[32m"
+            case "INFO":
+                ansi_code = "\033[34m"
+            case "WARN":
+                ansi_code = "\033[33m"
+            case _:
+                ansi_code = "\033[33m"
+        spacing = " " * (max(9 - len(level), 1))
+        return f"\033[1;90m{timestamp} {ansi_code}{level}\033[0m{spacing}{message}"
+    return f"Failed to format line: {prefix}{message}"
+
+
+def run(parse, colour, prefix, count):
+    """Parse and colour 'count' lines, then build 'count' prefixes, returning the seconds taken by each step."""
+    lines = (SAMPLE_LINES * (count // len(SAMPLE_LINES) + 1))[:count]
+    start = perf_counter()
+    records = [parse(line) for line in lines]
+    parsed = perf_counter()
+    for timestamp, message in records:
+        colour(timestamp, message)
+    coloured = perf_counter()
+    for _ in range(count):
+        prefix()
+    prefixed = perf_counter()
+    return parsed - start, coloured - parsed, prefixed - coloured
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_LINE_COUNT
+    implementations = (
+        ("before", old_process_line, old_add_colour, lambda: f"{old_get_timestamp()} INFO     "),
+        ("after", process_line, add_colour, lambda: get_prefix(LogLevel.INFO)),
+    )
+    for name, parse, colour, prefix in implementations:
+        timings = run(parse, colour, prefix, count)
+        per_line = "  ".join(f"{step} {seconds / count * 1e9:,.0f} ns/line" for step, seconds in zip(("parse", "colour", "prefix"), timings))
+        print(f"{name:7} {per_line}")
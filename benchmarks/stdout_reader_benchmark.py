@@ -0,0 +1,85 @@
+"""
+Benchmark for the server stdout reader.
+Spawns a child process that floods stdout with Bedrock-style log lines (like a command spamming chat) and measures
+how many lines per second are read, formatted and broadcast by the original line-by-line text reader, and by the
+batched and line-at-a-time binary readers used by ServerRunner (stdout_reader_mode "batch" and "line").
+
+Usage (from the repository root):
+    python benchmarks/stdout_reader_benchmark.py [line_count]
+"""
+import os
+import subprocess
+import sys
+from time import perf_counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from utils import LineBroadcaster, process_line, read_line_batches, read_lines
+
+
+# Constants
+DEFAULT_LINE_COUNT = 200_000
+# Child process that prints a flood of chat lines as fast as it can
+FLOOD_SCRIPT = """
+import sys
+line = "[2026-01-01 12:00:00:000 INFO] [Chat] <fred_the_frog> spam spam spam spam spam spam spam spam\\n"
+sys.stdout.write(line * {count})
+sys.stdout.flush()
+"""
+
+
+def spawn_flood(count, text):
+    """Start the child process flooding stdout with 'count' lines, in text (line-buffered) or binary mode."""
+    if text:
+        return subprocess.Popen([sys.executable, "-c", FLOOD_SCRIPT.format(count=count)], stdout=subprocess.PIPE, universal_newlines=True, bufsize=1)
+    return subprocess.Popen([sys.executable, "-c", FLOOD_SCRIPT.format(count=count)], stdout=subprocess.PIPE, bufsize=0)
+
+
+def run_line_reader(count):
+    """The original reader: iterate a text-mode pipe, strip each line twice, format it and publish it on its own."""
+    broadcaster = LineBroadcaster()
+    received = []
+    broadcaster.subscribe(lambda timestamp, line: received.append(line))
+    process = spawn_flood(count, text=True)
+    start = perf_counter()
+    for line in process.stdout:
+        line = line.rstrip()
+        timestamp, message = process_line(line.rstrip())
+        broadcaster.publish(timestamp, message)
+    elapsed = perf_counter() - start
+    process.wait()
+    return len(received), elapsed
+
+
+def run_binary_line_reader(count):
+    """The line reader used by stdout_reader_mode="line": buffered reads of the binary pipe, one publish per line."""
+    broadcaster = LineBroadcaster()
+    received = []
+    broadcaster.subscribe(lambda timestamp, line: received.append(line))
+    process = spawn_flood(count, text=False)
+    start = perf_counter()
+    for lines in read_lines(process.stdout):
+        broadcaster.publish(*process_line(lines[0]))
+    elapsed = perf_counter() - start
+    process.wait()
+    return len(received), elapsed
+
+
+def run_batch_reader(count):
+    """The batched reader: large os.read calls, bulk split and decode, and one publish per batch."""
+    broadcaster = LineBroadcaster()
+    received = []
+    broadcaster.subscribe(lambda lines: received.extend(lines), batch=True)
+    process = spawn_flood(count, text=False)
+    start = perf_counter()
+    for lines in read_line_batches(process.stdout.fileno()):
+        broadcaster.publish_batch([process_line(line) for line in lines])
+    elapsed = perf_counter() - start
+    process.wait()
+    return len(received), elapsed
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_LINE_COUNT
+    for name, function in (("line reader (before)", run_line_reader), ("line reader (binary)", run_binary_line_reader), ("batch reader (after)", run_batch_reader)):
+        lines, elapsed = function(count)
+        print(f"{name:22} {lines} lines in {elapsed:.3f}s  {lines / elapsed:,.0f} lines/s")
@@ -1,10 +1,15 @@
-from utils import BroadcastHandler, LineBroadcaster
+from utils import BroadcastHandler, LineBroadcaster, parse_log_time
 import asyncio
 import discord
-import logging
+import io
+import re
 from discord.ext import commands
 
 
+# Constants
+MESSAGE_LIMIT = 2000    # Discord's message length limit, longer log results are sent as a file
+
+
 ## Command to check if the user has admin privileges
 def is_admin(admin_ids):
     async def predicate(ctx):
@@ -32,11 +37,9 @@ class DiscordBot:
         self.token = config.bot_token
         self.server = server
         self.automation = automation
-        self.broadcaster = LineBroadcaster()
+        self.broadcaster = LineBroadcaster("discord")
         # Create a custom broadcast handler for logging
         self.broadcast_handler = BroadcastHandler(self.broadcaster, self.automation.logger)
-        # Create a custom log formatter for logging
-        self.log_formatter = logging.Formatter('[%(asctime)s %(levelname)s] %(message)s')
         intents = discord.Intents.default()
         intents.message_content = True
         self.bot = commands.Bot(command_prefix="!", intents=intents, help_command=None)
@@ -66,7 +69,8 @@ class DiscordBot:
                     "`!start` — Start the server.",
                     "`!restart` — Restart the server.",
                     "`!save` — Save the world while the server is still running.",
-                    "`!check_for_update` — Checks for an update for the server software."
+                    "`!check_for_update` — Checks for an update for the server software.",
+                    "`!logs <start> <end> [pattern]` — Show logged lines between two times.",
                     "`!difficulty` — Set the difficulty.",
                     "`!coords` — Set coordinates.",
                 ]),
@@ -77,7 +81,8 @@ class DiscordBot:
                 name="General Commands",
                 value="\n".join([
                     "`!help` — Show this message.",
-                    "`!online` — Show who is online."
+                    "`!online` — Show who is online.",
+                    "`!status` — Show the server's CPU, memory and disk use."
                 ]),
                 inline=False
             )
@@ -114,6 +119,27 @@ class DiscordBot:
         async def discord_check_for_update(ctx):
             print("Check for update command invoked")
 
+        @is_admin(self.admin_list)
+        @self.bot.command(name="logs")
+        async def discord_logs(ctx, start: str = None, end: str = None, *, pattern: str = None):
+            if start is None or end is None:
+                await ctx.send("Usage: `!logs <start> <end> [pattern]` where times are YYYY-MM-DD, YYYY-MM-DDTHH:MM, HH:MM, today or now.")
+                return
+            try:
+                start_time = parse_log_time(start)
+                end_time = parse_log_time(end, end_of_range=True)
+                # Searching reads files, keep it off the event loop
+                lines, truncated = await asyncio.to_thread(self.automation.search_logs, start_time, end_time, pattern)
+            except (ValueError, re.error) as e:
+                await ctx.send(f"Invalid log search: {e}")
+                return
+            summary = f"{len(lines)} matching line(s)" + (", showing the first ones only." if truncated else ".")
+            text = "\n".join(lines)
+            if len(text) + len(summary) + 10 <= MESSAGE_LIMIT:
+                await ctx.send(f"{summary}\n```{text}```" if lines else summary)
+            else:
+                await ctx.send(summary, file=discord.File(io.BytesIO(text.encode("utf-8")), filename="logs.txt"))
+
         @is_admin(self.admin_list)
         @self.bot.command(name="difficulty")
         async def discord_difficulty(ctx):
@@ -125,7 +151,13 @@ class DiscordBot:
 
         @self.bot.command(name="online")
         async def discord_online(ctx):
-            print("Online command invoked")
+            # Read from the automation's player index, no command is sent to the server
+            await ctx.send(self.automation.describe_online_players())
+
+        @self.bot.command(name="status")
+        async def discord_status(ctx):
+            # Read from the sampler's history, nothing is read from /proc for the command
+            await ctx.send(self.automation.describe_stats())
 
         @self.bot.event
         async def on_command_error(ctx, error):
@@ -133,7 +165,7 @@ class DiscordBot:
                 await ctx.send("You do not have the permissions to use this command.")
 
         # Start the discord bot with custom logging
-        self.bot.run(self.token, log_handler=self.broadcast_handler, log_formatter=self.log_formatter)
+        self.bot.run(self.token, log_handler=self.broadcast_handler)
 
     def discord_bot_stop(self):
         """Stop the Discord bot."""
@@ -1,40 +1,38 @@
 from prompt_toolkit import prompt, print_formatted_text, ANSI, PromptSession
 from prompt_toolkit.patch_stdout import patch_stdout
-from utils import get_timestamp
+from utils import get_timestamp, OverflowPolicy, LogPrefix, PREFIX_PATTERN, parse_log_time
 import re
 
 
+# ANSI color codes based on log level
+LEVEL_COLOURS = {
+    "RAW": "\033[32m",         # Green for raw
+    "DEBUG": "\033[36m",       # Cyan for debug
+    "INFO": "\033[34m",        # Blue for info
+    "WARN": "\033[33m",        # Yellow for warning
+    "ERROR": "\033[31m",       # Red for error
+    "CRITICAL": "\033[1;31m",  # Bold red for critical
+}
+DEFAULT_COLOUR = "\033[33m"    # Default to yellow for unrecognized levels
+
+
 def add_colour(prefix, message):
     """Process a line from the server."""
-    # Regex to parse log lines
-    pattern = re.compile(r"(?P<timestamp>\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}[:,]\d{3}) (?P<level>\w+)")
-    match = pattern.match(prefix)
-    if match:
-        timestamp = match.group("timestamp")
-        level = match.group("level")
-        # ANSI color codes based on log level
-        match level:
-            case "RAW":
-                ansi_code = "\033[32m"  # Green for raw
-            case "DEBUG":
-                ansi_code = "\033[36m"  # Cyan for debug
-            case "INFO":
-                ansi_code = "\033[34m"  # Blue for info
-            case "WARN":
-                ansi_code = "\033[33m"  # Yellow for warning
-            case "ERROR":
-                ansi_code = "\033[31m"  # Red for error
-            case "CRITICAL":
-                ansi_code = "\033[1;31m"  # Bold red for critical
-            case _:
-                ansi_code = "\033[33m"  # Default to yellow for unrecognized levels
-        # Calculate spacing for alignment
-        spacing = " " * (max(9 - len(level), 1))
-        # Return the formatted line with ANSI codes
-        return f"\033[1;90m{timestamp} {ansi_code}{level}\033[0m{spacing}{message}"
+    # Prefixes made by process_line and get_prefix already carry their parts, only plain strings need parsing
+    if isinstance(prefix, LogPrefix):
+        timestamp = prefix.timestamp
+        level = prefix.level
     else:
-        # If the line's timestamp fails the regular expression, return it with an error
-        return f"Failed to format line: {prefix}{message}"
+        match = PREFIX_PATTERN.match(prefix)
+        if not match:
+            # If the line's timestamp fails the regular expression, return it with an error
+            return f"Failed to format line: {prefix}{message}"
+        timestamp, level = match.group("timestamp", "level")
+    ansi_code = LEVEL_COLOURS.get(level, DEFAULT_COLOUR)
+    # Calculate spacing for alignment
+    spacing = " " * (max(9 - len(level), 1))
+    # Return the formatted line with ANSI codes
+    return f"\033[1;90m{timestamp} {ansi_code}{level}\033[0m{spacing}{message}"
 
 
 class CommandLineInterface:
@@ -57,7 +55,8 @@ class CommandLineInterface:
         self.discord_bot = config.discord_bot
         self.runner = runner
         # Subscribe to the stdout broadcaster and unexpected shutdown broadcaster
-        self.runner.stdout_broadcaster.subscribe(self.handle_server_output)
+        # Server output is printed in batches on its own thread so a slow terminal never stalls reading the server's stdout; batches are merged rather than lost if it falls behind
+        self.runner.stdout_broadcaster.subscribe(self.handle_server_output, asynchronous=True, overflow=OverflowPolicy.COALESCE, batch=True)
         self.automation = automation
         self.automation.automation_output_broadcaster.subscribe(self.handle_automation_ouput)
         self.bot = bot
@@ -69,10 +68,10 @@ class CommandLineInterface:
         self.running = True
 
 
-    def handle_server_output(self, timestamp, line):
-        """Handle server output lines by printing them to the CLI."""
+    def handle_server_output(self, lines):
+        """Handle a batch of server output lines by printing them to the CLI in one call."""
         if self.running:
-            print_formatted_text(ANSI(add_colour(timestamp, line)))
+            print_formatted_text(ANSI("\n".join(add_colour(timestamp, line) for timestamp, line in lines)))
 
 
     def handle_automation_ouput(self, timestamp, line):
@@ -146,8 +145,19 @@ class CommandLineInterface:
                                    Unprotect backup(s) from automatic deletion
                     :switch <backup_name>
                                    Switch the world to the specified backup
+                    :verify [backup_name | latest | all]
+                                   Show the verification status of backups, or verify backup(s) now
                     :check         Check for Bedrock server updates
                     :update        Update the Bedrock server to the latest version
+                    :rollback      Swap back to the install replaced by the last update
+                    :jobs [cancel <job> | run <job>]
+                                   Show the scheduled jobs and when they next run, or cancel or run one now
+                    :online        Show the players currently online
+                    :stats         Show the server's CPU, memory, disk I/O, threads and open files
+                    :queues        Show the output dispatch queue counters
+                    :logs <start> <end> [pattern]
+                                   Show logged lines between two times (YYYY-MM-DD, YYYY-MM-DDTHH:MM, HH:MM, today or now),
+                                   optionally only those matching a case-insensitive regular expression
                     :exit, :quit   Exit the CLI (and stop the server if running)
                     """
                     self.just_print(help_text.strip())
@@ -196,6 +206,13 @@ class CommandLineInterface:
                         self.automation.unmark_backup(backup_identifier)
                     else:
                         self.just_print("Usage: :unmark <backup_name | latest | YYYY-MM-DD>")
+                # Backup verification
+                elif cmd == 'verify' or cmd.startswith('verify '):
+                    args = cmd.split(maxsplit=1)
+                    if len(args) == 2:
+                        self.automation.verify_backups(args[1].strip())
+                    else:
+                        self.just_print(self.automation.describe_verification())
                 # Switch to backup
                 elif cmd.startswith('switch'):
                     if self.runner.is_running():
@@ -214,11 +231,67 @@ class CommandLineInterface:
                     self.log_print(result)
                 # Update
                 elif cmd == 'update':
-                    if self.runner.is_running():
+                    # Staged updates are built while the server runs, and only stop it to swap installs
+                    if self.runner.is_running() and self.config.update_mode != "staged":
                         self.just_print("Cannot update the server while it is running, please stop the server first.")
                         continue
                     self.log_print("Updating Bedrock server to the latest version...")
                     self.automation.update_server()
+                # Rollback
+                elif cmd == 'rollback':
+                    self.log_print("Rolling back to the previous Bedrock server install...")
+                    self.automation.rollback_server()
+                # Scheduled jobs
+                elif cmd == 'jobs' or cmd.startswith('jobs '):
+                    args = cmd.split()
+                    if len(args) == 1:
+                        self.just_print(self.automation.describe_jobs())
+                    elif len(args) == 3 and args[1] == 'cancel':
+                        if self.automation.scheduler.cancel(args[2]):
+                            self.log_print(f"Cancelled scheduled job '{args[2]}'.")
+                        else:
+                            self.just_print(f"No scheduled job named '{args[2]}'.")
+                    elif len(args) == 3 and args[1] == 'run':
+                        if self.automation.scheduler.run_now(args[2]):
+                            self.log_print(f"Running scheduled job '{args[2]}' now.")
+                        else:
+                            self.just_print(f"No scheduled job named '{args[2]}'.")
+                    else:
+                        self.just_print("Usage: :jobs [cancel <job> | run <job>]")
+                # Online players
+                elif cmd == 'online':
+                    self.just_print(self.automation.describe_online_players())
+                # Resource use of the server process, from the sampler's history
+                elif cmd == 'stats':
+                    self.just_print(self.automation.describe_stats())
+                # Dispatch queue counters
+                elif cmd == 'queues':
+                    stats = self.runner.stdout_broadcaster.dispatch_stats() + self.automation.automation_output_broadcaster.dispatch_stats()
+                    if stats:
+                        for queue in stats:
+                            self.just_print(f"{queue['subscriber']}: depth {queue['depth']}/{queue['max_size']} (high-water {queue['high_water']}), delivered {queue['delivered']}, dropped {queue['dropped']}, coalesced {queue['coalesced']}, errors {queue['errors']}")
+                    else:
+                        self.just_print("No asynchronous subscribers.")
+                # Search logs
+                elif cmd == 'logs' or cmd.startswith('logs '):
+                    # Split the original input so the pattern keeps its spaces
+                    args = input_text[1:].strip().split(maxsplit=3)
+                    if len(args) < 3:
+                        self.just_print("Usage: :logs <start> <end> [pattern]")
+                        continue
+                    try:
+                        start = parse_log_time(args[1])
+                        end = parse_log_time(args[2], end_of_range=True)
+                        lines, truncated = self.automation.search_logs(start, end, args[3] if len(args) == 4 else None)
+                    except (ValueError, re.error) as e:
+                        self.just_print(f"Invalid log search: {e}")
+                        continue
+                    if lines:
+                        print_formatted_text("\n".join(lines))
+                    if truncated:
+                        self.just_print(f"Showing the first {len(lines)} matching lines, narrow the time range or pattern to see the rest.")
+                    else:
+                        self.just_print(f"{len(lines)} matching line(s).")
                 # Exit
                 elif cmd == 'exit' or cmd == 'quit':
                     # If the bot is not running or is fully started or fully stopped, allow exit
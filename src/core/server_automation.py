@@ -1,12 +1,14 @@
-import requests
-from utils import BufferedDailyLogger, LineBroadcaster, get_prefix, LogLevel, UpdateInfo, get_bedrock_update_info
+from utils import BufferedDailyLogger, LineBroadcaster, get_prefix, LogLevel, UpdateInfo, get_bedrock_update_info, BackupRepository, BackupCatalog, BackupVerifier, create_link_snapshot, link_or_copy_tree, extract_archive_folder, swap_directory, make_backup_archive, ParallelZipWriter, copy_file, copy_tree, describe_copy_stats, LogArchive, ArtifactCache, ProtectedPaths, plan_update, load_install_manifest, load_installed_version, save_install_manifest, INSTALL_MANIFEST_NAME, stage_install, swap_install, REGISTRY, MetricsServer, ServerEvent, VersionDetected, ServerStarted, CrashHint, ErrorLogged, PlayerConnected, PlayerDisconnected, Scheduler, IntervalTrigger, CronTrigger, OnceTrigger, RUN_ONCE, SKIP, MaintenanceWorkers
 from datetime import datetime, timedelta
 from pathlib import Path
-from time import sleep, strftime, time
+from time import sleep, strftime, time, perf_counter
 import threading
 import shutil
+import os
 import zipfile
-from collections import deque
+from collections import Counter
+from dataclasses import dataclass
+from itertools import islice
 import re
 
 # Constants
@@ -17,19 +19,58 @@ ONLINE_BACKUP_PREFIX = "online_world_backup"    # eg. "online_world_backup_YYYY-
 TEMPORARY_BACKUP_PREFIX = ".tmp"                # eg. ".tmp_offline_world_backup_YYYY-MM-DD_HH-MM-SS"
 PROTECTED_BACKUP_PREFIX = "protected"           # eg. "protected_offline_world_backup_YYYY-MM-DD_HH-MM-SS"
 BACKUP_TIMESTAMP_FORMAT = "%Y-%m-%d_%H-%M-%S"
-DEQUE_MAX_LENGTH = 100
-SUCCESS_PATTERN = r"Data saved. Files are now ready to be copied."
-FAIL_PATTERN = r"A previous save has not been completed."
+SUCCESS_PATTERN = re.compile(r"Data saved. Files are now ready to be copied.", re.IGNORECASE)
+FAIL_PATTERN = re.compile(r"A previous save has not been completed.", re.IGNORECASE)
+FILE_LIST_PATTERN = re.compile(r":\d+")   # eg. "Bedrock level/db/000005.ldb:1234, Bedrock level/level.dat:5678"
 SAVE_QUERY_TIMEOUT_SECONDS = 10
+SAVE_QUERY_RETRY_SECONDS = 0.1
 WORLDS_FOLDER_NAME = "worlds"
+MANIFEST_SUFFIX = ".manifest"                   # eg. "online_world_backup_YYYY-MM-DD_HH-MM-SS.manifest"
 VERSION_REGEX = r"bedrock-server-([0-9.]+)\.zip"
-DOWNLOAD_CONNECT_TIMEOUT_SECONDS = 10
-DOWNLOAD_READ_TIMEOUT_SECONDS = 300
 DOWNLOAD_CHUNK_SIZE = 1024 * 1024 # 1MB (in binary)
+STAGED_INSTALL_SUFFIX = ".staged"       # eg. "server.staged", the new version being built beside the live install
+PREVIOUS_INSTALL_SUFFIX = ".previous"   # eg. "server.previous", the install replaced by the last update, kept for rollback
+LOG_SEARCH_LIMIT = 1000         # Maximum number of lines returned by a log search
+VERIFICATION_CHECK_MINUTES = 60 # How often backups are checked for being due another verification
+PRUNE_INTERVAL_HOURS = 1        # How often backups older than backup_duration are pruned
+UPDATE_CHECK_JITTER_MINUTES = 15    # Spreads update checks out so they do not all hit the API at the same time
+BACKUP_JITTER_SECONDS = 30
+BACKUP_RETRY_MINUTES = 5        # How often a backup postponed by load is retried until its deadline
+LOAD_SAMPLE_SECONDS = 5         # Window the server's CPU use is measured over before a backup
+LOAD_LATENCY_TIMEOUT_SECONDS = 5    # A "list" command not answered within this counts as the latency limit exceeded
+LIST_RESPONSE_PATTERN = re.compile(r"There are \d+/\d+ players online")
+BYTES_PER_MEGABYTE = 1024 * 1024
+MAINTENANCE_WORKERS = 2         # Maintenance tasks that can run beside the server at the same time (eg. pruning during a backup)
+SCHEDULER_WORKERS = 2           # Jobs that can run at the same time (eg. a backup while the update check runs)
 SERVER_BACKUP_PREFIX = "server_backup"
+WORLD_BACKUP_KINDS = ("offline", "online")     # Catalog kinds that can be listed, marked and pruned
+BACKUP_KINDS = ("offline", "online", "server")
+# Metrics of backups, updates and crashes
+BACKUP_STAGE_SECONDS = REGISTRY.histogram("backup_stage_seconds", "Time taken by each stage of a backup (hold, copy, compress, stream, prune).", ("stage",))
+UNEXPECTED_SHUTDOWNS = REGISTRY.counter("bedrock_unexpected_shutdowns_total", "Times bedrock_server exited without being asked to.")
+UPDATE_DOWNLOAD_BYTES = REGISTRY.counter("update_download_bytes_total", "Bytes of server updates downloaded.")
+UPDATE_DOWNLOAD_SECONDS = REGISTRY.histogram("update_download_seconds", "Time taken to download a server update.")
+UPDATE_DOWNLOAD_THROUGHPUT = REGISTRY.gauge("update_download_bytes_per_second", "Average throughput of the last server update download.")
+BACKUPS_DEFERRED = REGISTRY.counter("backups_deferred_total", "Periodic online backups postponed because the server was busy.")
+MEMORY_RESTARTS = REGISTRY.counter("bedrock_memory_restarts_total", "Graceful restarts triggered by bedrock_server's memory passing restart_rss_limit.")
+UPDATE_SWAP_SECONDS = REGISTRY.histogram("update_swap_seconds", "Time the server was stopped to swap in a staged install or roll back.")
 WORLDS_FOLDER_NAME = "worlds"
 
 
+@dataclass
+class OnlinePlayer:
+    """
+    Dataclass holding a player who is currently connected.
+    Attributes:
+        name (str): The player's name.
+        xuid (str): The player's Xbox user ID, empty if the server did not report one.
+        connected_at (datetime): When the player connected.
+    """
+    name: str
+    xuid: str
+    connected_at: datetime
+
+
 class ServerAutomation:
     def __init__(self, config, runner):
         self.config = config
@@ -39,19 +80,66 @@ class ServerAutomation:
         self.backup_duration = config.backup_duration
         self.crash_limit = config.crash_limit
         self.restart_time = config.restart_time
+        self.online_backup_mode = config.online_backup_mode
+        self.offline_backup_mode = config.offline_backup_mode
+        self.compression_workers = config.compression_workers
+        self.compression_level = config.compression_level
         self.runner = runner
         # Subscribe to the stdout broadcaster and unexpected shutdown broadcaster
-        self.runner.stdout_broadcaster.subscribe(self.handle_server_output)
+        self.runner.stdout_broadcaster.subscribe(self.handle_server_output_batch, batch=True)
         self.runner.unexpected_shutdown_broadcaster.subscribe(self.handle_unexpected_shutdown)
+        # Subscribe to the server events the automation acts on
+        self.runner.events.subscribe(VersionDetected, self.handle_version_detected)
+        self.runner.events.subscribe(ServerStarted, self.handle_server_started)
+        self.runner.events.subscribe(CrashHint, self.handle_crash_hint)
+        self.runner.events.subscribe(ErrorLogged, self.handle_crash_hint)
+        # Keep the online player index up to date, and empty it whenever the server stops
+        self.runner.events.subscribe(PlayerConnected, self.handle_player_connected)
+        self.runner.events.subscribe(PlayerDisconnected, self.handle_player_disconnected)
+        self.runner.shutdown_broadcaster.subscribe(self.clear_online_players)
+        # Watch the server's memory for restart_rss_limit, on its own thread so a held runner lock never delays sampling
+        self.runner.stats_broadcaster.subscribe(self.handle_process_sample, asynchronous=True)
         # Create a broadcaster to broadcast outputs to the CLI
-        self.automation_output_broadcaster = LineBroadcaster()
+        self.automation_output_broadcaster = LineBroadcaster("automation_output")
         # Create logger
-        self.logger = BufferedDailyLogger(self.config.log_folder)
+        self.logger = BufferedDailyLogger(self.config.log_folder, self.config.log_flush_bytes, self.config.log_flush_interval, self.config.log_fsync)
+        # Compress each day's log once the logger has moved on to the next day, on the archive's own thread
+        self.log_archive = LogArchive(self.config.log_folder)
+        self._archive_lock = threading.Lock()
+        self.logger.rotation_broadcaster.subscribe(self.archive_logs, asynchronous=True)
         # Create a list of crashes
         self.recent_crashes = []
-        # Recent lines buffer for monitoring server output
-        self._recent_lines = deque(maxlen=DEQUE_MAX_LENGTH)
         self.current_version = None
+        self.last_crash_hint = None
+        # Players currently online, keyed by lowercase name
+        self._online_players = {}
+        self._players_lock = threading.Lock()
+        # Content-addressed store used when online_backup_mode is "repository"
+        self.repository = BackupRepository(self.backup_folder)
+        # Index of every backup, so listing, marking and pruning never scan the backup folder
+        self.catalog = BackupCatalog(self.backup_folder)
+        # Reads new backups back in the background, and older ones again every verify_interval hours
+        # Keep maintenance work off the CPUs the server is pinned to, if any are left for it
+        maintenance_cpus = None
+        if config.server_cpus and hasattr(os, "sched_getaffinity"):
+            maintenance_cpus = (os.sched_getaffinity(0) - set(config.server_cpus)) or None
+        # Runs the copying, compression, pruning and staging done beside the server at maintenance_priority
+        self.maintenance = MaintenanceWorkers(MAINTENANCE_WORKERS, config.maintenance_priority, maintenance_cpus, config.maintenance_copy_limit * BYTES_PER_MEGABYTE)
+        self.verifier = BackupVerifier(self.catalog, self.repository, config.verify_workers, self.handle_verification_result, config.maintenance_priority, maintenance_cpus)
+        # Downloaded server archives, kept per version so reinstalls and rollbacks need no download
+        self.update_cache = ArtifactCache(config.update_cache_folder, config.update_cache_versions)
+        # Paths updates never write or delete, normalized once so each file is checked with a few set lookups
+        self.protected_paths = ProtectedPaths(config.update_protected_paths)
+        # Started by start() if metrics_port is set
+        self.metrics_server = None
+        # Runs restarts, backups, pruning, update checks and verification, see _schedule_jobs. Restarts have their own worker
+        self.scheduler = Scheduler(SCHEDULER_WORKERS, self.handle_job_error)
+        # Set by the update check when an update is waiting to be installed at the next scheduled restart
+        self._pending_update = None
+        # When the current periodic backup was first postponed because the server was busy, None if it is not postponed
+        self._backup_deferred_since = None
+        # Set once the server's memory passed restart_rss_limit and a restart is scheduled, cleared when it starts again
+        self._memory_restart_pending = False
 
 
     def log_print(self, level: LogLevel, line):
@@ -68,25 +156,189 @@ class ServerAutomation:
 
     def start(self):
         """Start the server automation tasks that require threads."""
-        # Start the scheduled restart thread
-        scheduled_restart_thread = threading.Thread(target=self._scheduled_restart, daemon=True)
-        scheduled_restart_thread.start()
+        # Schedule the periodic jobs and start the scheduler thread
+        self._schedule_jobs()
+        self.scheduler.start()
+        # Archive the logs of past days left over from previous runs
+        archive_thread = threading.Thread(target=self.archive_logs, daemon=True)
+        archive_thread.start()
+        # Serve metrics for Prometheus if a port is configured
+        if self.config.metrics_port:
+            self.metrics_server = MetricsServer(self.config.metrics_port)
+            try:
+                self.metrics_server.start()
+                self.log_print(LogLevel.INFO, f"Serving metrics at http://{self.metrics_server.host}:{self.config.metrics_port}/metrics")
+            except OSError as e:
+                self.metrics_server = None
+                self.log_print(LogLevel.ERROR, f"Failed to start the metrics endpoint on port {self.config.metrics_port}: {e}")
+        # Catalog backups added or deleted by hand while the manager was not running
+        self.sync_backup_catalog()
+        # Start verifying backups in the background
+        self.verifier.start()
         # Prune old backups on startup
-        self._prune_old_backups(Path(self.backup_folder))
+        self._scheduled_prune()
 
 
-    def handle_server_output(self, timestamp, line):
+    def handle_server_output_batch(self, lines):
         """
-        Process server output lines for automation triggers.
+        Process a batch of server output lines for automation triggers.
         Args:
-            timestamp (str): The timestamp of the output line.
-            line (str): The output line from the server.
+            lines (list[tuple[str, str]]): The (timestamp, line) pairs of the batch.
         """
-        # Scrape the line for the version number to use in update checks
-        if (line.startswith("Version:")):
-            self.current_version = line.split("Version:")[1].strip()
-        self.logger.log(timestamp + line)
-        self._recent_lines.appendleft(line)
+        # Hand the whole batch to the logger at once
+        self.logger.log_many([timestamp + line for timestamp, line in lines])
+
+
+    def handle_version_detected(self, event: VersionDetected):
+        """
+        Record the server version printed at startup to use in update checks.
+        Args:
+            event (VersionDetected): The version event.
+        """
+        self.current_version = event.version
+
+
+    def handle_crash_hint(self, event: ServerEvent):
+        """
+        Remember the last line hinting at a crash, so an unexpected shutdown can report it.
+        Args:
+            event (ServerEvent): The crash hint or error event.
+        """
+        self.last_crash_hint = event.line
+
+
+    def handle_server_started(self, event: ServerStarted):
+        """
+        Forget errors from before the server finished starting, they did not stop it, and start with an empty player index
+        and no memory restart pending.
+        Args:
+            event (ServerStarted): The server started event.
+        """
+        self.last_crash_hint = None
+        # Any restart resets the memory, so a memory restart still waiting is no longer needed
+        self._memory_restart_pending = False
+        self.scheduler.cancel("memory_restart")
+        self.clear_online_players()
+
+
+    def handle_player_connected(self, event: PlayerConnected):
+        """
+        Add a player to the online player index.
+        Args:
+            event (PlayerConnected): The player connected event.
+        """
+        with self._players_lock:
+            self._online_players[event.name.lower()] = OnlinePlayer(event.name, event.xuid, datetime.now())
+
+
+    def handle_player_disconnected(self, event: PlayerDisconnected):
+        """
+        Remove a player from the online player index.
+        Args:
+            event (PlayerDisconnected): The player disconnected event.
+        """
+        with self._players_lock:
+            self._online_players.pop(event.name.lower(), None)
+
+
+    def clear_online_players(self):
+        """Empty the online player index, called when the server stops or crashes."""
+        with self._players_lock:
+            self._online_players.clear()
+
+
+    def online_players(self):
+        """
+        Get the players currently online without asking the server.
+        Returns:
+            list[OnlinePlayer]: The online players, in the order they connected.
+        """
+        with self._players_lock:
+            return list(self._online_players.values())
+
+
+    def get_online_player(self, name):
+        """
+        Look up an online player by name, ignoring case.
+        Args:
+            name (str): The player's name.
+        Returns:
+            OnlinePlayer | None: The player, or None if they are not online.
+        """
+        with self._players_lock:
+            return self._online_players.get(name.lower())
+
+
+    def describe_online_players(self):
+        """
+        Describe who is online and for how long, for the CLI and Discord.
+        Returns:
+            str: The summary.
+        """
+        players = self.online_players()
+        if not players:
+            return "No players online."
+        now = datetime.now()
+        descriptions = []
+        for player in players:
+            minutes = int((now - player.connected_at).total_seconds() // 60)
+            online_for = f"{minutes // 60}h {minutes % 60}m" if minutes >= 60 else f"{minutes}m"
+            descriptions.append(f"{player.name} ({online_for})")
+        return f"{len(players)} player(s) online: {', '.join(descriptions)}"
+
+
+    def handle_process_sample(self, sample):
+        """
+        Schedule a graceful restart when the server's memory passes restart_rss_limit, warning players first.
+        Args:
+            sample (ProcessSample): The latest sample of the server's resource use.
+        """
+        limit = self.config.restart_rss_limit
+        if not limit or self._memory_restart_pending or sample.rss_bytes <= limit * BYTES_PER_MEGABYTE:
+            return
+        self._memory_restart_pending = True
+        MEMORY_RESTARTS.inc()
+        self.log_print(LogLevel.WARN, f"The server is using {sample.rss_bytes / BYTES_PER_MEGABYTE:.0f}MB of memory, limit {limit}MB. Restarting in {RESTART_WARNING_MINUTES} minutes.")
+        with self.runner.lock():
+            if self.runner.is_running():
+                self.runner.send_command(f"say Server will restart in {RESTART_WARNING_MINUTES} minutes. Please prepare to log out.")
+        self.scheduler.add("memory_restart", self._scheduled_restart, OnceTrigger(RESTART_WARNING_MINUTES * 60), urgent=True)
+
+
+    def describe_stats(self):
+        """
+        Describe the server's current resource use and its averages and peaks over the sample history, for the CLI and Discord.
+        Returns:
+            str: The summary.
+        """
+        if not self.runner.sampler.interval:
+            return "Resource sampling is disabled (stats_interval is 0)."
+        latest = self.runner.sampler.latest()
+        if latest is None or not self.runner.is_running():
+            return "No samples yet, the server is not running."
+        # Only samples of the running process, the history can reach back across a restart
+        samples = [sample for sample in self.runner.sampler.samples() if sample.pid == latest.pid]
+        cpu = [sample.cpu_percent for sample in samples if sample.cpu_percent is not None]
+        rss = [sample.rss_bytes for sample in samples]
+        span = samples[-1].time - samples[0].time
+        over = f"{span / 60:.0f} minutes" if span >= 120 else f"{span:.0f} seconds"
+
+        lines = [f"Resource use of bedrock_server (pid {latest.pid}), over the last {over} ({len(samples)} samples):"]
+        if cpu:
+            lines.append(f"CPU: {cpu[-1]:.1f}% now, {sum(cpu) / len(cpu):.1f}% average, {max(cpu):.1f}% peak")
+        memory = f"Memory: {latest.rss_bytes / BYTES_PER_MEGABYTE:.0f}MB now, {sum(rss) / len(rss) / BYTES_PER_MEGABYTE:.0f}MB average"
+        if latest.peak_rss_bytes is not None:
+            memory += f", {latest.peak_rss_bytes / BYTES_PER_MEGABYTE:.0f}MB peak since start"
+        if self.config.restart_rss_limit:
+            memory += f" (restart at {self.config.restart_rss_limit}MB)"
+        lines.append(memory)
+        if latest.read_bytes is not None and samples[0].read_bytes is not None and span > 0:
+            read_rate = (latest.read_bytes - samples[0].read_bytes) / span / 1024
+            write_rate = (latest.write_bytes - samples[0].write_bytes) / span / 1024
+            lines.append(f"Disk: {latest.read_bytes / BYTES_PER_MEGABYTE:.1f}MB read, {latest.write_bytes / BYTES_PER_MEGABYTE:.1f}MB written, {read_rate:.1f}KB/s read and {write_rate:.1f}KB/s written on average")
+        files = f", {latest.open_files} open files" if latest.open_files is not None else ""
+        lines.append(f"Threads: {latest.threads}{files}")
+        return "\n".join(lines)
 
 
     def handle_unexpected_shutdown(self, timestamp, line):
@@ -99,6 +351,11 @@ class ServerAutomation:
         # Log the unexpected shutdown
         self.logger.log(timestamp + line)
         self.automation_output_broadcaster.publish(timestamp, line)
+        # Report the last error the server printed, it usually explains the crash
+        if self.last_crash_hint is not None:
+            self.log_print(LogLevel.ERROR, f"Last error reported by the server: {self.last_crash_hint}")
+            self.last_crash_hint = None
+        UNEXPECTED_SHUTDOWNS.inc()
         # Add the crash time to the list of crashes
         now = datetime.now()
         self.recent_crashes.append(now)
@@ -112,48 +369,246 @@ class ServerAutomation:
             self.log_print(LogLevel.CRITICAL, "Repeated unexpected shutdowns detected. Crash limit exceeded. Server restart attempts halted until manual intervention.")
         else:
             self.log_print(LogLevel.INFO, "Automatic restart triggered due to unexpected server shutdown.")
-            self.runner.start()
+            # Start the server from a scheduler thread, this handler runs on the stdout reader thread which exits
+            # once the output ends, and on Linux its exit would send the new process its parent death signal
+            self.scheduler.add("crash_restart", self.runner.start, OnceTrigger(), urgent=True)
     
 
+    def _schedule_jobs(self):
+        """Internal method to add the periodic jobs to the scheduler."""
+        # Warn players RESTART_WARNING_MINUTES before the daily restart, missed warnings and restarts are skipped so the
+        # server is never restarted at an unexpected time after the machine was asleep. Restarts are urgent jobs, so a
+        # long backup or update check on the shared workers cannot delay them past their grace period
+        hour, minute = self.restart_time
+        warning_minutes = (hour * 60 + minute - RESTART_WARNING_MINUTES) % (24 * 60)
+        self.scheduler.add("restart_warning", self._warn_restart, CronTrigger.daily(warning_minutes // 60, warning_minutes % 60), missed=SKIP, urgent=True)
+        self.scheduler.add("restart", self._scheduled_restart, CronTrigger.daily(hour, minute), missed=SKIP, urgent=True)
+        self.log_print(LogLevel.INFO, f"Scheduled server restart daily at {hour:02d}:{minute:02d}.")
+        # Maintenance, runs once to catch up if a run was missed
+        self.scheduler.add("prune", self._scheduled_prune, IntervalTrigger(PRUNE_INTERVAL_HOURS * 3600))
+        self.scheduler.add("verify", self._queue_due_verifications, IntervalTrigger(VERIFICATION_CHECK_MINUTES * 60, first_delay=0))
+        if self.config.update_check_interval:
+            self.scheduler.add("update_check", self._scheduled_update_check, IntervalTrigger(self.config.update_check_interval * 3600), jitter=UPDATE_CHECK_JITTER_MINUTES * 60)
+        if self.config.backup_interval:
+            self.scheduler.add("backup", self._scheduled_backup, IntervalTrigger(self.config.backup_interval * 60), jitter=BACKUP_JITTER_SECONDS)
+
+
+    def handle_job_error(self, job, error):
+        """
+        Handle a scheduled job raising an exception.
+        Args:
+            job (ScheduledJob): The job that failed.
+            error (Exception): The exception it raised.
+        """
+        self.log_print(LogLevel.ERROR, f"Scheduled job '{job.name}' failed: {error}")
+
+
+    def _warn_restart(self):
+        """Scheduled job that warns players about the daily restart."""
+        self.log_print(LogLevel.INFO, f"Server will restart in {RESTART_WARNING_MINUTES} minutes. Please prepare to log out.")
+        with self.runner.lock():
+            if self.runner.is_running():
+                self.runner.send_command(f"say Server will restart in {RESTART_WARNING_MINUTES} minutes. Please prepare to log out.")
+
+
     def _scheduled_restart(self):
-        """Internal method to handle scheduled restarts. Ran in a separate thread."""
-        while True:
-            # Get current time and today's restart time
-            now = datetime.now()
-            restart_date = now.replace(hour=self.restart_time[0], minute=self.restart_time[1], second=0, microsecond=0)
+        """Scheduled job that restarts the server daily, backing up the world and installing a waiting update while it is stopped."""
+        self.log_print(LogLevel.INFO, "Performing scheduled server restart now.")
+        with self.runner.lock():
+            if self.runner.is_running():
+                self.runner.stop()
+            self._backup_world_offline()
+            # Updates found by the update check are installed while the server is stopped for the restart
+            if self._pending_update is not None:
+                version, self._pending_update = self._pending_update, None
+                # A manual ':update' may have installed it already
+                if version != self.current_version:
+                    if self.config.update_mode == "staged":
+                        self._install_staged_update(version)
+                    else:
+                        self.update_server()
+            self.runner.start()
+
+
+    def _scheduled_update_check(self):
+        """
+        Scheduled job that checks for a server update, and if auto_update is enabled prepares it to be installed at the
+        next scheduled restart, so players are warned before the server stops. Staged updates are built now.
+        """
+        updateInfo = get_bedrock_update_info(self.current_version, self.config.platform)
+        if updateInfo.error:
+            self.log_print(LogLevel.WARN, f"Scheduled update check failed: {updateInfo.error}")
+            return
+        if not updateInfo.update_available or updateInfo.latest_version == self._pending_update:
+            return
+        if not self.config.auto_update:
+            self.log_print(LogLevel.INFO, f"Update available: {self.current_version} -> {updateInfo.latest_version}, use ':update' to install it.")
+        elif self.config.update_mode == "staged" and not self._stage_update(updateInfo):
+            return
+        else:
+            self._pending_update = updateInfo.latest_version
+            self.log_print(LogLevel.INFO, f"Update available: {self.current_version} -> {updateInfo.latest_version}, it will be installed at the next scheduled restart.")
+
+
+    def _scheduled_prune(self):
+        """
+        Scheduled job that prunes old backups under the runner's lock, like the pruning done after each backup, so the
+        repository's garbage collection never runs while a backup has stored blobs that no manifest references yet.
+        """
+        with self.runner.lock():
+            self._prune_old_backups(Path(self.backup_folder))
+
+
+    def _scheduled_backup(self):
+        """
+        Scheduled job that backs up the world every backup_interval minutes while the server is running.
+        If the server is busy the backup is retried every BACKUP_RETRY_MINUTES, until it has been postponed for
+        backup_max_delay minutes, after which it runs regardless.
+        """
+        if not self.runner.is_running():
+            return
+        reason = self._measure_load()
+        now = datetime.now()
+        if reason is not None:
+            if self._backup_deferred_since is None:
+                self._backup_deferred_since = now
+            deadline = self._backup_deferred_since + timedelta(minutes=self.config.backup_max_delay)
+            if now < deadline:
+                BACKUPS_DEFERRED.inc()
+                retry_seconds = min(BACKUP_RETRY_MINUTES * 60, (deadline - now).total_seconds())
+                self.log_print(LogLevel.INFO, f"Postponing periodic backup, the server is busy ({reason}). Retrying at {(now + timedelta(seconds=retry_seconds)).strftime('%H:%M')}, it will run by {deadline.strftime('%H:%M')} regardless.")
+                self.scheduler.add("backup_retry", self._scheduled_backup, OnceTrigger(retry_seconds))
+                return
+            self.log_print(LogLevel.INFO, f"Running periodic backup although the server is busy ({reason}), it has been postponed for {self.config.backup_max_delay} minutes.")
+        # A retry still waiting is not needed once the backup runs
+        self._backup_deferred_since = None
+        self.scheduler.cancel("backup_retry")
+        with self.runner.lock():
+            if self.runner.is_running():
+                self._backup_world_online()
+
 
-            # If today's restart time has passed, schedule for tomorrow
-            if now >= restart_date:
-                restart_date += timedelta(days=1)
+    def _measure_load(self):
+        """
+        Check the load signals that have a threshold configured.
+        Returns:
+            str | None: Why the server is too busy for a backup, or None if it is not.
+        """
+        # Online players, from the index kept up to date by the join and leave events
+        if self.config.backup_max_players:
+            players = len(self.online_players())
+            if players > self.config.backup_max_players:
+                return f"{players} players online, limit {self.config.backup_max_players}"
+
+        # CPU use of bedrock_server over a short window, in percent of one core
+        if self.config.backup_max_cpu:
+            before = self.runner.process_stats()
+            sample_start = perf_counter()
+            sleep(LOAD_SAMPLE_SECONDS)
+            after = self.runner.process_stats()
+            # Not measurable (eg. not Linux, or the server stopped), so it does not hold the backup back
+            if before is not None and after is not None:
+                cpu = (after.cpu_seconds - before.cpu_seconds) * 100 / (perf_counter() - sample_start)
+                if cpu > self.config.backup_max_cpu:
+                    return f"{cpu:.0f}% CPU, limit {self.config.backup_max_cpu}%"
+
+        # Round trip of a command, which grows when the server falls behind on ticks
+        if self.config.backup_max_latency:
+            sent = perf_counter()
+            try:
+                response = self.runner.send_command_and_wait("list", [LIST_RESPONSE_PATTERN], LOAD_LATENCY_TIMEOUT_SECONDS)
+            except RuntimeError:
+                return None
+            latency = (perf_counter() - sent) * 1000
+            if response is None or latency > self.config.backup_max_latency:
+                return f"{'no response to list' if response is None else f'{latency:.0f}ms command latency'}, limit {self.config.backup_max_latency}ms"
+        return None
 
-            # Calculate seconds until restart
-            seconds_until_restart = (restart_date - now).total_seconds()
 
-            self.log_print(LogLevel.INFO, f"Scheduled server restart in {int(seconds_until_restart // 60)} minutes.")
+    def _queue_due_verifications(self):
+        """Scheduled job that queues every backup due another verification."""
+        # Backups that were never verified (eg. found by a catalog rebuild) are always due
+        if self.config.verify_interval:
+            cutoff = datetime.now() - timedelta(hours=self.config.verify_interval)
+        else:
+            cutoff = datetime.min
+        for record in self.catalog.due_for_verification(cutoff):
+            self.verifier.submit(record.name)
 
-            # Subtract RESTART_WARNING_MINUTES for the warning period
-            restart_date = restart_date - timedelta(minutes=RESTART_WARNING_MINUTES)
-            seconds_until_restart = (restart_date - now).total_seconds()
 
-            sleep(seconds_until_restart)
+    def describe_jobs(self):
+        """
+        Describe the scheduled jobs and when they next run.
+        Returns:
+            str: One line per job.
+        """
+        lines = []
+        for job in self.scheduler.jobs():
+            next_run = datetime.fromtimestamp(job.next_run).strftime("%Y-%m-%d %H:%M:%S") if job.next_run is not None else "never"
+            line = f"{job.name}: next {next_run} ({job.trigger.describe()}"
+            line += f", up to {int(job.jitter)}s jitter)" if job.jitter else ")"
+            if job.running:
+                line += ", running now"
+            elif job.last_run is not None:
+                line += f", last ran {datetime.fromtimestamp(job.last_run).strftime('%Y-%m-%d %H:%M:%S')} for {job.last_duration:.1f}s"
+                line += f" and failed: {job.last_error}" if job.last_error else ""
+            if job.missed_runs:
+                line += f", {job.missed_runs} run(s) skipped"
+            lines.append(line)
+        return "\n".join(lines) if lines else "No scheduled jobs."
+
+
+    def handle_verification_result(self, result):
+        """
+        Handle the outcome of a backup verification.
+        Args:
+            result (VerificationResult): The outcome.
+        """
+        if result.ok:
+            self.log_print(LogLevel.INFO, f"Verified backup {result.name}: {result.detail}")
+        else:
+            self.log_print(LogLevel.ERROR, f"Backup {result.name} failed verification: {result.detail}")
 
-            # Warn users about the restart
-            self.log_print(LogLevel.INFO, f"Server will restart in {RESTART_WARNING_MINUTES} minutes. Please prepare to log out.")
-            with self.runner.lock():
-                if self.runner.is_running():
-                    self.runner.send_command(f"say Server will restart in {RESTART_WARNING_MINUTES} minutes. Please prepare to log out.")
 
-            # Sleep for the warning period
-            sleep(RESTART_WARNING_MINUTES * 60)
+    def verify_backups(self, identifier):
+        """
+        Queue backups for verification now.
+        Args:
+            identifier (str): The name of the backup to verify, "latest" for the latest backup, or "all" for every backup.
+        """
+        if identifier.lower() == "all":
+            records = self.catalog.list(BACKUP_KINDS)
+        elif identifier.lower() == "latest":
+            records = [record] if (record := self.catalog.latest()) is not None else []
+        else:
+            records = [record] if (record := self.catalog.get(identifier)) is not None else []
+        if not records:
+            self.log_print(LogLevel.WARN, f"Backup '{identifier}' not found to verify.")
+            return
+        queued = sum(self.verifier.submit(record.name) for record in records)
+        self.log_print(LogLevel.INFO, f"Queued {queued} backup(s) for verification.")
 
-            # Perform the restart
-            self.log_print(LogLevel.INFO, "Performing scheduled server restart now.")
 
-            with self.runner.lock():
-                if self.runner.is_running():
-                    self.runner.stop()
-                self._backup_world_offline()
-                self.runner.start()
+    def describe_verification(self):
+        """
+        Describe the verification status of every backup.
+        Returns:
+            str: One line per backup, oldest first.
+        """
+        records = self.catalog.list(BACKUP_KINDS)
+        if not records:
+            return "No backups found."
+        lines = []
+        for record in records:
+            if record.verified_at is None:
+                status = "not verified yet"
+            else:
+                status = f"{'OK' if record.verified_ok else 'FAILED'} at {record.verified_at} ({record.verify_detail})"
+            lines.append(f"{record.name}: {status}")
+        pending = self.verifier.pending()
+        if pending:
+            lines.append(f"{pending} backup(s) waiting to be verified.")
+        return "\n".join(lines)
 
 
     def _prune_old_backups(self, backup_root: Path):
@@ -163,34 +618,93 @@ class ServerAutomation:
             backup_root (Path): The root directory where backups are stored.
         """
         self.log_print(LogLevel.INFO, "Pruning old backups...")
+        start = perf_counter()
         cutoff_time = datetime.now() - timedelta(days=self.backup_duration)
         pruned = []
-        for backup in backup_root.iterdir():
+        pruned_manifest = False
+        # The catalog only returns unprotected world backups, aged by the time in their name rather than their mtime
+        for record in self.catalog.expired(cutoff_time):
+            backup = backup_root / record.name
             try:
-                backup_time = datetime.fromtimestamp(backup.stat().st_mtime)
+                if backup.is_dir():
+                    self.maintenance.run(shutil.rmtree, backup)
+                elif record.format == "manifest":
+                    # Releases the manifest's blob references, so collecting garbage needs no rescan of the manifests
+                    self.repository.delete_backup(backup)
+                else:
+                    backup.unlink(missing_ok=True)
+                self.catalog.remove(record.name)
+                pruned.append(record.name)
+                if record.format == "manifest":
+                    pruned_manifest = True
             except Exception as e:
-            # TODO: Improve error message with exception details
-                self.log_print(LogLevel.ERROR, f"Failed to get backup timestamp for backup {backup.name}: {e}")
-                continue
-            if backup_time < cutoff_time:
-                # Skip protected backups, temporary backups, and only delete valid backups
-                if backup.name.startswith(PROTECTED_BACKUP_PREFIX) or backup.name.startswith(TEMPORARY_BACKUP_PREFIX):
-                    continue
-                elif not (backup.name.startswith(OFFLINE_BACKUP_PREFIX) or backup.name.startswith(ONLINE_BACKUP_PREFIX)):
-                    continue
-                try:
-                    if backup.is_dir():
-                        shutil.rmtree(backup)
-                    else:
-                        backup.unlink()
-                    pruned.append(backup.name)
-                except Exception as e:
-                    # TODO: Improve error message with exception details
-                    self.log_print(LogLevel.ERROR, f"Failed to prune backup {backup.name}: {e}")
+                # TODO: Improve error message with exception details
+                self.log_print(LogLevel.ERROR, f"Failed to prune backup {record.name}: {e}")
+        BACKUP_STAGE_SECONDS.labels("prune").observe(perf_counter() - start)
         if pruned:
             self.log_print(LogLevel.INFO, f"Pruned old backups: {', '.join(pruned)}")
         else:
             self.log_print(LogLevel.INFO, "No old backups to prune.")
+        # Free the repository blobs that are no longer referenced by any remaining manifest
+        if pruned_manifest:
+            try:
+                deleted, freed = self.maintenance.run(self.repository.collect_garbage)
+                self.log_print(LogLevel.INFO, f"Freed {deleted} unreferenced backup blobs ({freed // (1024 * 1024)}MB).")
+            except Exception as e:
+                self.log_print(LogLevel.ERROR, f"Failed to free unreferenced backup blobs: {e}")
+
+
+    def _catalog_backup(self, path: Path):
+        """
+        Internal method to record a new backup in the catalog and queue it for verification.
+        The backup is not hashed here, which would keep the runner's lock held (and the server stopped, for offline
+        backups) while the whole backup is read again. The verifier records the checksum when it first reads it back.
+        Args:
+            path (Path): The backup file or folder.
+        """
+        try:
+            self.catalog.add(path, checksum=False)
+        except Exception as e:
+            self.log_print(LogLevel.ERROR, f"Failed to add backup {path.name} to the catalog: {e}")
+            return
+        # Read the new backup back while it is still in the page cache
+        self.verifier.submit(path.name)
+
+
+    def sync_backup_catalog(self):
+        """Reconcile the backup catalog with the backup folder, adding backups copied in and dropping ones deleted by hand."""
+        try:
+            added, removed = self.catalog.sync()
+        except Exception as e:
+            self.log_print(LogLevel.ERROR, f"Failed to synchronize the backup catalog: {e}")
+            return
+        if self.catalog.rebuilt:
+            self.log_print(LogLevel.INFO, f"Built the backup catalog from the backup folder ({len(self.catalog.list(BACKUP_KINDS))} backups).")
+            self.catalog.rebuilt = False
+        elif added or removed:
+            self.log_print(LogLevel.INFO, f"Backup catalog synchronized: {added} added, {removed} removed.")
+
+
+    def _compress_backup(self, dest_dir: Path, backup_root: Path, description: str):
+        """
+        Internal method to compress a backup directory into an archive in backup_format using the configured compression workers.
+        Args:
+            dest_dir (Path): The backup directory to compress.
+            backup_root (Path): The root directory where backups are stored.
+            description (str): The kind of backup, used in log messages (eg. "Offline backup").
+        Returns:
+            Path: The archive, or the uncompressed directory if compression failed.
+        """
+        try:
+            # Compress the backup directory
+            with BACKUP_STAGE_SECONDS.labels("compress").time():
+                archive_path = self.maintenance.run(make_backup_archive, dest_dir, backup_root, dest_dir.name, self.config.backup_format, self.compression_workers, self.compression_level, self.config.zstd_level)
+            # Remove the uncompressed backup directory
+            self.maintenance.run(shutil.rmtree, dest_dir, ignore_errors=True)
+            return Path(archive_path)
+        except Exception as e:
+            self.log_print(LogLevel.WARN, f"{description} compression failed, keeping folder backup: {e}")
+            return dest_dir
 
 
     def _backup_world_offline(self, skip_pruning: bool = False):
@@ -217,10 +731,16 @@ class ServerAutomation:
 
             self.log_print(LogLevel.INFO, f"Initiating offline backup to '{dest_dir.name}'")
 
+            # Take a hard-linked snapshot instead of a full copy and archive if configured
+            if self.offline_backup_mode == "snapshot":
+                return self._backup_world_offline_snapshot(world_dir, backup_root, dest_dir, temp_dir, skip_pruning)
+
             # Copy the world directory to a temporary location first so incomplete backups are not stored
             try:
-                shutil.copytree(world_dir, temp_dir)
+                with BACKUP_STAGE_SECONDS.labels("copy").time():
+                    copy_stats = copy_tree(world_dir, temp_dir)
                 temp_dir.rename(dest_dir)
+                self.log_print(LogLevel.INFO, f"Copied {describe_copy_stats(copy_stats)}")
             except Exception as e:
                 # Remove the temporary directory if the backup fails
                 if temp_dir.exists():
@@ -231,17 +751,10 @@ class ServerAutomation:
                 return None
 
             # Compress the backup directory
-            final_path = dest_dir
-            try:
-                # Compress the backup directory
-                shutil.make_archive(str(dest_dir), 'zip', root_dir=backup_root, base_dir=dest_dir.name)
-                # Remove the uncompressed backup directory
-                shutil.rmtree(dest_dir, ignore_errors=True)
-                final_path = dest_dir.with_suffix('.zip')
-            except Exception as e:
-                self.log_print(LogLevel.WARN, f"Offline backup compression failed, keeping folder backup: {e}")
+            final_path = self._compress_backup(dest_dir, backup_root, "Offline backup")
 
             self.log_print(LogLevel.INFO, f"Successfully completed offline world backup: {final_path.name}")
+            self._catalog_backup(final_path)
 
             # Prune old backups from the backup directory
             if not skip_pruning:
@@ -251,6 +764,53 @@ class ServerAutomation:
             return final_path
 
 
+    def _latest_offline_snapshot(self, backup_root: Path):
+        """
+        Internal method to find the newest uncompressed offline backup to link a new snapshot against.
+        Args:
+            backup_root (Path): The root directory where backups are stored.
+        Returns:
+            Path | None: The newest offline snapshot folder, or None if there is none.
+        """
+        record = self.catalog.latest(kinds=("offline",), formats=("folder",))
+        if record is None or not (backup_root / record.name).is_dir():
+            return None
+        return backup_root / record.name
+
+
+    def _backup_world_offline_snapshot(self, world_dir, backup_root, dest_dir, temp_dir, skip_pruning):
+        """
+        Internal method to back up the world as a folder that hard-links files unchanged since the previous snapshot.
+        Args:
+            world_dir (Path): The world directory being backed up.
+            backup_root (Path): The root directory where backups are stored.
+            dest_dir (Path): The final snapshot folder.
+            temp_dir (Path): The temporary folder the snapshot is built in.
+            skip_pruning (bool): If True, skip pruning old backups after creating the backup.
+        """
+        previous = self._latest_offline_snapshot(backup_root)
+        copy_stats = Counter()
+        try:
+            with BACKUP_STAGE_SECONDS.labels("copy").time():
+                linked, copied = create_link_snapshot(world_dir, temp_dir, previous, stats=copy_stats)
+            temp_dir.rename(dest_dir)
+        except Exception as e:
+            # Remove the temporary directory if the backup fails
+            if temp_dir.exists():
+                shutil.rmtree(temp_dir, ignore_errors=True)
+            self.log_print(LogLevel.ERROR, f"Offline snapshot backup failed: {e}")
+            return None
+
+        self.log_print(LogLevel.INFO, f"Successfully completed offline world snapshot: {dest_dir.name} ({linked} files linked to '{previous.name if previous else 'none'}', copied {describe_copy_stats(copy_stats)})")
+        self._catalog_backup(dest_dir)
+
+        # Prune old backups from the backup directory
+        if not skip_pruning:
+            self._prune_old_backups(backup_root)
+
+        return dest_dir
+
+
     def _backup_world_online(self, skip_pruning: bool = False):
         """
         Perform a backup of the world while the server remains online.
@@ -276,34 +836,33 @@ class ServerAutomation:
             self.log_print(LogLevel.INFO, f"Initiating online backup to '{dest_dir.name}'; expect ERROR messages indicating a previous save has not been completed.")
 
             # Step 1: save hold
+            hold_start = perf_counter()
             try:
                 self.runner.send_command("save hold")
             except RuntimeError:
                 self.log_print(LogLevel.ERROR, f"Failed to send 'save hold': server is not running.")
                 return None
 
-            # Step 2: save query
-            hold_confirmed = False
+            # Step 2: save query until the server confirms the files are ready, then wait for the file list that follows
             hold_deadline = time() + SAVE_QUERY_TIMEOUT_SECONDS
-            success_index = -1
-            while time() < hold_deadline and not hold_confirmed:
-                # Run the save query command
+            file_list = None
+            while time() < hold_deadline and file_list is None:
+                # Run the save query command and wait for its response
                 try:
-                    self.runner.send_command("save query")
+                    result = self.runner.send_command_and_wait("save query", (SUCCESS_PATTERN, FAIL_PATTERN), hold_deadline - time())
                 except RuntimeError:
                     self.log_print(LogLevel.ERROR, f"Failed to send 'save query': server is not running.")
                     return None
-                # Wait briefly for output to be processed to the deque buffer
-                sleep(0.25)
-                # Look through dequeue or a confirmation or failure pattern
-                for index, line in enumerate(self._recent_lines):
-                    if re.search(SUCCESS_PATTERN, line, re.IGNORECASE):
-                        success_index = index
-                        hold_confirmed = True
-                    elif re.search(FAIL_PATTERN, line, re.IGNORECASE):
-                        continue
+                # Timed out or the server stopped
+                if result is None:
+                    break
+                if result.pattern is SUCCESS_PATTERN:
+                    file_list = self.runner.wait_for_output((FILE_LIST_PATTERN,), max(hold_deadline - time(), 0), after_sequence=result.sequence)
+                    break
+                # The previous save is still running, give it a moment before asking again
+                sleep(SAVE_QUERY_RETRY_SECONDS)
             # If hold was not confirmed, log a warning
-            if not hold_confirmed:
+            if file_list is None:
                 self.log_print(LogLevel.WARN, "Save query failed; aborting backup.")
                 try:
                     self.runner.send_command("save resume")
@@ -311,31 +870,33 @@ class ServerAutomation:
                     self.log_print(LogLevel.ERROR, "Save resume failed, server may still be in hold state.")
                 return None
 
-            # Extract file list from the output line preceding the success line
+            BACKUP_STAGE_SECONDS.labels("hold").observe(perf_counter() - hold_start)
+
+            # Extract file list from the output line following the success line
             files = []
-            entries = self._recent_lines[success_index - 1].split(', ')
+            entries = file_list.line.split(', ')
             for entry in entries:
                 if ':' in entry:
                     path, size = entry.rsplit(':', 1)
                     files.append((path, int(size)))
 
+            # Store the files in the backup repository instead of a standalone archive if configured
+            if self.online_backup_mode == "repository":
+                return self._backup_world_online_to_repository(world_dir, backup_root, dest_dir, files, skip_pruning)
+            # Stream the files straight into the archive without a temporary copy if configured
+            elif self.online_backup_mode == "stream":
+                return self._backup_world_online_streamed(world_dir, backup_root, dest_dir, files, skip_pruning)
+
             # Step 3: copy the necessary files to a temporary location
             self.log_print(LogLevel.INFO, "Copying necessary files for online backup...")
             try:
-                # Copy each file reported by the save query
-                for file_path, bytes in files:
-                    # Create source and destination paths for each file
-                    source = world_dir / file_path.replace(f"{world_dir.name}/", "")
-                    dest = temp_dir / file_path.replace(f"{world_dir.name}/", "")
-                    # Ensure the destination directory exists and copy the file
-                    dest.parent.mkdir(parents=True, exist_ok=True)
-                    shutil.copy2(source, dest)
-                    # Truncate the file to the requested size
-                    f = open(dest, "a")
-                    f.truncate(bytes)
-                    f.close()
+                copy_stats = Counter()
+                copy_start = perf_counter()
+                self.maintenance.run_urgent(self._copy_world_files, world_dir, temp_dir, files, copy_stats)
+                BACKUP_STAGE_SECONDS.labels("copy").observe(perf_counter() - copy_start)
                 # Rename the temporary directory to the final destination
                 temp_dir.rename(dest_dir)
+                self.log_print(LogLevel.INFO, f"Copied {describe_copy_stats(copy_stats)}")
                 # Resume server writes
                 try:
                     self.runner.send_command("save resume")
@@ -354,17 +915,10 @@ class ServerAutomation:
                 return None
 
             # Step 4: Compress the backup directory
-            final_path = dest_dir
-            try:
-                # Compress the backup directory
-                shutil.make_archive(str(dest_dir), 'zip', root_dir=backup_root, base_dir=dest_dir.name)
-                # Remove the uncompressed backup directory
-                shutil.rmtree(dest_dir, ignore_errors=True)
-                final_path = dest_dir.with_suffix('.zip')
-            except Exception as e:
-                self.log_print(LogLevel.WARN, f"Online backup compression failed, keeping folder backup: {e}")
+            final_path = self._compress_backup(dest_dir, backup_root, "Online backup")
 
             self.log_print(LogLevel.INFO, f"Successfully completed online world backup: {final_path.name}")
+            self._catalog_backup(final_path)
 
             # Prune old backups
             if not skip_pruning:
@@ -373,6 +927,128 @@ class ServerAutomation:
             return final_path
 
 
+    def _backup_world_online_to_repository(self, world_dir, backup_root, dest_dir, files, skip_pruning):
+        """
+        Internal method to store the files reported by a save query in the backup repository. The server must be in the save hold state.
+        Args:
+            world_dir (Path): The world directory being backed up.
+            backup_root (Path): The root directory where backups are stored.
+            dest_dir (Path): The backup path without the manifest suffix.
+            files (list[tuple[str, int]]): The files and sizes reported by the save query.
+            skip_pruning (bool): If True, skip pruning old backups after creating the backup.
+        """
+        manifest_path = dest_dir.with_suffix(MANIFEST_SUFFIX)
+        self.log_print(LogLevel.INFO, "Storing changed files in the backup repository...")
+        try:
+            # The save query reports paths starting with the world folder name
+            relative_files = [(file_path.replace(f"{world_dir.name}/", "", 1), size) for file_path, size in files]
+            copy_stats = Counter()
+            with BACKUP_STAGE_SECONDS.labels("copy").time():
+                new_blobs, new_bytes = self.maintenance.run_urgent(self.repository.create_backup, manifest_path, world_dir, relative_files, stats=copy_stats)
+        except Exception as e:
+            self.log_print(LogLevel.ERROR, f"Online world backup failed while storing files: {e}")
+            return None
+        finally:
+            # Resume server writes whether or not the backup succeeded
+            self._resume_saves()
+
+        self.log_print(LogLevel.INFO, f"Successfully completed online world backup: {manifest_path.name} ({new_blobs}/{len(files)} files changed, {new_bytes // (1024 * 1024)}MB written, copied {describe_copy_stats(copy_stats)})")
+        self._catalog_backup(manifest_path)
+
+        # Prune old backups
+        if not skip_pruning:
+            self._prune_old_backups(backup_root)
+
+        return manifest_path
+
+
+    def _backup_world_online_streamed(self, world_dir, backup_root, dest_dir, files, skip_pruning):
+        """
+        Internal method to read the files reported by a save query directly into a zip archive in one pass. The server must be in the save hold state.
+        Args:
+            world_dir (Path): The world directory being backed up.
+            backup_root (Path): The root directory where backups are stored.
+            dest_dir (Path): The backup path without the archive suffix, also used as the folder name inside the archive.
+            files (list[tuple[str, int]]): The files and sizes reported by the save query.
+            skip_pruning (bool): If True, skip pruning old backups after creating the backup.
+        """
+        final_path = dest_dir.with_suffix('.zip')
+        temp_path = backup_root / f"{TEMPORARY_BACKUP_PREFIX}_{final_path.name}"
+        resumed = False
+        self.log_print(LogLevel.INFO, "Streaming world files into the backup archive...")
+        try:
+            # The save query reports paths starting with the world folder name
+            relative_files = [(Path(file_path.replace(f"{world_dir.name}/", "", 1)), size) for file_path, size in files]
+            with BACKUP_STAGE_SECONDS.labels("stream").time(), ParallelZipWriter(temp_path, self.compression_workers, 0 if self.config.backup_format == "zip_store" else self.compression_level) as writer:
+                self.maintenance.run_urgent(self._stream_world_files, writer, world_dir, dest_dir.name, relative_files)
+                # Every file has been read, so the server can resume writing while the remaining chunks are compressed
+                self._resume_saves()
+                resumed = True
+            temp_path.rename(final_path)
+        except Exception as e:
+            # Remove the incomplete archive if the backup fails
+            temp_path.unlink(missing_ok=True)
+            self.log_print(LogLevel.ERROR, f"Online world backup failed while streaming files: {e}")
+            if not resumed:
+                self._resume_saves()
+            return None
+
+        self.log_print(LogLevel.INFO, f"Successfully completed online world backup: {final_path.name}")
+        self._catalog_backup(final_path)
+
+        # Prune old backups
+        if not skip_pruning:
+            self._prune_old_backups(backup_root)
+
+        return final_path
+
+
+    def _copy_world_files(self, world_dir, temp_dir, files, copy_stats):
+        """
+        Internal method to copy the files reported by a save query to a temporary folder, run on a maintenance worker.
+        Args:
+            world_dir (Path): The world directory being backed up.
+            temp_dir (Path): The folder to copy the files into.
+            files (list[tuple[str, int]]): The files and sizes reported by the save query.
+            copy_stats (Counter): Incremented with the copy strategy used for each file.
+        """
+        # Copy each file reported by the save query
+        for file_path, bytes in files:
+            # Create source and destination paths for each file
+            source = world_dir / file_path.replace(f"{world_dir.name}/", "")
+            dest = temp_dir / file_path.replace(f"{world_dir.name}/", "")
+            # Ensure the destination directory exists and copy only the requested size of the file
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            copy_file(source, dest, length=bytes, stats=copy_stats)
+
+
+    def _stream_world_files(self, writer, world_dir, folder_name, relative_files):
+        """
+        Internal method to read the files reported by a save query into an archive being written, run on a maintenance worker.
+        Args:
+            writer (ParallelZipWriter): The archive.
+            world_dir (Path): The world directory being backed up.
+            folder_name (str): The folder the files are stored under in the archive.
+            relative_files (list[tuple[Path, int]]): The files relative to the world directory and their sizes.
+        """
+        # Write the folder entries first so the archive has the same layout as one made from a folder
+        writer.add_directory(world_dir, folder_name)
+        folders = sorted({parent for relative_path, _ in relative_files for parent in relative_path.parents if parent != Path(".")})
+        for folder in folders:
+            writer.add_directory(world_dir / folder, f"{folder_name}/{folder.as_posix()}")
+        # Read exactly the number of bytes reported by the save query from each file
+        for relative_path, size in relative_files:
+            writer.add_file(world_dir / relative_path, f"{folder_name}/{relative_path.as_posix()}", size)
+
+
+    def _resume_saves(self):
+        """Internal method to take the server out of the save hold state."""
+        try:
+            self.runner.send_command("save resume")
+        except RuntimeError:
+            self.log_print(LogLevel.ERROR, "Save resume failed, server may still be in hold state.")
+
+
     def smart_backup(self):
         """Perform a backup of the world, choosing online or offline based on server state."""
         with self.runner.lock():
@@ -383,15 +1059,8 @@ class ServerAutomation:
 
 
     def list_backups(self):
-        """List existing backups in the backup directory."""
-        backup_root = Path(self.backup_folder)
-
-        backups = []
-        if backup_root.exists() and backup_root.is_dir():
-            for backup in backup_root.iterdir():
-                # Only list valid backups
-                if backup.name.startswith(OFFLINE_BACKUP_PREFIX) or backup.name.startswith(ONLINE_BACKUP_PREFIX) or backup.name.startswith(PROTECTED_BACKUP_PREFIX):
-                    backups.append(backup.name)
+        """List existing backups in the backup catalog."""
+        backups = [f"{record.name} (protected)" if record.protected else record.name for record in self.catalog.list()]
         if backups:
             # TODO: Format output better
             self.log_print(LogLevel.INFO, f"Existing backups: {', '.join(backups)}")
@@ -399,53 +1068,53 @@ class ServerAutomation:
             self.log_print(LogLevel.INFO, "No backups found.")
 
 
+    def _find_backups(self, identifier, protected):
+        """
+        Internal method to look up the backups an identifier refers to in the catalog.
+        Args:
+            identifier (str): A backup name, "latest", or a date in YYYY-MM-DD format.
+            protected (bool): Whether to look for protected or unprotected backups.
+        Returns:
+            list[BackupRecord]: The matching backups.
+        """
+        if identifier.lower() == "latest":
+            record = self.catalog.latest(protected=protected)
+            return [record] if record is not None else []
+        elif re.match(r'^\d{4}-\d{2}-\d{2}$', identifier):
+            try:
+                day = datetime.strptime(identifier, "%Y-%m-%d").date()
+            except ValueError:
+                return []
+            return self.catalog.on_date(day, protected=protected)
+        record = self.catalog.get(identifier)
+        if record is None or record.kind not in WORLD_BACKUP_KINDS or record.protected != protected:
+            return []
+        return [record]
+
+
     def mark_backup(self, identifier):
         """
         Mark a backup as protected from automatic deletion.
         Args:
             identifier (str): The name of the backup to mark, "latest" for the latest backup, or a date in YYYY-MM-DD format to mark all backups from that date.
         """
-        backup_root = Path(self.backup_folder)
-        if identifier.lower() == "latest":
-            # Find the latest backup
-            latest_backup = None
-            latest_time = None
-            for backup in backup_root.iterdir():
-                if backup.name.startswith(OFFLINE_BACKUP_PREFIX) or backup.name.startswith(ONLINE_BACKUP_PREFIX):
-                    backup_time = datetime.fromtimestamp(backup.stat().st_mtime)
-                    if latest_time is None or backup_time > latest_time:
-                        latest_time = backup_time
-                        latest_backup = backup
-            if latest_backup is not None:
-                protected_name = PROTECTED_BACKUP_PREFIX + "_" + latest_backup.name
-                latest_backup.rename(backup_root / protected_name)
-                self.log_print(LogLevel.INFO, f"Marked latest backup as protected: {protected_name}")
-            else:
+        names = [record.name for record in self._find_backups(identifier, protected=False)]
+        if not names:
+            if identifier.lower() == "latest":
                 self.log_print(LogLevel.WARN, "No backups found to mark as protected.")
-        elif re.match(r'^\d{4}-\d{2}-\d{2}$', identifier):
-            # Mark all backups from the given date
-            date_str = identifier
-            marked_backups = []
-            for backup in backup_root.iterdir():
-                if backup.name.startswith(OFFLINE_BACKUP_PREFIX) or backup.name.startswith(ONLINE_BACKUP_PREFIX):
-                    backup_time = datetime.fromtimestamp(backup.stat().st_mtime)
-                    if backup_time.strftime("%Y-%m-%d") == date_str:
-                        protected_name = PROTECTED_BACKUP_PREFIX + "_" + backup.name
-                        backup.rename(backup_root / protected_name)
-                        marked_backups.append(protected_name)
-            if marked_backups:
-                self.log_print(LogLevel.INFO, f"Marked backups from {date_str} as protected: {', '.join(marked_backups)}")
-            else:
-                self.log_print(LogLevel.WARN, f"No backups found from date {date_str} to mark as protected.")
-        else:
-            # Mark a specific backup by name
-            backup_path = backup_root / identifier
-            if backup_path.exists() and (backup_path.name.startswith(OFFLINE_BACKUP_PREFIX) or backup_path.name.startswith(ONLINE_BACKUP_PREFIX)):
-                protected_name = PROTECTED_BACKUP_PREFIX + "_" + backup_path.name
-                backup_path.rename(backup_root / protected_name)
-                self.log_print(LogLevel.INFO, f"Marked backup as protected: {protected_name}")
+            elif re.match(r'^\d{4}-\d{2}-\d{2}$', identifier):
+                self.log_print(LogLevel.WARN, f"No backups found from date {identifier} to mark as protected.")
             else:
                 self.log_print(LogLevel.WARN, f"Backup '{identifier}' not found to mark as protected.")
+            return
+        # Protection is a catalog flag, the backups themselves are not renamed
+        self.catalog.set_protected(names, True)
+        if identifier.lower() == "latest":
+            self.log_print(LogLevel.INFO, f"Marked latest backup as protected: {names[0]}")
+        elif re.match(r'^\d{4}-\d{2}-\d{2}$', identifier):
+            self.log_print(LogLevel.INFO, f"Marked backups from {identifier} as protected: {', '.join(names)}")
+        else:
+            self.log_print(LogLevel.INFO, f"Marked backup as protected: {names[0]}")
 
 
     def unmark_backup(self, identifier):
@@ -454,52 +1123,30 @@ class ServerAutomation:
         Args:
             identifier (str): The name of the backup to unmark, "latest" for the latest backup, or a date in YYYY-MM-DD format to unmark all backups from that date.
         """
-        backup_root = Path(self.backup_folder)
-        if identifier.lower() == "latest":
-            # Find the latest backup
-            latest_backup = None
-            latest_time = None
-            for backup in backup_root.iterdir():
-                if backup.name.startswith(PROTECTED_BACKUP_PREFIX + "_" + OFFLINE_BACKUP_PREFIX) or backup.name.startswith(PROTECTED_BACKUP_PREFIX + "_" + ONLINE_BACKUP_PREFIX):
-                    backup_time = datetime.fromtimestamp(backup.stat().st_mtime)
-                    if latest_time is None or backup_time > latest_time:
-                        latest_time = backup_time
-                        latest_backup = backup
-            if latest_backup is not None:
-                unprotected_name = latest_backup.name[len(PROTECTED_BACKUP_PREFIX) + 1:]
-                latest_backup.rename(backup_root / unprotected_name)
-                self.log_print(LogLevel.INFO, f"Unmarked latest backup as protected: {unprotected_name}")
-            else:
+        names = [record.name for record in self._find_backups(identifier, protected=True)]
+        if not names:
+            if identifier.lower() == "latest":
                 self.log_print(LogLevel.WARN, "No backups found to unmark as protected.")
-        elif re.match(r'^\d{4}-\d{2}-\d{2}$', identifier):
-            # Unmark all backups from the given date
-            date_str = identifier
-            unmarked_backups = []
-            for backup in backup_root.iterdir():
-                if backup.name.startswith(PROTECTED_BACKUP_PREFIX + "_" + OFFLINE_BACKUP_PREFIX) or backup.name.startswith(PROTECTED_BACKUP_PREFIX + "_" + ONLINE_BACKUP_PREFIX):
-                    backup_time = datetime.fromtimestamp(backup.stat().st_mtime)
-                    if backup_time.strftime("%Y-%m-%d") == date_str:
-                        unprotected_name = backup.name[len(PROTECTED_BACKUP_PREFIX) + 1:]
-                        backup.rename(backup_root / unprotected_name)
-                        unmarked_backups.append(unprotected_name)
-            if unmarked_backups:
-                self.log_print(LogLevel.INFO, f"Unmarked backups from {date_str} as protected: {', '.join(unmarked_backups)}")
-            else:
-                self.log_print(LogLevel.WARN, f"No backups found from date {date_str} to unmark as protected.")
-        else:
-            # Unmark a specific backup by name
-            backup_path = backup_root / identifier
-            if backup_path.exists() and (backup_path.name.startswith(PROTECTED_BACKUP_PREFIX + "_" + OFFLINE_BACKUP_PREFIX) or backup_path.name.startswith(PROTECTED_BACKUP_PREFIX + "_" + ONLINE_BACKUP_PREFIX)):
-                unprotected_name = backup_path.name[len(PROTECTED_BACKUP_PREFIX) + 1:]
-                backup_path.rename(backup_root / unprotected_name)
-                self.log_print(LogLevel.INFO, f"Unmarked backup as protected: {unprotected_name}")
+            elif re.match(r'^\d{4}-\d{2}-\d{2}$', identifier):
+                self.log_print(LogLevel.WARN, f"No backups found from date {identifier} to unmark as protected.")
             else:
                 self.log_print(LogLevel.WARN, f"Backup '{identifier}' not found to unmark as protected.")
+            return
+        self.catalog.set_protected(names, False)
+        if identifier.lower() == "latest":
+            self.log_print(LogLevel.INFO, f"Unmarked latest backup as protected: {names[0]}")
+        elif re.match(r'^\d{4}-\d{2}-\d{2}$', identifier):
+            self.log_print(LogLevel.INFO, f"Unmarked backups from {identifier} as protected: {', '.join(names)}")
+        else:
+            self.log_print(LogLevel.INFO, f"Unmarked backup as protected: {names[0]}")
 
 
     def switch_to_backup_world(self, backup_name):
         """
         Switch the server's world to the specified backup.
+        The backup is restored next to the world first, then the current world is renamed aside and the restored one
+        renamed into place, so a failure at any point leaves a working world. The previous world becomes the pre-switch
+        offline backup as it is, without being copied.
         Args:
             backup_name (str): The name of the backup to switch to.
         """
@@ -511,48 +1158,97 @@ class ServerAutomation:
 
             # Prepare paths
             world_dir = Path(self.server_folder) / WORLDS_FOLDER_NAME / self.world_name
-            backup_path = Path(self.backup_folder) / backup_name
+            backup_root = Path(self.backup_folder)
+            backup_path = backup_root / backup_name
 
             # Check if the backup exists
             if not backup_path.exists():
                 self.log_print(LogLevel.ERROR, f"Backup '{backup_name}' does not exist.")
                 return False
 
-            # Make an offline backup of the current world before switching and skip pruning to avoid deleting this backup (edge case)
-            self.log_print(LogLevel.INFO, "Creating offline backup of current world before switching...")
-            self._backup_world_offline(skip_pruning=True)
-
-            # Remove the current world directory
-            self.log_print(LogLevel.INFO, f"Removing current world directory '{world_dir.name}'...")
+            # Stage the backup beside the world so the final rename stays on the same filesystem
+            staging_dir = world_dir.parent / f"{TEMPORARY_BACKUP_PREFIX}_restore_{world_dir.name}"
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            self.log_print(LogLevel.INFO, f"Restoring backup '{backup_name}' next to world directory '{world_dir.name}'...")
             try:
-                shutil.rmtree(world_dir)
+                if self.repository.is_manifest(backup_path):
+                    # Rebuild the world from the repository blobs if the backup is a manifest
+                    copy_stats = self.repository.restore(backup_path, staging_dir)
+                    self.log_print(LogLevel.INFO, f"Restored {describe_copy_stats(copy_stats)}")
+                elif backup_path.is_file():
+                    # Extract the archive if the backup is compressed, its format is detected from its contents
+                    files, size = extract_archive_folder(backup_path, staging_dir)
+                    self.log_print(LogLevel.INFO, f"Extracted {files} files ({size // (1024 * 1024)}MB)")
+                else:
+                    # Hard-link the immutable files of a folder backup and copy the rest
+                    copy_stats = Counter()
+                    link_or_copy_tree(backup_path, staging_dir, stats=copy_stats)
+                    self.log_print(LogLevel.INFO, f"Restored {describe_copy_stats(copy_stats)}")
             except Exception as e:
-                self.log_print(LogLevel.ERROR, f"Failed to remove current world directory: {e}")
+                shutil.rmtree(staging_dir, ignore_errors=True)
+                self.log_print(LogLevel.ERROR, f"Failed to restore backup '{backup_name}', the current world was not changed: {e}")
                 return False
 
-            # Restore the backup to the world directory
-            self.log_print(LogLevel.INFO, f"Restoring backup '{backup_name}' to world directory '{world_dir.name}'...")
+            # Swap the restored world in, keeping the current world aside as the pre-switch backup
+            timestamp = strftime(BACKUP_TIMESTAMP_FORMAT)
+            pre_switch_dir = backup_root / f"{OFFLINE_BACKUP_PREFIX}_{timestamp}"
+            aside_dir = world_dir.parent / f"{TEMPORARY_BACKUP_PREFIX}_{pre_switch_dir.name}"
             try:
-                if backup_path.suffix == '.zip':
-                    # Extract the zip archive if the backup is compressed
-                    shutil.unpack_archive(backup_path, extract_dir=world_dir.parent)
-                    # The zip's internal folder uses the original name, so strip any "protected_" prefix
-                    stem = backup_path.stem
-                    if stem.startswith(PROTECTED_BACKUP_PREFIX + "_"):
-                        stem = stem[len(PROTECTED_BACKUP_PREFIX) + 1:]
-                    extracted_dir = world_dir.parent / stem
-                    extracted_dir.rename(world_dir)
-                else:
-                    # Copy the backup directory if it is not compressed
-                    shutil.copytree(backup_path, world_dir)
-            except Exception as e:
-                self.log_print(LogLevel.ERROR, f"Failed to restore backup '{backup_name}': {e}")
+                had_world = swap_directory(staging_dir, world_dir, aside_dir)
+            except OSError as e:
+                shutil.rmtree(staging_dir, ignore_errors=True)
+                self.log_print(LogLevel.ERROR, f"Failed to switch world to backup '{backup_name}', the current world was not changed: {e}")
                 return False
 
+            # Move the previous world into the backup folder, a rename unless the backup folder is on another filesystem
+            if had_world:
+                try:
+                    # shutil.move would move the world inside an existing folder of the same name
+                    if pre_switch_dir.exists():
+                        raise FileExistsError(f"'{pre_switch_dir.name}' already exists")
+                    shutil.move(aside_dir, pre_switch_dir)
+                    self.log_print(LogLevel.INFO, f"Kept the previous world as offline backup '{pre_switch_dir.name}'.")
+                    self._catalog_backup(pre_switch_dir)
+                except Exception as e:
+                    self.log_print(LogLevel.WARN, f"Failed to move the previous world into the backup folder, it was left at '{aside_dir}': {e}")
+
             self.log_print(LogLevel.INFO, f"Successfully switched world to backup '{backup_name}'.")
             return True
 
 
+    def archive_logs(self):
+        """Compress the log files of past days into searchable archives."""
+        # Only one archive pass at a time, the startup pass can overlap with a rotation
+        with self._archive_lock:
+            try:
+                archived, text_bytes, archive_bytes = self.log_archive.archive_past_days(self.logger.log_file_path)
+            except Exception as e:
+                self.log_print(LogLevel.ERROR, f"Failed to archive old logs: {e}")
+                return
+        if archived:
+            self.log_print(LogLevel.INFO, f"Archived {archived} log file(s), {text_bytes / (1024 * 1024):.1f} MB compressed to {archive_bytes / (1024 * 1024):.1f} MB.")
+
+
+    def search_logs(self, start, end, pattern=None, limit=LOG_SEARCH_LIMIT):
+        """
+        Find the logged lines between two times.
+        Args:
+            start (datetime): The start of the range (inclusive).
+            end (datetime): The end of the range (inclusive).
+            pattern (str | None): If given, a case-insensitive regular expression that lines must contain.
+            limit (int): The maximum number of lines to return.
+        Returns:
+            tuple[list[str], bool]: The matching lines, oldest first, and whether more lines matched than the limit.
+        Raises:
+            re.error: If the pattern is not a valid regular expression.
+        """
+        compiled = re.compile(pattern, re.IGNORECASE) if pattern else None
+        # Make sure everything logged so far is in today's file
+        self.logger.flush()
+        lines = list(islice(self.log_archive.search(start, end, compiled), limit + 1))
+        return lines[:limit], len(lines) > limit
+
+
     def check_for_updates(self):
         """
         Check for Bedrock server updates, uses the platform to determine the correct download type.
@@ -595,6 +1291,7 @@ class ServerAutomation:
             # Copy the server files to a temporary location first so incomplete backups are not stored
             try:
                 temp_dir.mkdir(parents=True, exist_ok=True)
+                copy_stats = Counter()
                 # Copy all files and folders except the worlds inside the worlds folder
                 if self.config.update_backup_paths == "all":
                     for entry in server_dir.iterdir():
@@ -602,10 +1299,10 @@ class ServerAutomation:
                         if entry.name == WORLDS_FOLDER_NAME:
                             target.mkdir(parents=True, exist_ok=True)
                         elif entry.is_dir():
-                            shutil.copytree(entry, target, dirs_exist_ok=True)
+                            copy_tree(entry, target, dirs_exist_ok=True, stats=copy_stats)
                         else:
                             target.parent.mkdir(parents=True, exist_ok=True)
-                            shutil.copy2(entry, target)
+                            copy_file(entry, target, stats=copy_stats)
                 # Copy only the specified paths in the config
                 else:
                     for relative_path in self.config.update_backup_paths:
@@ -614,13 +1311,14 @@ class ServerAutomation:
                         if source.name == WORLDS_FOLDER_NAME:
                             self.log_print(LogLevel.WARN, f"Skipping worlds folder in server files backup: {source}")
                         elif source.is_dir():
-                            shutil.copytree(source, target, dirs_exist_ok=True)
+                            copy_tree(source, target, dirs_exist_ok=True, stats=copy_stats)
                         elif source.exists():
                             target.parent.mkdir(parents=True, exist_ok=True)
-                            shutil.copy2(source, target)
+                            copy_file(source, target, stats=copy_stats)
                         else:
                             self.log_print(LogLevel.WARN, f"Specified backup path does not exist, skipping: {source}")
                 temp_dir.rename(dest_dir)
+                self.log_print(LogLevel.INFO, f"Copied {describe_copy_stats(copy_stats)}")
             except Exception as e:
                 # Remove the temporary directory if the backup fails
                 if temp_dir.exists():
@@ -631,17 +1329,10 @@ class ServerAutomation:
                 return None
             
             # Compress the backup directory
-            final_path = dest_dir
-            try:
-                # Compress the backup directory
-                shutil.make_archive(str(dest_dir), 'zip', root_dir=backup_root, base_dir=dest_dir.name)
-                # Remove the uncompressed backup directory
-                shutil.rmtree(dest_dir, ignore_errors=True)
-                final_path = dest_dir.with_suffix('.zip')
-            except Exception as e:
-                self.log_print(LogLevel.WARN, f"Server files backup compression failed, keeping folder backup: {e}")
+            final_path = self._compress_backup(dest_dir, backup_root, "Server files backup")
 
             self.log_print(LogLevel.INFO, f"Successfully completed server files backup: {final_path.name}")
+            self._catalog_backup(final_path)
 
             # Prune old backups from the backup directory
             if not skip_pruning:
@@ -651,34 +1342,34 @@ class ServerAutomation:
             return final_path
 
     
-    def _extract_update_files(self, download_path):
+    def _extract_update_files(self, download_path, version=None):
         """
-        Extract the downloaded update zip directly into the server folder, skipping protected paths.
+        Apply the downloaded update zip to the server folder, writing only files that changed and skipping protected paths.
+        The zip's central directory (size and CRC32 of every file) is compared with the manifest of the files installed by
+        the last update, unchanged files are left alone and files the new version no longer ships are deleted.
         Args:
             download_path (Path): The path to the downloaded update zip file.
+            version (str | None): The version being installed, recorded in the manifest.
+        Returns:
+            bool: True if the update was applied, False otherwise.
         """
-        self.log_print(LogLevel.INFO, "Extracting update files to server folder...")
+        self.log_print(LogLevel.INFO, "Comparing update files with the installed server files...")
         server_dir = Path(self.server_folder)
         try:
             with zipfile.ZipFile(download_path, 'r') as zf:
-                # Grab all files in the zip
-                files = [x for x in zf.infolist() if not x.is_dir()]
-                total = len(files)
+                plan = plan_update(zf.infolist(), server_dir, self.protected_paths, load_install_manifest(server_dir))
+                for file in plan.protected:
+                    self.log_print(LogLevel.INFO, f"Skipping protected file: {file.filename}")
+
+                # The manifest no longer describes the folder once files are being replaced, so remove it until the
+                # update completes (without one, the next update compares CRCs of the files on disk instead)
+                (server_dir / INSTALL_MANIFEST_NAME).unlink(missing_ok=True)
+
+                total = len(plan.extract)
                 last_logged = -1
-                # For every file, check if it is protected before extracting, and log progress every 25%
-                for i, file in enumerate(files):
-                    relative_path = Path(file.filename)
-
-                    # Check if the file or any of its parent directories are protected
-                    is_protected = any(
-                        relative_path == Path(p) or Path(p) in relative_path.parents
-                        for p in self.config.update_protected_paths
-                    )
-                    if is_protected:
-                        self.log_print(LogLevel.INFO, f"Skipping protected file: {relative_path}")
-                        continue
-
-                    dest = server_dir / relative_path
+                # Extract every new or changed file, and log progress every 25%
+                for i, file in enumerate(plan.extract):
+                    dest = server_dir / file.filename
                     dest.parent.mkdir(parents=True, exist_ok=True)
                     with zf.open(file) as src, open(dest, 'wb') as dst:
                         shutil.copyfileobj(src, dst)
@@ -690,14 +1381,64 @@ class ServerAutomation:
                         last_logged = percent
                 # Log completion at 100%
                 self.log_print(LogLevel.INFO, f"Extracting update files: 100% ({total}/{total} files)")
+
+            # Delete the files the new version no longer ships, along with any folders left empty
+            for name in plan.removed:
+                path = server_dir / name
+                path.unlink(missing_ok=True)
+                for parent in path.parents:
+                    if parent == server_dir or not parent.is_relative_to(server_dir) or not parent.exists() or any(parent.iterdir()):
+                        break
+                    parent.rmdir()
+            save_install_manifest(server_dir, plan.manifest, version)
         except Exception as e:
             self.log_print(LogLevel.CRITICAL, f"Failed to extract update files, server may be in a non-functional state: {e}")
             return False
 
-        self.log_print(LogLevel.INFO, "Update files extracted successfully.")
+        written = sum(file.file_size for file in plan.extract)
+        skipped = sum(file.file_size for file in plan.skipped)
+        self.log_print(LogLevel.INFO, f"Update files applied: {len(plan.extract)} written ({written // DOWNLOAD_CHUNK_SIZE}MB), {len(plan.skipped)} unchanged skipped ({skipped // DOWNLOAD_CHUNK_SIZE}MB), {len(plan.removed)} removed.")
         return True
 
 
+    def _download_update(self, updateInfo: UpdateInfo):
+        """
+        Get the archive of an update from the artifact cache, downloading it over several connections if it is not cached.
+        An interrupted download is resumed from where it stopped the next time the update is attempted.
+        Args:
+            updateInfo (UpdateInfo): The update to get.
+        Returns:
+            Path | None: The cached archive, or None if the download failed.
+        """
+        last_logged = -1
+
+        def report(downloaded, total):
+            nonlocal last_logged
+            if total:
+                percent = downloaded * 100 // total
+                # Log progress every 25% or on completion
+                if percent // 25 > last_logged // 25:
+                    self.log_print(LogLevel.INFO, f"Downloading update zip: {percent}% ({downloaded // DOWNLOAD_CHUNK_SIZE}MB / {total // DOWNLOAD_CHUNK_SIZE}MB)")
+                    last_logged = percent
+
+        self.log_print(LogLevel.INFO, f"Downloading update from {updateInfo.download_url}...")
+        download_start = perf_counter()
+        try:
+            path, fetched = self.update_cache.fetch(updateInfo.latest_version, updateInfo.download_url, self.config.download_connections, report)
+        except Exception as e:
+            self.log_print(LogLevel.ERROR, f"Failed to download update, the partial download is kept and will be resumed: {e}")
+            return None
+        if not fetched:
+            self.log_print(LogLevel.INFO, f"Using cached download of version {updateInfo.latest_version}.")
+            return path
+        download_seconds = perf_counter() - download_start
+        UPDATE_DOWNLOAD_BYTES.inc(fetched)
+        UPDATE_DOWNLOAD_SECONDS.observe(download_seconds)
+        UPDATE_DOWNLOAD_THROUGHPUT.set(fetched / download_seconds if download_seconds > 0 else 0)
+        self.log_print(LogLevel.INFO, f"Download completed ({fetched // DOWNLOAD_CHUNK_SIZE}MB in {download_seconds:.1f}s).")
+        return path
+
+
     def update_server(self):
         """
         Update the Bedrock server to the latest version.
@@ -705,6 +1446,7 @@ class ServerAutomation:
             _get_bedrock_update_info: to check for updates and get the download URL.
             _backup_server_files: to backup server files before updating.
             _extract_update_files: to extract the downloaded update files to the server folder.
+            _update_staged: to build the update beside the server and swap it in, if update_mode is "staged".
         """
         # Verify the current version is known before proceeding with an update
         server_dir = Path(self.server_folder)
@@ -719,7 +1461,11 @@ class ServerAutomation:
             return "Update check failed; cannot proceed with update."
         elif not updateInfo.update_available:
             return f"No update available, you are running the latest version: {updateInfo.latest_version}."
-        
+
+        # Build the new version beside the running server instead of writing into it
+        if self.config.update_mode == "staged":
+            return self._update_staged(updateInfo)
+
         with self.runner.lock():
             # Refuse to update if the server is running
             if self.runner.is_running():
@@ -728,64 +1474,179 @@ class ServerAutomation:
             
             self.log_print(LogLevel.INFO, f"Updating server from version {self.current_version} to {updateInfo.latest_version}...")
 
-            # Prepare paths to update the backup
-            temp_dir = Path(f"{TEMPORARY_BACKUP_PREFIX}_bedrock_update")
-            download_path = temp_dir / "update.zip"
-
             # Backup the world and server files before updating
             self.log_print(LogLevel.INFO, "Creating offline backups of current world and server files before updating...")
             if not (self._backup_world_offline(skip_pruning=True) and self._backup_server_files(skip_pruning=True)):
                 self.log_print(LogLevel.ERROR, "Failed to create backups before update.")
                 return "Failed to create backups before update."
 
-            # Download the new server files
-            self.log_print(LogLevel.INFO, f"Downloading update from {updateInfo.download_url}...")
-            try:
-                temp_dir.mkdir(parents=True, exist_ok=True)
-                headers = {
-                    "User-Agent": "BedrockUpdater",
-                    "Accept": "*/*",
-                    "Accept-Encoding": "identity",  # Disable compression so Content-Length is accurate
-                }
-                with requests.get(updateInfo.download_url, headers=headers, stream=True, timeout=(DOWNLOAD_CONNECT_TIMEOUT_SECONDS, DOWNLOAD_READ_TIMEOUT_SECONDS)) as resp:
-                    resp.raise_for_status()
-                    with open(download_path, "wb") as f:
-                        total = int(resp.headers.get('Content-Length', 0))
-                        downloaded = 0
-                        last_logged = -1
-                        for chunk in resp.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
-                            if chunk:
-                                f.write(chunk)
-                                downloaded += len(chunk)
-                                if total:
-                                    percent = downloaded * 100 // total
-                                    # Log progress every 25% or on completion
-                                    if percent // 25 > last_logged // 25:
-                                        self.log_print(LogLevel.INFO, f"Downloading update zip: {percent}% ({downloaded // DOWNLOAD_CHUNK_SIZE}MB / {total // DOWNLOAD_CHUNK_SIZE}MB)")
-                                        last_logged = percent
-            except Exception as e:
-                # Clean temp if created
-                try:
-                    shutil.rmtree(temp_dir, ignore_errors=True)
-                except Exception:
-                    self.log_print(LogLevel.WARN, f"Failed to clean up temporary files after download failure: {temp_dir}")
-                self.log_print(LogLevel.ERROR, f"Failed to download update: {e}")
+            # Get the new server files from the cache, or download them into it
+            download_path = self._download_update(updateInfo)
+            if download_path is None:
                 return "Failed to download update."
-            self.log_print(LogLevel.INFO, "Download completed.")
 
             # Extract the downloaded files to the server folder (overwrite existing files)
-            success = self._extract_update_files(download_path)
-
-            # Clean up the downloaded zip file and temporary directory
-            self.log_print(LogLevel.INFO, "Cleaning up temporary files...")
-            try:
-                shutil.rmtree(temp_dir, ignore_errors=True)
-            except Exception as e:
-                self.log_print(LogLevel.WARN, f"Failed to clean up temporary files after update: {temp_dir}, error: {e}")
+            success = self._extract_update_files(download_path, updateInfo.latest_version)
 
             if not success:
                 return "Update failed during file extraction."
 
             self.current_version = updateInfo.latest_version
             self.log_print(LogLevel.INFO, f"Server updated successfully to version {updateInfo.latest_version}.")
-            return f"Server updated successfully to version {updateInfo.latest_version}."
\ No newline at end of file
+            return f"Server updated successfully to version {updateInfo.latest_version}."
+
+
+    def _install_dirs(self):
+        """
+        Get the live install and the sibling folders used by staged updates.
+        Returns:
+            tuple[Path, Path, Path]: The live install, the staged install and the previous install.
+        """
+        server_dir = Path(self.server_folder).absolute()
+        return server_dir, server_dir.with_name(server_dir.name + STAGED_INSTALL_SUFFIX), server_dir.with_name(server_dir.name + PREVIOUS_INSTALL_SUFFIX)
+
+
+    def _update_staged(self, updateInfo: UpdateInfo):
+        """
+        Update the server by building the new version in a sibling folder while the server keeps running, then stopping
+        it only long enough to move the worlds and other user data across and swap the folders with renames.
+        The replaced install is kept beside the server so rollback_server can swap it back.
+        Args:
+            updateInfo (UpdateInfo): The update to install.
+        Returns:
+            str: The result of the update.
+        """
+        self.log_print(LogLevel.INFO, f"Updating server from version {self.current_version} to {updateInfo.latest_version} (staged)...")
+        if not self._stage_update(updateInfo):
+            return "Update failed while staging the new version."
+
+        # Back up the world before it is moved, online if the server is running
+        self.log_print(LogLevel.INFO, "Creating a backup of the world before swapping in the update...")
+        with self.runner.lock():
+            backup = self._backup_world_online(skip_pruning=True) if self.runner.is_running() else self._backup_world_offline(skip_pruning=True)
+        if not backup:
+            shutil.rmtree(self._install_dirs()[1], ignore_errors=True)
+            self.log_print(LogLevel.ERROR, "Failed to create a backup before update.")
+            return "Failed to create a backup before update."
+
+        if not self._install_staged_update(updateInfo.latest_version):
+            return "Update failed while swapping in the new version, the server was not changed."
+        return f"Server updated successfully to version {updateInfo.latest_version}."
+
+
+    def _stage_update(self, updateInfo: UpdateInfo):
+        """
+        Internal method to build an update in the staged install folder beside the server, without touching the server.
+        Args:
+            updateInfo (UpdateInfo): The update to stage.
+        Returns:
+            bool: True if the update is ready to be swapped in with _install_staged_update, False otherwise.
+        """
+        server_dir, staged_dir, _ = self._install_dirs()
+
+        # Get the new server files from the cache, or download them into it
+        download_path = self._download_update(updateInfo)
+        if download_path is None:
+            return False
+
+        # Build the new install beside the live one, copying unchanged files from it and extracting the rest
+        self.log_print(LogLevel.INFO, f"Staging version {updateInfo.latest_version} in '{staged_dir.name}'...")
+        manifest = load_install_manifest(server_dir)
+        copy_stats = Counter()
+        try:
+            # Remove what is left of an earlier attempt
+            shutil.rmtree(staged_dir, ignore_errors=True)
+            plan = self.maintenance.run(stage_install, download_path, server_dir, staged_dir, self.protected_paths, manifest, copy_stats)
+            save_install_manifest(staged_dir, plan.manifest, updateInfo.latest_version)
+        except Exception as e:
+            shutil.rmtree(staged_dir, ignore_errors=True)
+            self.log_print(LogLevel.ERROR, f"Failed to stage update, the server was not changed: {e}")
+            return False
+        extracted = sum(file.file_size for file in plan.extract)
+        self.log_print(LogLevel.INFO, f"Staged {len(plan.extract)} changed files ({extracted // DOWNLOAD_CHUNK_SIZE}MB), copied {describe_copy_stats(copy_stats)} unchanged from the current install.")
+        return True
+
+
+    def _install_staged_update(self, version):
+        """
+        Internal method to swap a staged update in, stopping and starting the server around the swap if it is running.
+        Args:
+            version (str): The version that was staged.
+        Returns:
+            bool: True if the update was installed, False if the server was left unchanged.
+        """
+        server_dir, staged_dir, previous_dir = self._install_dirs()
+        if load_installed_version(staged_dir) != version:
+            self.log_print(LogLevel.ERROR, f"The staged install is not version {version}, the server was not changed.")
+            return False
+
+        # The install replaced by the last update is no longer needed once this one is ready
+        shutil.rmtree(previous_dir, ignore_errors=True)
+
+        if not self._swap_install(staged_dir, server_dir, previous_dir, load_install_manifest(server_dir)):
+            shutil.rmtree(staged_dir, ignore_errors=True)
+            return False
+
+        self.current_version = version
+        self.log_print(LogLevel.INFO, f"Server updated successfully to version {version}, use ':rollback' to return to the previous install.")
+        return True
+
+
+    def _swap_install(self, staged_dir, server_dir, aside_dir, manifest):
+        """
+        Internal method to stop the server, swap a staged install in, and start the server again if it was running.
+        Args:
+            staged_dir (Path): The install to make live.
+            server_dir (Path): The live install.
+            aside_dir (Path): Where the replaced install is moved to.
+            manifest (dict | None): The manifest of the live install, its files are not moved across.
+        Returns:
+            bool: True if the install was swapped, False if the live install was left unchanged.
+        """
+        with self.runner.lock():
+            was_running = self.runner.is_running()
+            swap_start = perf_counter()
+            if was_running:
+                self.log_print(LogLevel.INFO, "Stopping server to swap installs...")
+                self.runner.stop()
+            try:
+                moved = swap_install(staged_dir, server_dir, aside_dir, self.protected_paths, set(manifest) if manifest is not None else None)
+                swapped = True
+            except OSError as e:
+                self.log_print(LogLevel.ERROR, f"Failed to swap installs, the current install is unchanged: {e}")
+                swapped = False
+            if was_running:
+                self.runner.start()
+            swap_seconds = perf_counter() - swap_start
+            UPDATE_SWAP_SECONDS.observe(swap_seconds)
+        if swapped:
+            self.log_print(LogLevel.INFO, f"Swapped installs in {swap_seconds:.1f}s, {moved} worlds, files and folders carried across.")
+        return swapped
+
+
+    def rollback_server(self):
+        """
+        Swap the install replaced by the last staged update back in, the rolled back install is kept so it can be swapped
+        in again.
+        Returns:
+            str: The result of the rollback.
+        """
+        server_dir, _, previous_dir = self._install_dirs()
+        if not previous_dir.is_dir():
+            self.log_print(LogLevel.ERROR, "No previous install to roll back to.")
+            return "No previous install to roll back to."
+
+        previous_version = load_installed_version(previous_dir)
+        self.log_print(LogLevel.INFO, f"Rolling back server from version {self.current_version} to {previous_version or 'the previous install'}...")
+        aside_dir = server_dir.with_name(f"{TEMPORARY_BACKUP_PREFIX}_{server_dir.name}{PREVIOUS_INSTALL_SUFFIX}")
+        if not self._swap_install(previous_dir, server_dir, aside_dir, load_install_manifest(server_dir)):
+            return "Rollback failed, the server was not changed."
+
+        # The install rolled back from becomes the one a further rollback returns to
+        try:
+            aside_dir.rename(previous_dir)
+        except OSError as e:
+            self.log_print(LogLevel.WARN, f"Failed to keep the rolled back install as '{previous_dir.name}', it was left in '{aside_dir.name}': {e}")
+        self.current_version = previous_version
+        self.log_print(LogLevel.INFO, f"Rolled back to version {previous_version or 'unknown'}.")
+        return f"Rolled back to version {previous_version or 'unknown'}."
@@ -4,7 +4,7 @@ import sys
 import re
 import platform
 from enum import Enum
-from utils import Platform
+from utils import Platform, ZSTD_AVAILABLE
 
 
 # Constants
@@ -12,6 +12,13 @@ SETTINGS_FILE = "settings.toml"
 SERVER_PROPERTIES_FILE = "server.properties"
 LEVEL_NAME_KEY = "level-name"
 DEFAULT_WORLD_NAME = "Bedrock level"
+ONLINE_BACKUP_MODES = ("archive", "stream", "repository")
+OFFLINE_BACKUP_MODES = ("archive", "snapshot")
+UPDATE_MODES = ("staged", "in_place")
+STDOUT_READER_MODES = ("batch", "line")
+LOG_FSYNC_POLICIES = ("never", "rotate", "always")
+MAINTENANCE_PRIORITIES = ("idle", "low", "normal")
+BACKUP_ARCHIVE_FORMATS = ("zip_deflate", "zip_store", "tar_zstd", "tar_xz")
 
 
 class ServerConfig:
@@ -30,13 +37,15 @@ class ServerConfig:
         FOLDER = 7
         TIME = 8
         PLATFORM = 9
+        CHOICE = 10
 
     class SettingContainer:
-        """Container for a setting value, its name, and type."""
-        def __init__(self, setting_value, setting_name, setting_type):
+        """Container for a setting value, its name, type, and allowed choices (a tuple for CHOICE, an optional range for INTEGER)."""
+        def __init__(self, setting_value, setting_name, setting_type, choices=None):
             self.setting_value = setting_value
             self.setting_name = setting_name
             self.setting_type = setting_type
+            self.choices = choices
 
     # A sample if no config exists
     SAMPLE_TOML = f"""\
@@ -92,6 +101,159 @@ class ServerConfig:
     # List of server files/folders to back up before performing an update, must be relative to the server folder (worlds are always backed up).
     # Allowed Values: [string, string, ...] | all
 
+    # online_backup_mode (optional)
+    # How online backups are stored. "archive" copies the world to a temporary folder then zips it, "stream" reads the world straight into the zip without a temporary folder,
+    # "repository" stores each file once by content hash and writes a small manifest per backup.
+    #online_backup_mode="archive"
+    # Allowed Values: "archive", "stream", "repository"
+
+    # backup_format (optional)
+    # Format of backup archives. "zip_deflate" is a zip compressed on compression_workers cores, "zip_store" is an uncompressed zip (fastest),
+    # "tar_zstd" is a tar compressed with zstd on compression_workers threads (needs the zstandard package), "tar_xz" is a tar compressed with xz (smallest, slowest).
+    # Streamed online backups (online_backup_mode="stream") are always zips. Restores detect the format of each backup, so it can be changed at any time.
+    # Run benchmarks/backup_format_benchmark.py on your world to compare them.
+    #backup_format="zip_deflate"
+    # Allowed Values: "zip_deflate", "zip_store", "tar_zstd", "tar_xz"
+
+    # compression_workers (optional)
+    # Number of processes used to compress zip_deflate backup archives, or threads for tar_zstd. Defaults to the number of CPU cores.
+    #compression_workers=4
+    # Allowed Values: 1 to 64
+
+    # compression_level (optional)
+    # Deflate level used for zip_deflate backup archives, or the xz preset for tar_xz; higher is smaller but slower. LevelDB .ldb files are always stored uncompressed in zips since they are already compressed.
+    #compression_level=6
+    # Allowed Values: 0 to 9
+
+    # zstd_level (optional)
+    # zstd level used for tar_zstd backup archives; higher is smaller but slower.
+    #zstd_level=3
+    # Allowed Values: 1 to 22
+
+    # offline_backup_mode (optional)
+    # How offline backups (eg. during the scheduled restart) are stored. "archive" copies and zips the world, "snapshot" keeps an uncompressed folder that hard-links files unchanged since the previous snapshot.
+    #offline_backup_mode="archive"
+    # Allowed Values: "archive", "snapshot"
+
+    # stdout_reader_mode (optional)
+    # How server output is read. "batch" reads large chunks from the pipe and hands subscribers whole batches of lines, "line" reads and handles one line at a time.
+    # Formatting each line costs more than reading it, so "batch" is only modestly faster (about 5-30% more lines per second in benchmarks/stdout_reader_benchmark.py).
+    #stdout_reader_mode="batch"
+    # Allowed Values: "batch", "line"
+
+    # log_flush_bytes (optional)
+    # Number of buffered log bytes that makes the log writer flush to the log file early.
+    #log_flush_bytes=65536
+    # Allowed Values: 1 to 67108864
+
+    # log_flush_interval (optional)
+    # Maximum number of seconds a log message waits in memory before it is written to the log file.
+    #log_flush_interval=1
+    # Allowed Values: 1 to 3600
+
+    # log_fsync (optional)
+    # When the log file is forced to disk. "never" leaves it to the operating system, "rotate" syncs when a day's log file is closed, "always" syncs after every flush.
+    #log_fsync="rotate"
+    # Allowed Values: "never", "rotate", "always"
+
+    # backup_interval (optional)
+    # Minutes between automatic online backups while the server is running, 0 disables them.
+    #backup_interval=0
+    # Allowed Values: 0 to 10080
+
+    # backup_max_players (optional)
+    # Periodic backups are postponed while more players than this are online, 0 disables the check.
+    #backup_max_players=0
+    # Allowed Values: 0 to 1000
+
+    # backup_max_cpu (optional)
+    # Periodic backups are postponed while the server uses more CPU than this, in percent of one core. 0 disables the check.
+    #backup_max_cpu=80
+    # Allowed Values: 0 to 6400
+
+    # backup_max_latency (optional)
+    # Periodic backups are postponed while the server takes longer than this many milliseconds to answer a command. 0 disables the check.
+    #backup_max_latency=0
+    # Allowed Values: 0 to 60000
+
+    # backup_max_delay (optional)
+    # The longest in minutes a periodic backup is postponed for while the server is busy, after which it runs regardless.
+    #backup_max_delay=60
+    # Allowed Values: 0 to 1440
+
+    # stats_interval (optional)
+    # Seconds between samples of the server's CPU, memory, disk I/O, threads and open files (":stats", "!status"). 0 disables sampling.
+    #stats_interval=10
+    # Allowed Values: 0 to 3600
+
+    # stats_history (optional)
+    # Number of samples kept for the averages and peaks reported by ":stats" and "!status".
+    #stats_history=360
+    # Allowed Values: 1 to 100000
+
+    # restart_rss_limit (optional)
+    # Megabytes of memory the server may use before it is warned and restarted gracefully, 0 disables the limit. Requires stats_interval.
+    #restart_rss_limit=0
+    # Allowed Values: 0 to 1048576
+
+    # update_check_interval (optional)
+    # Hours between checks for server updates, which are installed automatically if auto_update is enabled. 0 disables them.
+    #update_check_interval=0
+    # Allowed Values: 0 to 168
+
+    # update_mode (optional)
+    # How updates are installed. "staged" builds the new version beside the server while it keeps running, then stops it only to swap the folders (":rollback" swaps back),
+    # "in_place" requires the server to be stopped and writes the changed files into the server folder.
+    #update_mode="in_place"
+    # Allowed Values: "staged", "in_place"
+
+    # download_connections (optional)
+    # Number of connections server updates are downloaded over, each fetching its own part of the file.
+    #download_connections=4
+    # Allowed Values: 1 to 16
+
+    # update_cache_folder (optional)
+    # The folder where downloaded server versions are kept, so reinstalling or rolling back needs no download.
+    #update_cache_folder="update_cache"
+    # Allowed Values: Any valid folder path.
+
+    # update_cache_versions (optional)
+    # Number of downloaded server versions kept in the update cache, the least recently used are deleted first.
+    #update_cache_versions=3
+    # Allowed Values: 1 to 100
+
+    # maintenance_priority (optional)
+    # Priority of the work done beside the running server (online backups, compression, pruning, staging updates, verification). "idle" only uses the disk when the server does not
+    # (except for copies made while the server's saves are held, which use "low" disk priority), "low" uses the lowest normal disk priority,
+    # both also lower the CPU priority (nice). "normal" runs it at the same priority as the server.
+    #maintenance_priority="normal"
+    # Allowed Values: "idle", "low", "normal"
+
+    # maintenance_copy_limit (optional)
+    # Megabytes per second that files may be copied at beside the running server (eg. the world files of an online backup), 0 disables the limit.
+    #maintenance_copy_limit=0
+    # Allowed Values: 0 to 100000
+
+    # server_cpus (optional)
+    # CPU numbers to pin bedrock_server to (Linux only), maintenance work then runs on the other CPUs. Empty uses every CPU.
+    #server_cpus=[]
+    # Allowed Values: [integer, integer, ...]
+
+    # verify_workers (optional)
+    # Number of threads that read backups back to verify them after they are made. They run at maintenance_priority.
+    #verify_workers=2
+    # Allowed Values: 1 to 64
+
+    # verify_interval (optional)
+    # Number of hours after which existing backups are verified again, 0 only verifies each backup once after it is made.
+    #verify_interval=168
+    # Allowed Values: 0 to 8760
+
+    # metrics_port (optional)
+    # Port of a local HTTP endpoint serving metrics in the Prometheus text format at /metrics, 0 disables it. Only listens on 127.0.0.1.
+    #metrics_port=0
+    # Allowed Values: 0 to 65535
+
     # platform (optional)
     # If not set, this is auto-detected.
     # Set manually only if auto-detection fails.
@@ -140,6 +302,35 @@ class ServerConfig:
         self.auto_update = cfg.get("auto_update")
         self.update_protected_paths = cfg.get("update_protected_paths")
         self.update_backup_paths = cfg.get("update_backup_paths")
+        self.online_backup_mode = cfg.get("online_backup_mode", "archive")
+        self.offline_backup_mode = cfg.get("offline_backup_mode", "archive")
+        self.compression_workers = cfg.get("compression_workers", min(os.cpu_count() or 1, 64))
+        self.compression_level = cfg.get("compression_level", 6)
+        self.backup_format = cfg.get("backup_format", "zip_deflate")
+        self.zstd_level = cfg.get("zstd_level", 3)
+        self.stdout_reader_mode = cfg.get("stdout_reader_mode", "batch")
+        self.log_flush_bytes = cfg.get("log_flush_bytes", 64 * 1024)
+        self.log_flush_interval = cfg.get("log_flush_interval", 1)
+        self.log_fsync = cfg.get("log_fsync", "rotate")
+        self.backup_interval = cfg.get("backup_interval", 0)
+        self.backup_max_players = cfg.get("backup_max_players", 0)
+        self.backup_max_cpu = cfg.get("backup_max_cpu", 80)
+        self.backup_max_latency = cfg.get("backup_max_latency", 0)
+        self.backup_max_delay = cfg.get("backup_max_delay", 60)
+        self.stats_interval = cfg.get("stats_interval", 10)
+        self.stats_history = cfg.get("stats_history", 360)
+        self.restart_rss_limit = cfg.get("restart_rss_limit", 0)
+        self.update_check_interval = cfg.get("update_check_interval", 0)
+        self.update_mode = cfg.get("update_mode", "in_place")
+        self.download_connections = cfg.get("download_connections", 4)
+        self.update_cache_folder = cfg.get("update_cache_folder", "update_cache")
+        self.update_cache_versions = cfg.get("update_cache_versions", 3)
+        self.maintenance_priority = cfg.get("maintenance_priority", "normal")
+        self.maintenance_copy_limit = cfg.get("maintenance_copy_limit", 0)
+        self.server_cpus = cfg.get("server_cpus", [])
+        self.verify_workers = cfg.get("verify_workers", 2)
+        self.verify_interval = cfg.get("verify_interval", 168)
+        self.metrics_port = cfg.get("metrics_port", 0)
 
         # Determine the platform if not set
         detected_platform = platform.system()
@@ -202,7 +393,36 @@ class ServerConfig:
             self.SettingContainer(self.platform, "platform", self.SettingType.PLATFORM),
             self.SettingContainer(self.world_name, "world_name", self.SettingType.STRING),
             self.SettingContainer(self.update_protected_paths, "update_protected_paths", self.SettingType.LIST_OF_STRINGS),
-            self.SettingContainer(self.update_backup_paths, "update_backup_paths", self.SettingType.LIST_OF_STRINGS_OR_ALL)
+            self.SettingContainer(self.update_backup_paths, "update_backup_paths", self.SettingType.LIST_OF_STRINGS_OR_ALL),
+            self.SettingContainer(self.online_backup_mode, "online_backup_mode", self.SettingType.CHOICE, ONLINE_BACKUP_MODES),
+            self.SettingContainer(self.offline_backup_mode, "offline_backup_mode", self.SettingType.CHOICE, OFFLINE_BACKUP_MODES),
+            self.SettingContainer(self.compression_workers, "compression_workers", self.SettingType.INTEGER, range(1, 65)),
+            self.SettingContainer(self.compression_level, "compression_level", self.SettingType.INTEGER, range(0, 10)),
+            self.SettingContainer(self.backup_format, "backup_format", self.SettingType.CHOICE, BACKUP_ARCHIVE_FORMATS),
+            self.SettingContainer(self.zstd_level, "zstd_level", self.SettingType.INTEGER, range(1, 23)),
+            self.SettingContainer(self.stdout_reader_mode, "stdout_reader_mode", self.SettingType.CHOICE, STDOUT_READER_MODES),
+            self.SettingContainer(self.log_flush_bytes, "log_flush_bytes", self.SettingType.INTEGER, range(1, 64 * 1024 * 1024 + 1)),
+            self.SettingContainer(self.log_flush_interval, "log_flush_interval", self.SettingType.INTEGER, range(1, 3601)),
+            self.SettingContainer(self.log_fsync, "log_fsync", self.SettingType.CHOICE, LOG_FSYNC_POLICIES),
+            self.SettingContainer(self.backup_interval, "backup_interval", self.SettingType.INTEGER, range(0, 10081)),
+            self.SettingContainer(self.backup_max_players, "backup_max_players", self.SettingType.INTEGER, range(0, 1001)),
+            self.SettingContainer(self.backup_max_cpu, "backup_max_cpu", self.SettingType.INTEGER, range(0, 6401)),
+            self.SettingContainer(self.backup_max_latency, "backup_max_latency", self.SettingType.INTEGER, range(0, 60001)),
+            self.SettingContainer(self.backup_max_delay, "backup_max_delay", self.SettingType.INTEGER, range(0, 1441)),
+            self.SettingContainer(self.stats_interval, "stats_interval", self.SettingType.INTEGER, range(0, 3601)),
+            self.SettingContainer(self.stats_history, "stats_history", self.SettingType.INTEGER, range(1, 100001)),
+            self.SettingContainer(self.restart_rss_limit, "restart_rss_limit", self.SettingType.INTEGER, range(0, 1048577)),
+            self.SettingContainer(self.update_check_interval, "update_check_interval", self.SettingType.INTEGER, range(0, 169)),
+            self.SettingContainer(self.update_mode, "update_mode", self.SettingType.CHOICE, UPDATE_MODES),
+            self.SettingContainer(self.download_connections, "download_connections", self.SettingType.INTEGER, range(1, 17)),
+            self.SettingContainer(self.update_cache_folder, "update_cache_folder", self.SettingType.FOLDER),
+            self.SettingContainer(self.update_cache_versions, "update_cache_versions", self.SettingType.INTEGER, range(1, 101)),
+            self.SettingContainer(self.maintenance_priority, "maintenance_priority", self.SettingType.CHOICE, MAINTENANCE_PRIORITIES),
+            self.SettingContainer(self.maintenance_copy_limit, "maintenance_copy_limit", self.SettingType.INTEGER, range(0, 100001)),
+            self.SettingContainer(self.server_cpus, "server_cpus", self.SettingType.LIST_OF_INTEGERS),
+            self.SettingContainer(self.verify_workers, "verify_workers", self.SettingType.INTEGER, range(1, 65)),
+            self.SettingContainer(self.verify_interval, "verify_interval", self.SettingType.INTEGER, range(0, 8761)),
+            self.SettingContainer(self.metrics_port, "metrics_port", self.SettingType.INTEGER, range(0, 65536))
         )
 
         errors = []
@@ -213,6 +433,7 @@ class ServerConfig:
             value = container.setting_value
             name = container.setting_name
             stype = container.setting_type
+            choices = container.choices
             # Check for missing values
             if value is None:
                 errors.append(f"{name}: missing (required)")
@@ -224,6 +445,9 @@ class ServerConfig:
                 case self.SettingType.INTEGER:
                     if not isinstance(value, int):
                         errors.append(f"{name}: must be an integer")
+                    # Integers with choices must fall within that range
+                    elif choices is not None and value not in choices:
+                        errors.append(f"{name}: {value}: must be between {choices.start} and {choices.stop - 1}")
                 case self.SettingType.BOOLEAN:
                     if not isinstance(value, bool):
                         errors.append(f"{name}: must be a boolean")
@@ -266,5 +490,21 @@ class ServerConfig:
                 case self.SettingType.PLATFORM:
                     if not isinstance(value, Platform):
                         errors.append(f"{name}: must be either 'Windows' or 'Linux'")
+                case self.SettingType.CHOICE:
+                    if value not in choices:
+                        errors.append(f"{name}: {value}: must be one of " + ", ".join(f"'{choice}'" for choice in choices))
+
+        # tar_zstd archives are written with the optional zstandard package
+        if self.backup_format == "tar_zstd" and not ZSTD_AVAILABLE:
+            errors.append("backup_format: 'tar_zstd' requires the zstandard package (pip install zstandard)")
+
+        # CPU pinning needs sched_setaffinity, and the CPUs must be ones this process may use
+        if isinstance(self.server_cpus, list) and self.server_cpus:
+            if not hasattr(os, "sched_setaffinity"):
+                errors.append("server_cpus: pinning the server to CPUs is only supported on Linux")
+            else:
+                unavailable = sorted(set(self.server_cpus) - os.sched_getaffinity(0))
+                if unavailable:
+                    errors.append(f"server_cpus: {unavailable}: not available, must be among {sorted(os.sched_getaffinity(0))}")
         
         return errors
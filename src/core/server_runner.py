@@ -1,14 +1,46 @@
 import sys
-from utils import LineBroadcaster, SignalBroadcaster, process_line, get_prefix, LogLevel, Platform, create_job_object, close_job_object
+from utils import LineBroadcaster, SignalBroadcaster, EventBroadcaster, process_line, get_prefix, LogLevel, Platform, create_job_object, close_job_object, read_line_batches, read_lines, ServerEventPipeline, PropertiesMissing, REGISTRY, read_process_stats, ProcessSampler
 from contextlib import contextmanager
+from collections import deque
+from dataclasses import dataclass
+from itertools import islice
+from time import monotonic
 import subprocess
 import threading
 import os
+import re
 import ctypes
 import signal
 from .server_config import ServerConfig
 
 
+# Constants
+OUTPUT_HISTORY_LENGTH = 1000    # Number of recent output lines kept for wait_for_output
+ENCODING = "utf-8"              # Encoding of commands written to the server's stdin
+# Metrics of the server process
+STDOUT_LINES = REGISTRY.counter("bedrock_stdout_lines_total", "Lines read from bedrock_server's stdout.")
+SERVER_CPU_SECONDS = REGISTRY.counter("bedrock_server_cpu_seconds_total", "User and system CPU time used by the running bedrock_server process.")
+SERVER_RSS_BYTES = REGISTRY.gauge("bedrock_server_resident_memory_bytes", "Resident memory of the running bedrock_server process.")
+
+
+@dataclass
+class OutputMatch:
+    """
+    Dataclass holding the result of waiting for server output.
+    Attributes:
+        line (str): The output line that matched.
+        match (re.Match): The match object of the pattern that matched.
+        pattern (re.Pattern): The pattern that matched.
+        lines (list[str]): The output lines received between the start of the wait and the matching line.
+        sequence (int): The sequence number of the matching line, used to wait for the lines that follow it.
+    """
+    line: str
+    match: re.Match
+    pattern: re.Pattern
+    lines: list
+    sequence: int
+
+
 class ServerRunner:
     def __init__(self, config : ServerConfig):
         """
@@ -20,15 +52,32 @@ class ServerRunner:
         self.server_folder = config.server_folder
         self.shutdown_timeout = config.shutdown_timeout
         self.platform = config.platform
+        self.stdout_reader_mode = config.stdout_reader_mode
+        # CPUs bedrock_server is pinned to (Linux only), empty for every CPU
+        self.server_cpus = set(config.server_cpus)
         self.process = None
-        self.stdout_broadcaster = LineBroadcaster()
-        self.unexpected_shutdown_broadcaster = LineBroadcaster()
+        self.stdout_broadcaster = LineBroadcaster("stdout")
+        self.unexpected_shutdown_broadcaster = LineBroadcaster("unexpected_shutdown")
+        # Alerts subscribers whenever the server process has exited, expected or not
+        self.shutdown_broadcaster = SignalBroadcaster("shutdown")
+        # Typed events recognized in the server's output (version, players, saves, errors...)
+        self.events = ServerEventPipeline()
+        # Publishes a ProcessSample of the server's resource use every stats_interval seconds while it runs
+        self.stats_broadcaster = EventBroadcaster("process_stats")
+        self.sampler = ProcessSampler(self._running_pid, config.stats_interval, config.stats_history, self.stats_broadcaster.publish)
         self._stdout_thread = None
         self._expected_shutdown = False
         # Windows Job Object handle, keeps bedrock_server tied to this process's lifetime
         self._job = None
         # We are using a RLock instead of a regular Lock to allow nested locking within the same thread
         self._lock = threading.RLock()
+        # Recent output lines numbered by a sequence counter, the condition is notified for every new line
+        self._output_condition = threading.Condition()
+        self._output_history = deque(maxlen=OUTPUT_HISTORY_LENGTH)
+        self._output_sequence = 0
+        # Read the server's resource use from /proc whenever metrics are scraped
+        SERVER_CPU_SECONDS.set_function(lambda: getattr(self.process_stats(), "cpu_seconds", None))
+        SERVER_RSS_BYTES.set_function(lambda: getattr(self.process_stats(), "rss_bytes", None))
 
 
     @contextmanager
@@ -73,9 +122,13 @@ class ServerRunner:
             # On Linux, instruct the kernel to send SIGTERM to bedrock_server if this process dies
             preexec_fn = None
             if self.platform == Platform.Linux:
+                server_cpus = self.server_cpus
                 def preexec_fn():
                     # Load the C library and call prctl to set the parent death signal to SIGTERM
                     ctypes.CDLL("libc.so.6").prctl(1, signal.SIGTERM)
+                    # Pin before exec, so every thread the server starts inherits the CPUs
+                    if server_cpus:
+                        os.sched_setaffinity(0, server_cpus)
 
             # Start the server process
             self.process = subprocess.Popen(
@@ -85,8 +138,8 @@ class ServerRunner:
                 stdin=subprocess.PIPE,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.STDOUT,
-                universal_newlines=True,
-                bufsize=1,
+                # Binary and unbuffered, output is decoded by the reader thread and commands are encoded by send_command
+                bufsize=0,
                 preexec_fn=preexec_fn,
             )
 
@@ -98,6 +151,10 @@ class ServerRunner:
             self._stdout_thread = threading.Thread(target=self._read_stdout, daemon=True)
             self._stdout_thread.start()
 
+            # Start sampling the server's resource use the first time it starts, the sampler follows it across restarts
+            if self.sampler.interval > 0:
+                self.sampler.start()
+
 
     def is_running(self):
         """
@@ -112,28 +169,60 @@ class ServerRunner:
 
     def _read_stdout(self):
         """Internal method run in a separate thread to continuously read stdout lines from the server process and enqueue them for processing."""
-        for line in self.process.stdout:
-            # Strip the newline from the line
-            line = line.rstrip()
-            # Detect and strip no log file prefix (this happens when the server is running two instances on the same port)
-            if line.startswith("NO LOG FILE! - ["):
-                line = line[len("NO LOG FILE! - "):]
-                # Show a warning about this on first detection only once using getattr()
-                if not getattr(process_line, "warned_no_log_file", False):
-                    self.stdout_broadcaster.publish(get_prefix(LogLevel.WARN), "Detected 'NO LOG FILE!' prefix in server output. This usually means another server instance is running or the log file is locked. Log output will only appear in the console and not in a file. Subsequent messages will not show this warning.")
-                    process_line.warned_no_log_file = True
-            # Format then broadcast the timestamp and line
-            timestamp, message = process_line(line.rstrip())
-            self.stdout_broadcaster.publish(timestamp, message)
-            # Detect if the line is a missing server.properties error
-            if "Error opening file: server.properties" in line:
-                self.stdout_broadcaster.publish(get_prefix(LogLevel.CRITICAL), "The server failed to start due to a missing server.properties file. Please ensure that server.properties exists in the server folder and is properly configured.")
+        stdout = self.process.stdout
+        # Either read large chunks straight from the pipe and split them in bulk, or read one line at a time
+        if self.stdout_reader_mode == "batch":
+            batches = read_line_batches(stdout.fileno())
+        else:
+            batches = read_lines(stdout)
+        match_event = self.events.matcher.match
+        for lines in batches:
+            records = []
+            messages = []
+            events = []
+            missing_properties = False
+            for line in lines:
+                # Detect and strip no log file prefix (this happens when the server is running two instances on the same port)
+                if line.startswith("NO LOG FILE! - ["):
+                    line = line[len("NO LOG FILE! - "):]
+                    # Show a warning about this on first detection only once using getattr()
+                    if not getattr(process_line, "warned_no_log_file", False):
+                        records.append((get_prefix(LogLevel.WARN), "Detected 'NO LOG FILE!' prefix in server output. This usually means another server instance is running or the log file is locked. Log output will only appear in the console and not in a file. Subsequent messages will not show this warning."))
+                        process_line.warned_no_log_file = True
+                # Format the timestamp and line
+                timestamp, message = process_line(line)
+                records.append((timestamp, message))
+                messages.append(message)
+                # Recognize events with the pipeline's combined matcher, one match per line however many events are known
+                event = match_event(timestamp, message)
+                if event is not None:
+                    events.append(event)
+                    # Detect if the line is a missing server.properties error
+                    if isinstance(event, PropertiesMissing):
+                        records.append((get_prefix(LogLevel.CRITICAL), "The server failed to start due to a missing server.properties file. Please ensure that server.properties exists in the server folder and is properly configured."))
+                        missing_properties = True
+            STDOUT_LINES.inc(len(lines))
+            # Broadcast the whole batch at once
+            self.stdout_broadcaster.publish_batch(records)
+            # Record the lines and wake any threads waiting for output
+            with self._output_condition:
+                for message in messages:
+                    self._output_sequence += 1
+                    self._output_history.append((self._output_sequence, message))
+                self._output_condition.notify_all()
+            # Deliver the events once the lines they came from have been published
+            self.events.publish(events)
+            if missing_properties:
                 self.send_command("")           # Since the server is looking for an input to continue, send an empty string to prevent it from hanging
                 self._expected_shutdown = True  # Prevent the unexpected shutdown message since we know why it happened
-        self.process.stdout.close()
+        stdout.close()
         # Clean up runner state after process exits
         self.process = None
         self._stdout_thread = None
+        # Wake any threads waiting for output so they can see the server has stopped
+        with self._output_condition:
+            self._output_condition.notify_all()
+        self.shutdown_broadcaster.publish()
         # If the shutdown was not expected, we alert all subscribers
         if not self._expected_shutdown:
             self.unexpected_shutdown_broadcaster.publish(get_prefix(LogLevel.ERROR), "The server has shut down unexpectedly.")
@@ -143,6 +232,22 @@ class ServerRunner:
             self._job = None
 
 
+    def process_stats(self):
+        """
+        Get the server process's CPU time and memory (Linux only).
+        Returns:
+            ProcessStats | None: The snapshot, or None if the server is not running or /proc is unavailable.
+        """
+        process = self.process
+        return read_process_stats(process.pid) if process is not None else None
+
+
+    def _running_pid(self):
+        """Get the process ID of the running server for the sampler, or None if it is not running."""
+        process = self.process
+        return process.pid if process is not None and process.poll() is None else None
+
+
     def send_command(self, command):
         """
         Send a command string to the server's stdin.
@@ -155,10 +260,62 @@ class ServerRunner:
             if not self.is_running():
                 raise RuntimeError("Server is not running")
             # Send a command to the server's stdin and immediately flush it
-            self.process.stdin.write(command + "\n")
+            self.process.stdin.write((command + "\n").encode(ENCODING))
             self.process.stdin.flush()
 
 
+    def wait_for_output(self, patterns, timeout, after_sequence=None):
+        """
+        Wait until a server output line matches one of the given patterns.
+        Args:
+            patterns (list[str | re.Pattern]): The patterns to search each line for, strings are compiled as-is.
+            timeout (float): The maximum number of seconds to wait.
+            after_sequence (int | None): Only consider lines after this sequence number, or None for lines after this call.
+        Returns:
+            OutputMatch | None: The first matching line, or None if the timeout expired or the server stopped.
+        """
+        compiled = [pattern if isinstance(pattern, re.Pattern) else re.compile(pattern) for pattern in patterns]
+        deadline = monotonic() + timeout
+        with self._output_condition:
+            checked = self._output_sequence if after_sequence is None else after_sequence
+            preceding = []
+            while True:
+                # Scan only the lines that arrived since the last check, sequence numbers are contiguous in the history
+                if self._output_history:
+                    first_sequence = self._output_history[0][0]
+                    start = max(checked + 1 - first_sequence, 0)
+                    for sequence, line in islice(self._output_history, start, None):
+                        checked = sequence
+                        for pattern in compiled:
+                            match = pattern.search(line)
+                            if match:
+                                return OutputMatch(line, match, pattern, preceding, sequence)
+                        preceding.append(line)
+                remaining = deadline - monotonic()
+                if remaining <= 0 or self.process is None:
+                    return None
+                self._output_condition.wait(remaining)
+
+
+    def send_command_and_wait(self, command, patterns, timeout):
+        """
+        Send a command and wait until an output line after it matches one of the given patterns.
+        Args:
+            command (str): Command string to send to the server.
+            patterns (list[str | re.Pattern]): The patterns to search each line for, strings are compiled as-is.
+            timeout (float): The maximum number of seconds to wait.
+        Returns:
+            OutputMatch | None: The first matching line, or None if the timeout expired or the server stopped.
+        Raises:
+            RuntimeError: If the server is not currently running.
+        """
+        # Record the position before sending so the response cannot be missed, and stale lines are never matched
+        with self._output_condition:
+            start_sequence = self._output_sequence
+        self.send_command(command)
+        return self.wait_for_output(patterns, timeout, after_sequence=start_sequence)
+
+
     def stop(self):
         """
         Gracefully stop the server by sending a stop command and waiting for the process to exit within the configured shutdown timeout. Forces kill if unable to stop gracefully.
@@ -1,24 +1,127 @@
 from .broadcast_handler import BroadcastHandler
 from .buffered_daily_logger import BufferedDailyLogger
-from .format_helper import LogLevel, get_timestamp, get_spacing, get_prefix, process_line
-from .broadcaster import LineBroadcaster, SignalBroadcaster
+from .format_helper import LogLevel, LogPrefix, PREFIX_PATTERN, get_timestamp, format_timestamp, get_spacing, get_prefix, make_prefix, process_line
+from .broadcaster import LineBroadcaster, SignalBroadcaster, EventBroadcaster, OverflowPolicy
 from .platform import Platform
 from .bedrock_download_link_fetcher import UpdateInfo, get_bedrock_update_info
+from .ranged_downloader import RangedDownload, ArtifactCache
+from .install_manifest import INSTALL_MANIFEST_NAME, UpdatePlan, ProtectedPaths, file_crc32, load_install_manifest, load_installed_version, save_install_manifest, plan_update
+from .staged_install import stage_install, swap_install
+from .scheduler import Scheduler, ScheduledJob, IntervalTrigger, CronTrigger, OnceTrigger, MISSED_RUN_POLICIES, RUN_ONCE, SKIP
 from .windows_job import create_job_object, close_job_object
+from .pipe_reader import read_line_batches, read_lines
+from .file_copy import copy_file, copy_tree, describe_copy_stats, set_copy_limiter
+from .backup_repository import BackupRepository
+from .backup_catalog import BackupCatalog, BackupRecord, parse_backup_name
+from .backup_verifier import BackupVerifier, VerificationResult
+from .thread_priority import set_thread_io_priority, set_thread_nice, set_thread_cpus, lower_thread_priority
+from .maintenance import TokenBucket, MaintenanceWorkers
+from .link_snapshot import create_link_snapshot, link_or_copy, link_or_copy_tree
+from .backup_formats import ZIP_DEFLATE, ZIP_STORE, TAR_ZSTD, TAR_XZ, ARCHIVE_SUFFIXES, ZSTD_AVAILABLE, make_backup_archive, detect_archive_format, open_tar_archive
+from .world_restore import extract_archive_folder, swap_directory
+from .parallel_zip import ParallelZipWriter, make_zip_archive
+from .log_archive import LogArchive, parse_log_time
+from .metrics import MetricsRegistry, MetricsServer, REGISTRY
+from .proc_stats import ProcessStats, read_process_stats, ProcessSample, read_process_sample, ProcessSampler
+from .server_events import ServerEvent, VersionDetected, ServerStarted, PlayerConnected, PlayerDisconnected, SaveCompleted, SavePending, SaveResumed, PropertiesMissing, CrashHint, ErrorLogged, EventPattern, ServerEventMatcher, ServerEventPipeline
 
 __all__ = [
     'BroadcastHandler',
     'BufferedDailyLogger',
     'LogLevel',
+    'LogPrefix',
+    'PREFIX_PATTERN',
     'get_timestamp',
+    'format_timestamp',
     'get_spacing',
     'get_prefix',
+    'make_prefix',
     'process_line',
     'LineBroadcaster',
     'SignalBroadcaster',
+    'EventBroadcaster',
+    'OverflowPolicy',
     'Platform',
     'UpdateInfo',
     'get_bedrock_update_info',
+    'RangedDownload',
+    'ArtifactCache',
+    'INSTALL_MANIFEST_NAME',
+    'UpdatePlan',
+    'ProtectedPaths',
+    'file_crc32',
+    'load_install_manifest',
+    'load_installed_version',
+    'save_install_manifest',
+    'plan_update',
+    'stage_install',
+    'swap_install',
+    'Scheduler',
+    'ScheduledJob',
+    'IntervalTrigger',
+    'CronTrigger',
+    'OnceTrigger',
+    'MISSED_RUN_POLICIES',
+    'RUN_ONCE',
+    'SKIP',
     'create_job_object',
     'close_job_object',
+    'read_line_batches',
+    'read_lines',
+    'copy_file',
+    'copy_tree',
+    'describe_copy_stats',
+    'set_copy_limiter',
+    'BackupRepository',
+    'BackupCatalog',
+    'BackupRecord',
+    'parse_backup_name',
+    'BackupVerifier',
+    'VerificationResult',
+    'set_thread_io_priority',
+    'set_thread_nice',
+    'set_thread_cpus',
+    'lower_thread_priority',
+    'TokenBucket',
+    'MaintenanceWorkers',
+    'create_link_snapshot',
+    'link_or_copy',
+    'link_or_copy_tree',
+    'ZIP_DEFLATE',
+    'ZIP_STORE',
+    'TAR_ZSTD',
+    'TAR_XZ',
+    'ARCHIVE_SUFFIXES',
+    'ZSTD_AVAILABLE',
+    'make_backup_archive',
+    'detect_archive_format',
+    'open_tar_archive',
+    'extract_archive_folder',
+    'swap_directory',
+    'ParallelZipWriter',
+    'make_zip_archive',
+    'LogArchive',
+    'parse_log_time',
+    'MetricsRegistry',
+    'MetricsServer',
+    'REGISTRY',
+    'ProcessStats',
+    'read_process_stats',
+    'ProcessSample',
+    'read_process_sample',
+    'ProcessSampler',
+    'ServerEvent',
+    'VersionDetected',
+    'ServerStarted',
+    'PlayerConnected',
+    'PlayerDisconnected',
+    'SaveCompleted',
+    'SavePending',
+    'SaveResumed',
+    'PropertiesMissing',
+    'CrashHint',
+    'ErrorLogged',
+    'EventPattern',
+    'ServerEventMatcher',
+    'ServerEventPipeline',
 ]
\ No newline at end of file
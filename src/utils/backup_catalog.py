@@ -0,0 +1,403 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+
+
+# Constants
+CATALOG_FILE_NAME = ".catalog.sqlite3"  # Lives in the backup folder, hidden from backup listings by the leading dot
+CATALOG_VERSION = 2
+# eg. "protected_online_world_backup_YYYY-MM-DD_HH-MM-SS.zip", the protected prefix is only found on backups marked before the catalog existed
+BACKUP_NAME_PATTERN = re.compile(r"(?P<protected>protected_)?(?P<prefix>offline_world_backup|online_world_backup|server_backup)_(?P<timestamp>\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})(?P<suffix>\.zip|\.tar\.zst|\.tar\.xz|\.manifest)?")
+BACKUP_KINDS = {"offline_world_backup": "offline", "online_world_backup": "online", "server_backup": "server"}
+WORLD_KINDS = ("offline", "online")
+BACKUP_FORMATS = {None: "folder", ".zip": "zip", ".tar.zst": "tar_zstd", ".tar.xz": "tar_xz", ".manifest": "manifest"}
+NAME_TIMESTAMP_FORMAT = "%Y-%m-%d_%H-%M-%S"
+CREATED_FORMAT = "%Y-%m-%d %H:%M:%S"    # Sorts chronologically as text, so range queries can use the index
+HASH_ALGORITHM = "sha256"
+HASH_CHUNK_SIZE = 1024 * 1024           # 1MB (in binary)
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS backups (
+    name TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    format TEXT NOT NULL,
+    created TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    protected INTEGER NOT NULL DEFAULT 0,
+    checksum TEXT
+);
+CREATE INDEX IF NOT EXISTS backups_by_created ON backups (kind, created);
+CREATE INDEX IF NOT EXISTS backups_by_protected ON backups (protected, kind, created);
+"""
+# Changes to an existing catalog, indexed by the version they upgrade from
+MIGRATIONS = (
+    None,
+    # Version 2: results of the background verification
+    "ALTER TABLE backups ADD COLUMN verified_at TEXT; ALTER TABLE backups ADD COLUMN verified_ok INTEGER; ALTER TABLE backups ADD COLUMN verify_detail TEXT;",
+)
+COLUMNS = "name, kind, format, created, size, protected, checksum, verified_at, verified_ok, verify_detail"
+
+
+@dataclass
+class BackupRecord:
+    """
+    Dataclass holding a backup's catalog entry.
+    Attributes:
+        name (str): The backup's file or folder name in the backup folder.
+        kind (str): "offline", "online" or "server".
+        format (str): "folder", "zip", "tar_zstd", "tar_xz" or "manifest".
+        created (datetime): The time encoded in the backup's name.
+        size (int): The size of the backup in bytes (the apparent size of all its files for folders).
+        protected (bool): True if the backup is never pruned.
+        checksum (str | None): The sha256 hex digest of the file, None for folders and backups found by a rebuild.
+        verified_at (datetime | None): When the backup was last verified, None if it never was.
+        verified_ok (bool | None): The outcome of the last verification.
+        verify_detail (str | None): What the last verification checked, or what was wrong.
+    """
+    name: str
+    kind: str
+    format: str
+    created: datetime
+    size: int
+    protected: bool
+    checksum: str | None
+    verified_at: datetime | None = None
+    verified_ok: bool | None = None
+    verify_detail: str | None = None
+
+
+def parse_backup_name(name):
+    """
+    Parse the kind, time and format encoded in a backup's name.
+    Args:
+        name (str): The file or folder name.
+    Returns:
+        tuple[str, datetime, str, bool] | None: The kind, creation time, format and whether the name has the legacy
+            protected prefix, or None if the name is not a backup.
+    """
+    match = BACKUP_NAME_PATTERN.fullmatch(name)
+    if match is None:
+        return None
+    created = datetime.strptime(match.group("timestamp"), NAME_TIMESTAMP_FORMAT)
+    return BACKUP_KINDS[match.group("prefix")], created, BACKUP_FORMATS[match.group("suffix")], match.group("protected") is not None
+
+
+def file_checksum(path):
+    """
+    Hash a file in fixed-size chunks.
+    Args:
+        path (Path): The file to hash.
+    Returns:
+        str: The hex digest of the contents.
+    """
+    digest = hashlib.new(HASH_ALGORITHM)
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _tree_size(path):
+    """Sum the sizes of every file under a folder, without following symlinks."""
+    total = 0
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                total += _tree_size(entry.path)
+            else:
+                total += entry.stat(follow_symlinks=False).st_size
+    return total
+
+
+class BackupCatalog:
+    """
+    Persistent index of the backups in the backup folder, stored in an SQLite database next to them.
+    Listing, marking, unmarking and pruning query the catalog instead of scanning and stat()ing every backup, and
+    protection is a flag in the catalog instead of a rename. The catalog is rebuilt from the backups' names if it is
+    missing, and sync() reconciles it with backups added or deleted by hand.
+    """
+
+    def __init__(self, backup_root):
+        """
+        Open the catalog of a backup folder, rebuilding it from the folder if it does not exist yet.
+        Args:
+            backup_root (str | Path): The folder where backups are stored.
+        Raises:
+            sqlite3.Error: If the catalog cannot be opened or created.
+        """
+        self.backup_root = Path(backup_root)
+        self.backup_root.mkdir(parents=True, exist_ok=True)
+        self.path = self.backup_root / CATALOG_FILE_NAME
+        existed = self.path.exists()
+        # One connection shared by every thread, serialized by the lock
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._migrate(existed)
+        self.rebuilt = False
+        if not existed:
+            self.rebuild()
+            self.rebuilt = True
+
+
+    def _migrate(self, existed):
+        """Create the schema of a new catalog, or bring an older catalog up to the current version."""
+        version = self._connection.execute("PRAGMA user_version").fetchone()[0] if existed else 0
+        if version == 0:
+            # A new catalog starts at version 1 and goes through every migration
+            self._connection.executescript(SCHEMA)
+            version = 1
+        for migration in MIGRATIONS[version:CATALOG_VERSION]:
+            self._connection.executescript(migration)
+        self._connection.execute(f"PRAGMA user_version={CATALOG_VERSION}")
+
+
+    @staticmethod
+    def _record(row):
+        """Convert a database row into a BackupRecord."""
+        name, kind, backup_format, created, size, protected, checksum, verified_at, verified_ok, verify_detail = row
+        return BackupRecord(
+            name, kind, backup_format, datetime.fromisoformat(created), size, bool(protected), checksum,
+            datetime.fromisoformat(verified_at) if verified_at else None,
+            None if verified_ok is None else bool(verified_ok),
+            verify_detail,
+        )
+
+
+    def _query(self, sql, parameters=()):
+        """Run a query and convert the rows into BackupRecords."""
+        with self._lock:
+            rows = self._connection.execute(sql, parameters).fetchall()
+        return [self._record(row) for row in rows]
+
+
+    def _describe(self, path, checksum=None):
+        """
+        Build the catalog entry of a backup on disk.
+        Args:
+            path (Path): The backup file or folder.
+            checksum (str | None): The checksum to record, if already known.
+        Returns:
+            BackupRecord | None: The entry, or None if the name is not a backup.
+        """
+        parsed = parse_backup_name(path.name)
+        if parsed is None:
+            return None
+        kind, created, backup_format, protected = parsed
+        size = _tree_size(path) if backup_format == "folder" else path.stat().st_size
+        return BackupRecord(path.name, kind, backup_format, created, size, protected, checksum)
+
+
+    def _insert(self, records):
+        """Insert or replace entries, keeping the protected flag of entries that already exist and clearing their verification."""
+        rows = [(r.name, r.kind, r.format, r.created.strftime(CREATED_FORMAT), r.size, int(r.protected), r.checksum) for r in records]
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT INTO backups (name, kind, format, created, size, protected, checksum) VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET kind=excluded.kind, format=excluded.format, created=excluded.created, "
+                "size=excluded.size, protected=max(protected, excluded.protected), checksum=excluded.checksum, "
+                "verified_at=NULL, verified_ok=NULL, verify_detail=NULL",
+                rows,
+            )
+
+
+    def _backup_names_on_disk(self):
+        """List the names in the backup folder that are backups, without stat()ing them."""
+        return {name for name in os.listdir(self.backup_root) if BACKUP_NAME_PATTERN.fullmatch(name)}
+
+
+    def rebuild(self):
+        """
+        Replace the catalog with the backups found in the backup folder. Protection is taken from the legacy protected
+        prefix of the names, and checksums are left empty rather than reading every archive.
+        Returns:
+            int: The number of backups cataloged.
+        """
+        records = [record for name in self._backup_names_on_disk() if (record := self._describe(self.backup_root / name)) is not None]
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM backups")
+        self._insert(records)
+        return len(records)
+
+
+    def sync(self):
+        """
+        Add backups that are on disk but not in the catalog, and remove entries whose backup no longer exists.
+        Only lists the backup folder, the backups that are already cataloged are not stat()ed.
+        Returns:
+            tuple[int, int]: The number of entries added and removed.
+        """
+        on_disk = self._backup_names_on_disk()
+        with self._lock:
+            cataloged = {name for (name,) in self._connection.execute("SELECT name FROM backups")}
+        added = [record for name in on_disk - cataloged if (record := self._describe(self.backup_root / name)) is not None]
+        removed = cataloged - on_disk
+        self._insert(added)
+        self.remove(*removed)
+        return len(added), len(removed)
+
+
+    def add(self, path, checksum=True):
+        """
+        Record a new backup.
+        Args:
+            path (Path): The backup file or folder, inside the backup folder.
+            checksum (bool | str): True to hash the file now, False to leave it empty until the verifier records it, or the
+                digest if it is already known. Folders have no checksum.
+        Returns:
+            BackupRecord: The recorded entry.
+        Raises:
+            ValueError: If the name is not a backup name.
+            OSError: If the backup cannot be read.
+        """
+        path = Path(path)
+        if checksum is True:
+            checksum = file_checksum(path) if path.is_file() else None
+        record = self._describe(path, checksum or None)
+        if record is None:
+            raise ValueError(f"{path.name}: not a backup name")
+        self._insert([record])
+        return self.get(record.name)
+
+
+    def remove(self, *names):
+        """
+        Remove entries from the catalog, the backups themselves are not touched.
+        Args:
+            *names (str): The names of the backups to remove.
+        """
+        with self._lock, self._connection:
+            self._connection.executemany("DELETE FROM backups WHERE name = ?", [(name,) for name in names])
+
+
+    def get(self, name):
+        """
+        Look up a backup by name.
+        Args:
+            name (str): The backup's name.
+        Returns:
+            BackupRecord | None: The entry, or None if the backup is not cataloged.
+        """
+        records = self._query(f"SELECT {COLUMNS} FROM backups WHERE name = ?", (name,))
+        return records[0] if records else None
+
+
+    @staticmethod
+    def _filters(kinds, protected, formats=None):
+        """Build the WHERE clause and parameters shared by the lookups."""
+        clauses = [f"kind IN ({', '.join('?' * len(kinds))})"]
+        parameters = list(kinds)
+        if protected is not None:
+            clauses.append("protected = ?")
+            parameters.append(int(protected))
+        if formats is not None:
+            clauses.append(f"format IN ({', '.join('?' * len(formats))})")
+            parameters.extend(formats)
+        return " AND ".join(clauses), parameters
+
+
+    def list(self, kinds=WORLD_KINDS):
+        """
+        List the backups of the given kinds, oldest first.
+        Args:
+            kinds (tuple[str]): The kinds of backup to list.
+        Returns:
+            list[BackupRecord]: The entries.
+        """
+        where, parameters = self._filters(kinds, None)
+        return self._query(f"SELECT {COLUMNS} FROM backups WHERE {where} ORDER BY created, name", parameters)
+
+
+    def latest(self, kinds=WORLD_KINDS, protected=None, formats=None):
+        """
+        Find the newest backup.
+        Args:
+            kinds (tuple[str]): The kinds of backup to consider.
+            protected (bool | None): If given, only consider backups that are (or are not) protected.
+            formats (tuple[str] | None): If given, only consider backups in these formats.
+        Returns:
+            BackupRecord | None: The newest entry, or None if there is none.
+        """
+        where, parameters = self._filters(kinds, protected, formats)
+        records = self._query(f"SELECT {COLUMNS} FROM backups WHERE {where} ORDER BY created DESC, name DESC LIMIT 1", parameters)
+        return records[0] if records else None
+
+
+    def on_date(self, day, kinds=WORLD_KINDS, protected=None):
+        """
+        Find the backups made on a day.
+        Args:
+            day (date): The day.
+            kinds (tuple[str]): The kinds of backup to consider.
+            protected (bool | None): If given, only consider backups that are (or are not) protected.
+        Returns:
+            list[BackupRecord]: The entries, oldest first.
+        """
+        where, parameters = self._filters(kinds, protected)
+        start = datetime.combine(day, datetime.min.time()).strftime(CREATED_FORMAT)
+        end = datetime.combine(day + timedelta(days=1), datetime.min.time()).strftime(CREATED_FORMAT)
+        return self._query(f"SELECT {COLUMNS} FROM backups WHERE {where} AND created >= ? AND created < ? ORDER BY created, name", parameters + [start, end])
+
+
+    def expired(self, cutoff, kinds=WORLD_KINDS):
+        """
+        Find the unprotected backups made before a time.
+        Args:
+            cutoff (datetime): Backups made before this time are expired.
+            kinds (tuple[str]): The kinds of backup to consider.
+        Returns:
+            list[BackupRecord]: The entries, oldest first.
+        """
+        where, parameters = self._filters(kinds, False)
+        return self._query(f"SELECT {COLUMNS} FROM backups WHERE {where} AND created < ? ORDER BY created, name", parameters + [cutoff.strftime(CREATED_FORMAT)])
+
+
+    def set_protected(self, names, protected):
+        """
+        Mark or unmark backups as protected from pruning.
+        Args:
+            names (Iterable[str]): The names of the backups.
+            protected (bool): The new value of the flag.
+        """
+        with self._lock, self._connection:
+            self._connection.executemany("UPDATE backups SET protected = ? WHERE name = ?", [(int(protected), name) for name in names])
+
+
+    def record_verification(self, name, ok, detail, checksum=None):
+        """
+        Record the outcome of verifying a backup.
+        Args:
+            name (str): The backup's name.
+            ok (bool): True if the backup was read back intact.
+            detail (str): What was checked, or what was wrong.
+            checksum (str | None): The checksum computed while verifying, stored if the catalog has none yet.
+        """
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE backups SET verified_at = ?, verified_ok = ?, verify_detail = ?, checksum = coalesce(checksum, ?) WHERE name = ?",
+                (datetime.now().strftime(CREATED_FORMAT), int(ok), detail, checksum, name),
+            )
+
+
+    def due_for_verification(self, before):
+        """
+        Find the backups that were never verified, or last verified before a time.
+        Args:
+            before (datetime): Backups verified before this time are due again.
+        Returns:
+            list[BackupRecord]: The entries, never verified first, then least recently verified.
+        """
+        return self._query(
+            f"SELECT {COLUMNS} FROM backups WHERE verified_at IS NULL OR verified_at < ? ORDER BY verified_at IS NOT NULL, verified_at, created",
+            (before.strftime(CREATED_FORMAT),),
+        )
+
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,113 @@
+import lzma
+import tarfile
+import zipfile
+from contextlib import contextmanager
+from pathlib import Path
+from .parallel_zip import make_zip_archive
+
+try:
+    import zstandard
+except ImportError:
+    # zstandard is optional, without it the tar_zstd format cannot be written or read
+    zstandard = None
+
+
+# Constants
+# Formats backups can be written in, and the suffix each one adds to the backup name
+ZIP_DEFLATE = "zip_deflate"
+ZIP_STORE = "zip_store"
+TAR_ZSTD = "tar_zstd"
+TAR_XZ = "tar_xz"
+ARCHIVE_SUFFIXES = {ZIP_DEFLATE: ".zip", ZIP_STORE: ".zip", TAR_ZSTD: ".tar.zst", TAR_XZ: ".tar.xz"}
+ZSTD_AVAILABLE = zstandard is not None
+DEFAULT_ZSTD_LEVEL = 3
+# Leading bytes of each kind of archive, so restores never depend on the backup's name
+ZIP_MAGIC = (b"PK\x03\x04", b"PK\x05\x06")   # A local file header, or the end record of an empty archive
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+XZ_MAGIC = b"\xfd7zXZ\x00"
+# Errors that mean an archive is damaged, rather than that it could not be read from the disk
+ARCHIVE_ERRORS = (zipfile.BadZipFile, zipfile.LargeZipFile, tarfile.TarError, lzma.LZMAError, EOFError) + ((zstandard.ZstdError,) if zstandard is not None else ())
+
+
+def make_backup_archive(base_name, root_dir, base_dir, backup_format=ZIP_DEFLATE, workers=1, level=6, zstd_level=DEFAULT_ZSTD_LEVEL):
+    """
+    Archive a backup folder in one of the backup formats, like shutil.make_archive(base_name, format, root_dir, base_dir).
+    Args:
+        base_name (str | Path): The path of the archive to create, without its suffix.
+        root_dir (str | Path): The directory that archive names are relative to.
+        base_dir (str): The directory inside root_dir to archive.
+        backup_format (str): One of ARCHIVE_SUFFIXES.
+        workers (int): The number of compression processes for zip_deflate, or compression threads for tar_zstd.
+        level (int): The deflate level for zip_deflate, or the xz preset for tar_xz (0-9).
+        zstd_level (int): The zstd level for tar_zstd (1-22).
+    Returns:
+        str: The path of the created archive.
+    Raises:
+        OSError: If the archive cannot be written, the incomplete archive is removed.
+        RuntimeError: If the format needs the zstandard package and it is not installed.
+    """
+    if backup_format == ZIP_DEFLATE:
+        return make_zip_archive(base_name, root_dir, base_dir, workers, level)
+    if backup_format == ZIP_STORE:
+        # Level 0 stores every member as it is, which makes the archive as fast to write as a copy
+        return make_zip_archive(base_name, root_dir, base_dir, workers, 0)
+    if backup_format == TAR_ZSTD and zstandard is None:
+        raise RuntimeError("the tar_zstd backup format requires the zstandard package")
+
+    archive_path = str(base_name) + ARCHIVE_SUFFIXES[backup_format]
+    try:
+        if backup_format == TAR_ZSTD:
+            # zstd compresses on its own threads, 0 compresses in the calling thread; the frame checksum lets reads detect corruption
+            compressor = zstandard.ZstdCompressor(level=zstd_level, threads=workers if workers > 1 else 0, write_checksum=True)
+            with open(archive_path, "wb") as f, compressor.stream_writer(f, closefd=False) as compressed, tarfile.open(fileobj=compressed, mode="w|") as tar:
+                tar.add(Path(root_dir) / base_dir, arcname=base_dir)
+        else:
+            with tarfile.open(archive_path, "w:xz", preset=level) as tar:
+                tar.add(Path(root_dir) / base_dir, arcname=base_dir)
+    except BaseException:
+        Path(archive_path).unlink(missing_ok=True)
+        raise
+    return archive_path
+
+
+def detect_archive_format(path):
+    """
+    Work out what kind of archive a backup file is from its first bytes.
+    Args:
+        path (str | Path): The backup file.
+    Returns:
+        str | None: "zip" (deflated or stored), TAR_ZSTD or TAR_XZ, or None if it is not a backup archive.
+    Raises:
+        OSError: If the file cannot be read.
+    """
+    with open(path, "rb") as f:
+        magic = f.read(len(XZ_MAGIC))
+    if magic.startswith(ZIP_MAGIC):
+        return "zip"
+    if magic.startswith(ZSTD_MAGIC):
+        return TAR_ZSTD
+    if magic.startswith(XZ_MAGIC):
+        return TAR_XZ
+    return None
+
+
+@contextmanager
+def open_tar_archive(path, archive_format):
+    """
+    Open a compressed tar backup for reading its members in order, decompressing it as a stream.
+    Args:
+        path (str | Path): The archive.
+        archive_format (str): TAR_ZSTD or TAR_XZ, see detect_archive_format.
+    Yields:
+        tarfile.TarFile: The archive in stream mode, members must be read in the order they are returned.
+    Raises:
+        RuntimeError: If the archive is tar_zstd and the zstandard package is not installed.
+    """
+    if archive_format == TAR_XZ:
+        with tarfile.open(path, "r|xz") as tar:
+            yield tar
+        return
+    if zstandard is None:
+        raise RuntimeError("reading a tar_zstd backup requires the zstandard package")
+    with open(path, "rb") as f, zstandard.ZstdDecompressor().stream_reader(f, closefd=False) as decompressed, tarfile.open(fileobj=decompressed, mode="r|") as tar:
+        yield tar
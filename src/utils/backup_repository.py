@@ -0,0 +1,333 @@
+import hashlib
+import json
+import os
+import threading
+from collections import Counter
+from pathlib import Path
+from .file_copy import copy_file
+from .link_snapshot import link_or_copy
+
+
+# Constants
+BLOBS_FOLDER_NAME = ".blobs"            # Lives in the backup folder, hidden from backup listings by the leading dot
+MANIFEST_SUFFIX = ".manifest"
+MANIFEST_VERSION = 1
+HASH_ALGORITHM = "sha256"
+HASH_CHUNK_SIZE = 1024 * 1024           # 1MB (in binary)
+REFCOUNTS_FILE_NAME = "refcounts.json"  # In the blobs folder, how many manifests reference each blob
+REFCOUNTS_VERSION = 1
+
+
+class BackupRepository:
+    """
+    Content-addressed store for world backups.
+    Every file is stored once in the blobs folder, keyed by the hash of its contents, and every backup is a small
+    JSON manifest that maps the world's relative paths to those blobs. Unchanged files (eg. LevelDB .ldb tables)
+    are shared between all the backups that contain them.
+    The number of manifests referencing each blob is kept in the blobs folder and updated as backups are created and
+    deleted, so garbage collection only lists the blobs instead of reading every manifest. The counts also record which
+    manifests they cover, and are rebuilt from the manifests if those differ from the ones on disk (eg. a manifest was
+    deleted or copied in by hand). A lock keeps garbage collection out while a backup is storing blobs that its manifest,
+    not yet written, will reference.
+    """
+
+    def __init__(self, backup_root):
+        """
+        Initialize the repository inside the given backup folder.
+        Args:
+            backup_root (str | Path): The folder where backups are stored.
+        """
+        self.backup_root = Path(backup_root)
+        self.blobs_dir = self.backup_root / BLOBS_FOLDER_NAME
+        self.refcounts_path = self.blobs_dir / REFCOUNTS_FILE_NAME
+        # The manifest names the counts cover and the counts, loaded on first use, None if unknown or stale
+        self._references = None
+        self._lock = threading.Lock()
+
+
+    @staticmethod
+    def is_manifest(path):
+        """
+        Check if a path points to a repository manifest.
+        Args:
+            path (Path): The path to check.
+        Returns:
+            bool: True if the path is a manifest, False otherwise.
+        """
+        return Path(path).suffix == MANIFEST_SUFFIX
+
+
+    def blob_path(self, digest):
+        """Get the path of a blob, fanned out by the first two hex characters to keep folders small."""
+        return self.blobs_dir / digest[:2] / digest
+
+
+    def _hash_file(self, source, size):
+        """
+        Hash the first 'size' bytes of a file.
+        Args:
+            source (Path): The file to hash.
+            size (int): The number of bytes to hash.
+        Returns:
+            str: The hex digest of the contents.
+        """
+        digest = hashlib.new(HASH_ALGORITHM)
+        remaining = size
+        with open(source, "rb") as f:
+            while remaining > 0:
+                chunk = f.read(min(HASH_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                digest.update(chunk)
+                remaining -= len(chunk)
+        return digest.hexdigest()
+
+
+    def _store_blob(self, source, size, digest, stats=None):
+        """
+        Copy the first 'size' bytes of a file into the blobs folder if the blob does not already exist.
+        Args:
+            source (Path): The file to store.
+            size (int): The number of bytes to store.
+            digest (str): The hex digest of the contents.
+            stats (Counter | None): If given, incremented with the copy strategy that was used.
+        Returns:
+            bool: True if a new blob was written, False if it was already stored.
+        """
+        blob = self.blob_path(digest)
+        if blob.exists():
+            return False
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary name first so an interrupted copy never looks like a valid blob
+        temp_blob = blob.with_name(f".tmp_{digest}")
+        copy_file(source, temp_blob, length=size, stats=stats)
+        os.replace(temp_blob, blob)
+        return True
+
+
+    def _previous_entries(self):
+        """
+        Load the file entries of the newest manifest so unchanged files can skip hashing.
+        Returns:
+            dict: Mapping of relative path to the manifest entry of that file.
+        """
+        manifests = sorted(self.backup_root.glob(f"*{MANIFEST_SUFFIX}"), key=lambda m: m.stat().st_mtime)
+        if not manifests:
+            return {}
+        try:
+            return {entry["path"]: entry for entry in self.read_manifest(manifests[-1])["files"]}
+        except (OSError, ValueError, KeyError):
+            return {}
+
+
+    def create_backup(self, manifest_path, world_dir, files, stats=None):
+        """
+        Store the given world files and write a manifest referencing them.
+        Args:
+            manifest_path (Path): Where the manifest is written, must end in MANIFEST_SUFFIX.
+            world_dir (Path): The world directory the relative paths point into.
+            files (list[tuple[str, int]]): Relative paths and the number of bytes of each file to back up.
+            stats (Counter | None): If given, incremented with the copy strategy used for each new blob.
+        Returns:
+            tuple[int, int]: The number of new blobs written and the number of bytes written to them.
+        """
+        with self._lock:
+            return self._create_backup(manifest_path, world_dir, files, stats)
+
+
+    def _create_backup(self, manifest_path, world_dir, files, stats):
+        """Store the files and write the manifest, then count its references (the caller holds the lock)."""
+        previous = self._previous_entries()
+        entries = []
+        new_blobs = 0
+        new_bytes = 0
+        for relative_path, size in files:
+            source = world_dir / relative_path
+            mtime_ns = source.stat().st_mtime_ns
+            # Reuse the previous digest if the file has not changed since the last backup
+            old = previous.get(relative_path)
+            if old is not None and old["size"] == size and old["mtime_ns"] == mtime_ns and self.blob_path(old[HASH_ALGORITHM]).exists():
+                digest = old[HASH_ALGORITHM]
+            else:
+                digest = self._hash_file(source, size)
+                if self._store_blob(source, size, digest, stats):
+                    new_blobs += 1
+                    new_bytes += size
+            entries.append({"path": relative_path, "size": size, "mtime_ns": mtime_ns, HASH_ALGORITHM: digest})
+
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "world": world_dir.name,
+            "files": entries,
+        }
+        # Write the manifest atomically, the backup only exists once the manifest does
+        temp_manifest = manifest_path.with_name(f".tmp_{manifest_path.name}")
+        with open(temp_manifest, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(temp_manifest, manifest_path)
+        self._update_references(manifest_path.name, [entry[HASH_ALGORITHM] for entry in entries], 1)
+        return new_blobs, new_bytes
+
+
+    def delete_backup(self, manifest_path):
+        """
+        Delete a manifest and release its references, the blobs are freed by the next collect_garbage.
+        Args:
+            manifest_path (Path): The manifest to delete.
+        Raises:
+            OSError: If the manifest cannot be deleted.
+        """
+        manifest_path = Path(manifest_path)
+        with self._lock:
+            try:
+                digests = [entry[HASH_ALGORITHM] for entry in self.read_manifest(manifest_path)["files"]]
+            except (OSError, ValueError, KeyError):
+                # Without its entries the counts cannot be updated, the next collection rebuilds them instead
+                digests = None
+            manifest_path.unlink(missing_ok=True)
+            if digests is None:
+                self._references = None
+            else:
+                self._update_references(manifest_path.name, digests, -1)
+
+
+    def read_manifest(self, manifest_path):
+        """
+        Read a manifest from disk.
+        Args:
+            manifest_path (Path): The path to the manifest.
+        Returns:
+            dict: The parsed manifest.
+        Raises:
+            ValueError: If the manifest version is not supported.
+        """
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") != MANIFEST_VERSION:
+            raise ValueError(f"{Path(manifest_path).name}: unsupported manifest version {manifest.get('version')}")
+        return manifest
+
+
+    def restore(self, manifest_path, dest_dir):
+        """
+        Recreate the world described by a manifest.
+        Args:
+            manifest_path (Path): The manifest to restore.
+            dest_dir (Path): The directory to restore into, must not exist yet.
+        Returns:
+            Counter: The number of files linked or copied with each strategy.
+        Raises:
+            FileNotFoundError: If a blob referenced by the manifest is missing.
+        """
+        manifest = self.read_manifest(manifest_path)
+        stats = Counter()
+        dest_dir.mkdir(parents=True)
+        for entry in manifest["files"]:
+            blob = self.blob_path(entry[HASH_ALGORITHM])
+            if not blob.exists():
+                raise FileNotFoundError(f"{blob}: blob missing for '{entry['path']}'")
+            dest = dest_dir / entry["path"]
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            # Blobs are never modified, so immutable world files can share them instead of being copied
+            link_or_copy(blob, dest, stats=stats)
+        return stats
+
+
+    def _manifest_names(self):
+        """List the names of the manifests in the backup folder."""
+        return {path.name for path in self.backup_root.glob(f"*{MANIFEST_SUFFIX}")}
+
+
+    def _load_references(self):
+        """
+        Load the saved reference counts if they have not been loaded yet (the caller holds the lock).
+        Returns:
+            tuple[set[str], Counter] | None: The manifest names the counts cover and the counts, None if not saved.
+        """
+        if self._references is None:
+            try:
+                with open(self.refcounts_path, "r", encoding="utf-8") as f:
+                    saved = json.load(f)
+                if saved.get("version") != REFCOUNTS_VERSION:
+                    return None
+                self._references = (set(saved["manifests"]), Counter(saved["counts"]))
+            except (OSError, ValueError, KeyError, TypeError):
+                return None
+        return self._references
+
+
+    def _save_references(self):
+        """Write the reference counts atomically (the caller holds the lock)."""
+        manifests, counts = self._references
+        self.blobs_dir.mkdir(parents=True, exist_ok=True)
+        temp_path = self.refcounts_path.with_name(f".tmp_{REFCOUNTS_FILE_NAME}")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": REFCOUNTS_VERSION, "manifests": sorted(manifests), "counts": {digest: count for digest, count in counts.items() if count > 0}}, f)
+        os.replace(temp_path, self.refcounts_path)
+
+
+    def _update_references(self, manifest_name, digests, change):
+        """
+        Add (change=1) or remove (change=-1) the references of a manifest that was just written or deleted, if the counts
+        are up to date. Otherwise they are left for the next collection to rebuild (the caller holds the lock).
+        """
+        references = self._load_references()
+        if references is None:
+            return
+        manifests, counts = references
+        on_disk = self._manifest_names()
+        if change > 0:
+            # The counts must cover every manifest on disk except the one just written
+            valid = manifest_name not in manifests and manifests == on_disk - {manifest_name}
+        else:
+            # The counts must cover the deleted manifest and every manifest still on disk
+            valid = manifest_name in manifests and manifests - {manifest_name} == on_disk
+        if not valid:
+            self._references = None
+            return
+        if change > 0:
+            manifests.add(manifest_name)
+            counts.update(digests)
+        else:
+            manifests.discard(manifest_name)
+            counts.subtract(digests)
+        self._save_references()
+
+
+    def reference_counts(self):
+        """
+        Count how many manifests reference each blob by reading every manifest, used to rebuild the saved counts.
+        Returns:
+            Counter: Mapping of blob digest to the number of manifest references.
+        """
+        counts = Counter()
+        for manifest_path in self.backup_root.glob(f"*{MANIFEST_SUFFIX}"):
+            manifest = self.read_manifest(manifest_path)
+            counts.update(entry[HASH_ALGORITHM] for entry in manifest["files"])
+        return counts
+
+
+    def collect_garbage(self):
+        """
+        Delete every blob that no manifest references anymore.
+        Returns:
+            tuple[int, int]: The number of blobs deleted and the number of bytes freed.
+        """
+        with self._lock:
+            if not self.blobs_dir.exists():
+                return 0, 0
+            on_disk = self._manifest_names()
+            references = self._load_references()
+            if references is None or references[0] != on_disk:
+                # If any manifest cannot be read we cannot know what it references, so delete nothing
+                self._references = (on_disk, self.reference_counts())
+                self._save_references()
+            counts = self._references[1]
+            deleted = 0
+            freed = 0
+            for blob in self.blobs_dir.glob("*/*"):
+                if counts[blob.name] <= 0:
+                    freed += blob.stat().st_size
+                    blob.unlink()
+                    deleted += 1
+            return deleted, freed
@@ -0,0 +1,267 @@
+import hashlib
+import os
+import queue
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from .backup_catalog import HASH_ALGORITHM, HASH_CHUNK_SIZE, file_checksum
+from .backup_formats import ARCHIVE_ERRORS, open_tar_archive
+from .thread_priority import lower_thread_priority
+
+
+# Constants
+READ_CHUNK_SIZE = 1024 * 1024   # 1MB (in binary), the most a worker holds in memory per file
+
+
+@dataclass
+class VerificationResult:
+    """
+    Dataclass holding the outcome of verifying a backup.
+    Attributes:
+        name (str): The backup's name.
+        ok (bool): True if every file could be read back intact.
+        detail (str): What was checked, or what was wrong.
+        checksum (str | None): The sha256 of the backup file as read during verification, None for folders.
+    """
+    name: str
+    ok: bool
+    detail: str
+    checksum: str | None = None
+
+
+def _read_through(stream):
+    """Read a stream to the end in fixed-size chunks, returning the number of bytes read."""
+    total = 0
+    while chunk := stream.read(READ_CHUNK_SIZE):
+        total += len(chunk)
+    return total
+
+
+def _split(items, parts, weight):
+    """Split items into at most 'parts' lists of roughly equal total weight, largest items first."""
+    buckets = [[] for _ in range(max(1, min(parts, len(items))))]
+    totals = [0] * len(buckets)
+    for item in sorted(items, key=weight, reverse=True):
+        smallest = totals.index(min(totals))
+        buckets[smallest].append(item)
+        totals[smallest] += weight(item)
+    return buckets
+
+
+def _verify_zip_members(path, members):
+    """
+    Decompress zip members to the end, which makes zipfile check each member's CRC.
+    Every worker opens its own handle, ZipFile objects cannot be shared between threads.
+    Raises:
+        zipfile.BadZipFile: If a member's CRC does not match its contents.
+    """
+    with zipfile.ZipFile(path) as archive:
+        for member in members:
+            with archive.open(member) as stream:
+                _read_through(stream)
+
+
+def _read_tar_members(path, archive_format):
+    """
+    Decompress a compressed tar archive to the end, which checks the zstd frame checksum or the xz block checks.
+    Returns:
+        tuple[int, int]: The number of files and bytes read.
+    """
+    files = 0
+    total = 0
+    with open_tar_archive(path, archive_format) as archive:
+        for member in archive:
+            if member.isfile():
+                with archive.extractfile(member) as stream:
+                    total += _read_through(stream)
+                files += 1
+    return files, total
+
+
+def _hash_blobs(repository, digests):
+    """
+    Hash repository blobs and compare them with the digests they are stored under.
+    Raises:
+        ValueError: If a blob is missing or its contents do not match.
+    """
+    for expected in digests:
+        blob = repository.blob_path(expected)
+        digest = hashlib.new(HASH_ALGORITHM)
+        try:
+            with open(blob, "rb") as f:
+                while chunk := f.read(HASH_CHUNK_SIZE):
+                    digest.update(chunk)
+        except FileNotFoundError:
+            raise ValueError(f"blob {blob.name} is missing")
+        if digest.hexdigest() != expected:
+            raise ValueError(f"blob {blob.name} is corrupted")
+
+
+def _read_files(files):
+    """Read files to the end to make sure every block of them is readable."""
+    for file in files:
+        with open(file, "rb") as f:
+            _read_through(f)
+
+
+class BackupVerifier:
+    """
+    Reads backups back in the background to catch corruption before a backup is needed.
+    Zip archives have every member decompressed (checking its CRC) and the archive hashed against the checksum recorded
+    in the catalog, compressed tar archives are decompressed to the end (checking the zstd or xz checksums) and hashed the
+    same way, repository manifests have every blob re-hashed, and folders have every file read. The work of one
+    backup is split across a pool of threads running at a configurable I/O and CPU priority, and every file is
+    streamed in fixed-size chunks so memory use does not depend on the size of the backup.
+    """
+
+    def __init__(self, catalog, repository, workers, on_result=None, priority="normal", cpus=None):
+        """
+        Initialize the verifier, backups are only verified once queued.
+        Args:
+            catalog (BackupCatalog): The catalog the results are recorded in.
+            repository (BackupRepository): The repository manifests are verified against.
+            workers (int): The number of threads reading a backup.
+            on_result (func | None): Called with each VerificationResult.
+            priority (str): The priority of the verifying threads, see lower_thread_priority.
+            cpus (set[int] | None): The CPUs the verifying threads are restricted to, or None for every CPU.
+        """
+        self.catalog = catalog
+        self.repository = repository
+        self.workers = workers
+        self.on_result = on_result
+        self.priority = priority
+        self.cpus = cpus
+        self._queue = queue.Queue()
+        # Names queued or being verified, so a backup is never queued twice
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+        self._pool = None
+        self._thread = None
+
+
+    def start(self):
+        """Start the thread that verifies queued backups one at a time."""
+        self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="verify", initializer=lower_thread_priority, initargs=(self.priority, self.cpus))
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+
+    def submit(self, name):
+        """
+        Queue a backup for verification.
+        Args:
+            name (str): The backup's name in the catalog.
+        Returns:
+            bool: True if it was queued, False if it is already waiting.
+        """
+        with self._pending_lock:
+            if name in self._pending:
+                return False
+            self._pending.add(name)
+        self._queue.put(name)
+        return True
+
+
+    def pending(self):
+        """
+        Get the backups waiting to be verified.
+        Returns:
+            int: The number of backups queued or being verified.
+        """
+        with self._pending_lock:
+            return len(self._pending)
+
+
+    def _run(self):
+        """Verify queued backups until the process exits."""
+        lower_thread_priority(self.priority, self.cpus)
+        while True:
+            name = self._queue.get()
+            try:
+                result = self.verify(name)
+                if result is not None:
+                    self.catalog.record_verification(result.name, result.ok, result.detail, result.checksum)
+                    if self.on_result is not None:
+                        self.on_result(result)
+            except Exception as e:
+                if self.on_result is not None:
+                    self.on_result(VerificationResult(name, False, f"verification could not run: {e}"))
+            finally:
+                with self._pending_lock:
+                    self._pending.discard(name)
+
+
+    def verify(self, name):
+        """
+        Verify a backup now, on the calling thread and the worker pool.
+        Args:
+            name (str): The backup's name in the catalog.
+        Returns:
+            VerificationResult | None: The outcome, or None if the backup is no longer cataloged.
+        """
+        record = self.catalog.get(name)
+        if record is None:
+            return None
+        path = self.catalog.backup_root / name
+        if not path.exists():
+            return VerificationResult(name, False, "backup is missing")
+        try:
+            if record.format == "zip":
+                return self._verify_zip(record, path)
+            elif record.format in ("tar_zstd", "tar_xz"):
+                return self._verify_tar(record, path)
+            elif record.format == "manifest":
+                return self._verify_manifest(record, path)
+            return self._verify_folder(record, path)
+        except (OSError, ValueError, RuntimeError) + ARCHIVE_ERRORS as e:
+            return VerificationResult(name, False, str(e))
+
+
+    def _verify_zip(self, record, path):
+        """Decompress every member on the pool while the archive is hashed, then compare the hash with the catalog."""
+        with zipfile.ZipFile(path) as archive:
+            members = [info for info in archive.infolist() if not info.is_dir()]
+        checksum = self._pool.submit(file_checksum, path)
+        chunks = [self._pool.submit(_verify_zip_members, path, part) for part in _split(members, self.workers, lambda info: info.compress_size)]
+        for chunk in chunks:
+            chunk.result()
+        checksum = checksum.result()
+        if record.checksum is not None and checksum != record.checksum:
+            return VerificationResult(record.name, False, "archive checksum does not match the one recorded when it was created", checksum)
+        total = sum(info.file_size for info in members)
+        return VerificationResult(record.name, True, f"{len(members)} files ({total // (1024 * 1024)}MB) passed CRC checks", checksum)
+
+
+    def _verify_tar(self, record, path):
+        """Decompress the archive on the pool while it is hashed, then compare the hash with the catalog. A tar stream cannot be split between workers."""
+        checksum = self._pool.submit(file_checksum, path)
+        files, total = self._pool.submit(_read_tar_members, path, record.format).result()
+        checksum = checksum.result()
+        if record.checksum is not None and checksum != record.checksum:
+            return VerificationResult(record.name, False, "archive checksum does not match the one recorded when it was created", checksum)
+        return VerificationResult(record.name, True, f"{files} files ({total // (1024 * 1024)}MB) passed {'zstd' if record.format == 'tar_zstd' else 'xz'} checks", checksum)
+
+
+    def _verify_manifest(self, record, path):
+        """Re-hash every blob the manifest references on the pool."""
+        checksum = file_checksum(path)
+        if record.checksum is not None and checksum != record.checksum:
+            return VerificationResult(record.name, False, "manifest checksum does not match the one recorded when it was created", checksum)
+        entries = self.repository.read_manifest(path)["files"]
+        blobs = {entry[HASH_ALGORITHM]: entry["size"] for entry in entries}
+        parts = _split(list(blobs), self.workers, lambda digest: blobs[digest])
+        chunks = [self._pool.submit(_hash_blobs, self.repository, part) for part in parts]
+        for chunk in chunks:
+            chunk.result()
+        return VerificationResult(record.name, True, f"{len(entries)} files in {len(blobs)} blobs passed hash checks", checksum)
+
+
+    def _verify_folder(self, record, path):
+        """Read every file of the folder on the pool, folders have no checksums to compare against."""
+        files = [Path(root) / file for root, _, names in os.walk(path) for file in names]
+        chunks = [self._pool.submit(_read_files, part) for part in _split(files, self.workers, lambda file: 1)]
+        for chunk in chunks:
+            chunk.result()
+        return VerificationResult(record.name, True, f"{len(files)} files are readable")
@@ -1,10 +1,13 @@
 import logging
-from .format_helper import process_line
+from .format_helper import make_prefix, format_timestamp
 
 
 # This could be moved to bot as it is only used there; however, I will leave it here for now.
 class BroadcastHandler(logging.Handler):
-    """Custom logging handler that broadcasts log messages to an OutputBroadcaster."""
+    """
+    Custom logging handler that broadcasts log messages to an OutputBroadcaster.
+    Records are formatted by the handler itself, with the same prefix as every other line, so no formatter is used.
+    """
     def __init__(self, broadcaster, logger):
         super().__init__()
         self.broadcaster = broadcaster
@@ -12,8 +15,11 @@ class BroadcastHandler(logging.Handler):
 
     def emit(self, record):
         """Emit a log record by publishing it to the broadcaster."""
-        msg = self.format(record)
-        timestamp, text = process_line(msg)
+        # Build the prefix straight from the record instead of formatting it and parsing it back
+        timestamp = make_prefix(format_timestamp(record.created), record.levelname)
+        text = record.getMessage()
+        if record.exc_info:
+            text += "\n" + logging.Formatter().formatException(record.exc_info)
         # Send the timestamp and the text to the CLI
         self.broadcaster.publish(timestamp, text)
         # Just combine the timestamp and the text and send it to the logger
@@ -1,11 +1,122 @@
 from enum import Enum
+from collections import deque
+import threading
+from time import perf_counter
+from .metrics import REGISTRY
+
+
+# Constants
+DEFAULT_QUEUE_SIZE = 1000
+# Time taken to call every synchronous subscriber and queue for every asynchronous one
+DISPATCH_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1)
+DISPATCH_SECONDS = REGISTRY.histogram("broadcaster_dispatch_seconds", "Time taken to deliver one publish to all subscribers.", ("broadcaster",), DISPATCH_BUCKETS)
+
+
+class OverflowPolicy(Enum):
+    """What an asynchronous subscriber's queue does when it is full."""
+    BLOCK = 1           # Wait for space, slowing down the publisher
+    DROP_OLDEST = 2     # Discard the oldest queued item
+    COALESCE = 3        # Merge the new item into the newest queued item
+
+
+class SubscriberQueue:
+    """Bounded queue with a dedicated worker thread that delivers items to one subscriber."""
+    def __init__(self, callback, merge, max_size=DEFAULT_QUEUE_SIZE, overflow=OverflowPolicy.DROP_OLDEST):
+        """
+        Initialize the queue and start its worker thread.
+        Args:
+            callback (func): The subscriber to deliver items to.
+            merge (func): Function merging two queued argument tuples into one, used by OverflowPolicy.COALESCE.
+            max_size (int): The maximum number of queued items.
+            overflow (OverflowPolicy): What to do when the queue is full.
+        """
+        self.callback = callback
+        self.merge = merge
+        self.max_size = max_size
+        self.overflow = overflow
+        self._items = deque()
+        self._condition = threading.Condition()
+        # Counters, only updated while holding the condition
+        self.delivered = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.high_water = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def put(self, args):
+        """
+        Queue an item for delivery, applying the overflow policy if the queue is full.
+        Args:
+            args (tuple): The arguments to call the subscriber with.
+        """
+        with self._condition:
+            if len(self._items) >= self.max_size:
+                match self.overflow:
+                    case OverflowPolicy.BLOCK:
+                        while len(self._items) >= self.max_size:
+                            self._condition.wait()
+                    case OverflowPolicy.DROP_OLDEST:
+                        self._items.popleft()
+                        self.dropped += 1
+                    case OverflowPolicy.COALESCE:
+                        self._items[-1] = self.merge(self._items[-1], args)
+                        self.coalesced += 1
+                        return
+            self._items.append(args)
+            self.high_water = max(self.high_water, len(self._items))
+            self._condition.notify_all()
+
+    def _run(self):
+        """Worker thread that delivers queued items in order."""
+        while True:
+            with self._condition:
+                while not self._items:
+                    self._condition.wait()
+                args = self._items.popleft()
+                # Wake a publisher that is blocked on a full queue
+                self._condition.notify_all()
+            try:
+                self.callback(*args)
+            except Exception:
+                # A failing subscriber must not kill its worker, count it and move on
+                with self._condition:
+                    self.errors += 1
+                continue
+            with self._condition:
+                self.delivered += 1
+
+    def stats(self):
+        """
+        Get the queue's counters.
+        Returns:
+            dict: The subscriber name, queue depth, maximum size, and delivered, dropped, coalesced, error and high-water counts.
+        """
+        with self._condition:
+            return {
+                "subscriber": getattr(self.callback, "__qualname__", repr(self.callback)),
+                "depth": len(self._items),
+                "max_size": self.max_size,
+                "high_water": self.high_water,
+                "delivered": self.delivered,
+                "dropped": self.dropped,
+                "coalesced": self.coalesced,
+                "errors": self.errors,
+            }
 
 
 class Broadcaster:
     """Class to broadcast server output to multiple subscribers."""
-    def __init__(self):
-        """Initialize the Broadcaster with an empty list of subscribers."""
+    def __init__(self, name=None):
+        """
+        Initialize the Broadcaster with an empty list of subscribers.
+        Args:
+            name (str | None): The name the broadcaster's metrics are labelled with, defaults to the class name.
+        """
         self.subscribers = []
+        self.name = name or type(self).__name__
+        self._dispatch_seconds = DISPATCH_SECONDS.labels(self.name)
 
     class Priority(Enum):
         """Priority levels for subscribers."""
@@ -13,15 +124,88 @@ class Broadcaster:
         MEDIUM = 2
         LOW = 3
 
-    def subscribe(self, callback, priority = Priority.MEDIUM):
+    class _Subscription:
+        """A registered callback, its priority, whether it takes batches, and its queue if it is dispatched asynchronously."""
+        def __init__(self, callback, priority, batch, queue):
+            self.callback = callback
+            self.priority = priority
+            self.batch = batch
+            self.queue = queue
+
+    def subscribe(self, callback, priority = Priority.MEDIUM, asynchronous = False, queue_size = DEFAULT_QUEUE_SIZE, overflow = OverflowPolicy.DROP_OLDEST, batch = False):
         """
         Register a new subscriber to be called upon.
         Args:
             callback (func): Function to add to the subscribe list.
+            priority (Priority): Subscribers with a higher priority are called first.
+            asynchronous (bool): If True, the callback runs on its own worker thread fed by a bounded queue, so a slow subscriber never holds up the publisher.
+            queue_size (int): The maximum number of queued items for an asynchronous subscriber.
+            overflow (OverflowPolicy): What an asynchronous subscriber's queue does when it is full.
+            batch (bool): If True, the callback is called once per published batch with a list of argument tuples (see LineBroadcaster.publish_batch).
         """
-        self.subscribers.append(callback)
+        merge = self._coalesce_batches if batch else self._coalesce
+        queue = SubscriberQueue(callback, merge, queue_size, overflow) if asynchronous else None
+        self.subscribers.append(self._Subscription(callback, priority, batch, queue))
         # Sort subscribers based on priority
-        self.subscribers.sort(key=lambda x: priority.value)
+        self.subscribers.sort(key=lambda x: x.priority.value)
+
+    def _deliver(self, args):
+        """
+        Call every synchronous subscriber and queue the arguments for every asynchronous subscriber.
+        Args:
+            args (tuple): The arguments to call the subscribers with.
+        """
+        start = perf_counter()
+        for subscription in self.subscribers:
+            self._call(subscription, ([args],) if subscription.batch else args)
+        self._dispatch_seconds.observe(perf_counter() - start)
+
+    def _deliver_batch(self, batch):
+        """
+        Deliver a list of argument tuples, as one call to batch subscribers and one call per item to the others.
+        Args:
+            batch (list[tuple]): The arguments of each item in the batch.
+        """
+        start = perf_counter()
+        for subscription in self.subscribers:
+            if subscription.batch:
+                self._call(subscription, (batch,))
+            else:
+                for args in batch:
+                    self._call(subscription, args)
+        self._dispatch_seconds.observe(perf_counter() - start)
+
+    @staticmethod
+    def _call(subscription, args):
+        """Call a synchronous subscriber directly, or queue the arguments for an asynchronous one."""
+        if subscription.queue is None:
+            subscription.callback(*args)
+        else:
+            subscription.queue.put(args)
+
+    def _coalesce(self, queued, new):
+        """
+        Merge a new item into the newest queued item of a full OverflowPolicy.COALESCE queue. Keeps the queued item by default.
+        Args:
+            queued (tuple): The arguments of the newest queued item.
+            new (tuple): The arguments of the item being published.
+        Returns:
+            tuple: The merged arguments.
+        """
+        return queued
+
+    @staticmethod
+    def _coalesce_batches(queued, new):
+        """Merge batches by appending the new batch's items to the queued batch."""
+        return (queued[0] + new[0],)
+
+    def dispatch_stats(self):
+        """
+        Get the queue counters of every asynchronous subscriber.
+        Returns:
+            list[dict]: One SubscriberQueue.stats() dictionary per asynchronous subscriber.
+        """
+        return [subscription.queue.stats() for subscription in self.subscribers if subscription.queue is not None]
 
 class LineBroadcaster(Broadcaster):
     def publish(self, timestamp, line):
@@ -30,11 +214,30 @@ class LineBroadcaster(Broadcaster):
         Args:
             line (str): Line to send to all subscribers
         """
-        for callback in self.subscribers:
-            callback(timestamp, line)
+        self._deliver((timestamp, line))
+
+    def publish_batch(self, lines):
+        """
+        Send several lines of output at once. Subscribers registered with batch=True get a single call with the whole list.
+        Args:
+            lines (list[tuple[str, str]]): The (timestamp, line) pairs to send.
+        """
+        self._deliver_batch(lines)
+
+    def _coalesce(self, queued, new):
+        """Merge lines by appending the new line to the queued one, so no output is lost."""
+        return (queued[0], queued[1] + "\n" + new[0] + new[1])
 
 class SignalBroadcaster(Broadcaster):
     def publish(self):
         """Send an alert to all registered subscribers using their callback function."""
-        for callback in self.subscribers:
-            callback()
+        self._deliver(())
+
+class EventBroadcaster(Broadcaster):
+    def publish(self, event):
+        """
+        Send an event to all registered subscribers using their callback function.
+        Args:
+            event (object): The event to send.
+        """
+        self._deliver((event,))
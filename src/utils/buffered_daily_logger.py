@@ -2,82 +2,210 @@ import os
 import datetime
 import threading
 import time
+from .broadcaster import SignalBroadcaster
+from .metrics import REGISTRY
 
 
-# Buffer size between flushes
-BUFFER_SIZE = 20
-# Seconds between flushes
-FLUSH_INTERVAL = 10
+# Bytes buffered before the writer thread is woken up to flush
+FLUSH_BYTES = 64 * 1024         # 64KB (in binary)
+# Maximum seconds a message waits in the buffer before it is flushed
+FLUSH_INTERVAL = 1
+# When the log file is fsynced: never (left to the OS), when the day's file is closed, or after every flush
+FSYNC_POLICIES = ("never", "rotate", "always")
+ENCODING = "utf-8"
+# Most bytes kept in the buffer while the log file cannot be written, the oldest messages are dropped beyond it
+MAX_BACKLOG_BYTES = 16 * 1024 * 1024    # 16MB (in binary)
+# Metrics of the writer thread
+FLUSH_SECONDS = REGISTRY.histogram("log_flush_seconds", "Time taken to write and flush one batch of log messages.")
+FLUSHED_BYTES = REGISTRY.counter("log_flushed_bytes_total", "Characters of log messages written to the log file.")
+DROPPED_MESSAGES = REGISTRY.counter("log_dropped_messages_total", "Log messages dropped because the log file could not be written for too long.")
 
 
 class BufferedDailyLogger:
     """A custom logger class for use in the server manager"""
-    def __init__(self, log_dir):
+    def __init__(self, log_dir, flush_bytes=FLUSH_BYTES, flush_interval=FLUSH_INTERVAL, fsync="rotate", max_backlog=MAX_BACKLOG_BYTES):
         """
-        Buffered logger that changes the log file daily
+        Buffered logger that changes the log file daily.
+        Producers only append to an in-memory buffer, a dedicated writer thread keeps the day's file open and does all the writing.
         Args:
             log_dir (str): The path to the log directory
+            flush_bytes (int): Number of buffered bytes that triggers a flush
+            flush_interval (float): Maximum seconds between flushes
+            fsync (str): One of FSYNC_POLICIES
+            max_backlog (int): Most buffered bytes kept while writes are failing, older messages are dropped
+        Raises:
+            ValueError: If the fsync policy is not one of FSYNC_POLICIES.
         """
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"{fsync}: fsync policy must be one of {', '.join(FSYNC_POLICIES)}")
         self.log_dir = log_dir
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.max_backlog = max_backlog
         self.buffer = []
-        # Mutex
+        self._buffered_bytes = 0
+        # Mutex, the condition wakes the writer thread and any thread waiting in flush()
         self.lock = threading.Lock()
+        self._condition = threading.Condition(self.lock)
+        # flush() requests are numbered, the writer records the last request it has completed
+        self._flush_requested = 0
+        self._flush_completed = 0
         self.current_date = datetime.date.today()
         self.log_file_path = self._get_log_file_path(self.current_date)
+        # Only touched by the writer thread
+        self._file = None
+        self.last_error = None
         self.running = True
+        # Alerts subscribers after a day's file has been closed, eg. so it can be archived
+        self.rotation_broadcaster = SignalBroadcaster("log_rotation")
 
-        # We want to start the background thread responsible for flushing the buffer to the file
-        self._wait_event = threading.Event()
-        self._flush_thread = threading.Thread(target=self._periodic_flush, daemon=True)
-        self._flush_thread.start()
+        # We want to start the background thread responsible for writing the buffer to the file
+        self._writer_thread = threading.Thread(target=self._writer, daemon=True)
+        self._writer_thread.start()
 
     def _get_log_file_path(self, date):
         """Join the log directory with the name of the log file"""
         return os.path.join(self.log_dir, f"log_{date.isoformat()}.txt")
-    
+
     def log(self, message):
-        """Log the message into the buffer and write to the log file if the buffer is full"""
-        if self.running:
-            # Lock the critical section of log()
-            with self.lock:
+        """Add the message to the buffer, waking the writer thread if enough bytes are buffered"""
+        self.log_many((message,))
+
+    def log_many(self, messages):
+        """
+        Add several messages to the buffer under a single lock acquisition.
+        Args:
+            messages (Iterable[str]): The messages to log, in order.
+        Raises:
+            RuntimeError: If the logger has been stopped.
+        """
+        with self._condition:
+            if not self.running:
+                raise RuntimeError("Logger not running")
+            for message in messages:
                 self.buffer.append(message)
-                # Flush if the buffer size is exceeded
-                if len(self.buffer) >= BUFFER_SIZE:
-                    self._flush_buffer()
-        else:
-            raise RuntimeError("Logger not running")
-    
-    def _flush_buffer(self):
-        """Flush the buffer into the file, change the file if the date has changed"""
-        # If the buffer is empty, just return
-        if not self.buffer:
+                # Approximate size, exact for ASCII which is almost all of the server's output
+                self._buffered_bytes += len(message) + 1
+            if self._buffered_bytes >= self.flush_bytes:
+                self._condition.notify_all()
+
+    def flush(self, timeout=None):
+        """
+        Ask the writer thread to flush now and wait until everything logged before this call is written.
+        Args:
+            timeout (float | None): The maximum number of seconds to wait, or None to wait indefinitely.
+        Returns:
+            bool: True if the buffer was flushed, False if the timeout expired.
+        """
+        with self._condition:
+            self._flush_requested += 1
+            request = self._flush_requested
+            self._condition.notify_all()
+            return self._condition.wait_for(lambda: self._flush_completed >= request or not self._writer_thread.is_alive(), timeout)
+
+    def _seconds_until_midnight(self):
+        """Seconds until the date changes, so the writer can wake up and rotate on time"""
+        now = datetime.datetime.now()
+        tomorrow = datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time())
+        return (tomorrow - now).total_seconds()
+
+    def _writer(self):
+        """Function that runs on a separate thread to write the buffer to the file and rotate it daily"""
+        while True:
+            with self._condition:
+                timeout = min(self.flush_interval, self._seconds_until_midnight())
+                self._condition.wait_for(lambda: self._buffered_bytes >= self.flush_bytes or self._flush_requested > self._flush_completed or not self.running, timeout)
+                # Take the whole buffer, producers carry on with an empty one while we write
+                batch, self.buffer = self.buffer, []
+                self._buffered_bytes = 0
+                request = self._flush_requested
+                stopping = not self.running
+            if not self._write(batch) and not stopping:
+                # Back off instead of spinning while the file cannot be written
+                time.sleep(self.flush_interval)
+            # Messages logged before midnight have been written to that day's file, start the new day's file
+            if datetime.date.today() != self.current_date:
+                self._rotate()
+            if stopping:
+                self._close()
+            with self._condition:
+                self._flush_completed = request
+                self._condition.notify_all()
+            if stopping:
+                return
+
+    def _write(self, batch):
+        """
+        Write a batch of messages to the day's file, opening it if needed and fsyncing according to the policy.
+        Args:
+            batch (list[str]): The messages to write.
+        Returns:
+            bool: True if the batch was written, False if it was put back in the buffer after an error.
+                The buffer is then trimmed to max_backlog bytes, dropping the oldest messages.
+        """
+        if not batch:
+            return True
+        try:
+            start = time.perf_counter()
+            if self._file is None:
+                self._file = open(self.log_file_path, "a", encoding=ENCODING, errors="replace")
+            # One write and one flush per batch, however many messages it holds
+            text = "\n".join(batch) + "\n"
+            self._file.write(text)
+            self._file.flush()
+            if self.fsync == "always":
+                os.fsync(self._file.fileno())
+            FLUSH_SECONDS.observe(time.perf_counter() - start)
+            FLUSHED_BYTES.inc(len(text))
+            return True
+        except OSError as e:
+            # Keep the messages and retry with a fresh handle on the next flush
+            self.last_error = e
+            self._close()
+            with self._condition:
+                self.buffer[:0] = batch
+                self._buffered_bytes += sum(len(message) + 1 for message in batch)
+                self._trim_backlog()
+            return False
+
+    def _trim_backlog(self):
+        """Drop the oldest buffered messages until the buffer fits in max_backlog, the lock must be held"""
+        if self._buffered_bytes <= self.max_backlog:
+            return
+        dropped = 0
+        while dropped < len(self.buffer) and self._buffered_bytes > self.max_backlog:
+            self._buffered_bytes -= len(self.buffer[dropped]) + 1
+            dropped += 1
+        # One slice deletion however many messages are dropped
+        del self.buffer[:dropped]
+        DROPPED_MESSAGES.inc(dropped)
+
+    def _rotate(self):
+        """Close the finished day's file and switch to the new day's file, which is opened on the next write"""
+        self._close()
+        self.current_date = datetime.date.today()
+        self.log_file_path = self._get_log_file_path(self.current_date)
+        self.rotation_broadcaster.publish()
+
+    def _close(self):
+        """Flush, fsync (unless the policy is 'never') and close the current file"""
+        if self._file is None:
             return
-        # Rotate the log file if the day has changed
-        today = datetime.date.today()
-        if self.current_date != today:
-            self.current_date = today
-            self.log_file_path = self._get_log_file_path(today)
         try:
-            # Append the entire buffer to the file
-            with open(self.log_file_path, "a") as f:
-                f.write("\n".join(self.buffer) + "\n")
-            # Clear the buffer
-            self.buffer.clear()
-        except Exception as e:
-            raise Exception(e)
-        
-    def _periodic_flush(self):
-        """Function that runs on a separate thread to periodically flush the """
-        while self.running:
-            self._wait_event.wait(FLUSH_INTERVAL)
-            with self.lock:
-                self._flush_buffer()
+            self._file.flush()
+            if self.fsync != "never":
+                os.fsync(self._file.fileno())
+        except OSError as e:
+            self.last_error = e
+        finally:
+            self._file.close()
+            self._file = None
 
     def stop(self):
-        """Stop the logger and flushes the current buffer"""
-        self.running = False
-        # Wake up the thread if it is sleeping
-        self._wait_event.set()
-        self._flush_thread.join()
-        with self.lock:
-            self._flush_buffer()
+        """Stop the logger, writing the rest of the buffer and closing the file"""
+        with self._condition:
+            self.running = False
+            # Wake up the thread if it is sleeping
+            self._condition.notify_all()
+        self._writer_thread.join()
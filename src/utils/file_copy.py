@@ -0,0 +1,178 @@
+import errno
+import os
+import shutil
+import sys
+import threading
+from collections import Counter
+
+try:
+    import fcntl
+except ImportError:
+    # fcntl is not available on Windows, where reflinks are never attempted
+    fcntl = None
+
+
+# Constants
+FICLONE = 0x40049409                    # from linux/fs.h, _IOW(0x94, 9, int)
+COPY_CHUNK_SIZE = 64 * 1024 * 1024      # 64MB (in binary), the most copy_file_range/sendfile are asked for per call
+FALLBACK_BUFFER_SIZE = 1024 * 1024      # 1MB (in binary)
+LIMITED_CHUNK_SIZE = 1024 * 1024        # 1MB (in binary) per call while a copy limiter is set, so the rate stays smooth
+# Errors meaning a strategy is not supported for a pair of files, rather than the copy itself failing
+UNSUPPORTED_ERRNOS = {errno.EOPNOTSUPP, errno.ENOTSUP, errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.ENOTTY, errno.EBADF, errno.EPERM}
+
+# Strategy names, in the order they are attempted
+REFLINK = "reflink"
+COPY_FILE_RANGE = "copy_file_range"
+SENDFILE = "sendfile"
+USERSPACE = "userspace"
+
+# Strategies that failed as unsupported for a (source device, destination device) pair, so they are not retried for every file
+_unsupported = {}
+# The rate limiter copies on each thread are held to, see set_copy_limiter
+_local = threading.local()
+
+
+def set_copy_limiter(limiter):
+    """
+    Hold the copies made by the calling thread to a rate limit, eg. on the maintenance workers while the server runs.
+    Reflinks share blocks instead of copying data, so they are never limited.
+    Args:
+        limiter (TokenBucket | None): The limiter to take each chunk's bytes from, None removes the limit.
+    """
+    _local.limiter = limiter
+
+
+def copy_file(source, dest, length=None, stats=None):
+    """
+    Copy a file and its metadata like shutil.copy2, using the cheapest mechanism the filesystem supports.
+    Tries a FICLONE reflink first, then os.copy_file_range, then os.sendfile, and finally a userspace copy.
+    Args:
+        source (str | Path): The file to copy.
+        dest (str | Path): The destination file, overwritten if it exists.
+        length (int | None): The number of bytes to copy from the start of the file, or None for the whole file.
+        stats (Counter | None): If given, incremented with the name of the strategy that was used.
+    Returns:
+        str: The name of the strategy that was used.
+    """
+    with open(source, "rb") as src, open(dest, "wb") as dst:
+        src_fd = src.fileno()
+        dst_fd = dst.fileno()
+        source_size = os.fstat(src_fd).st_size
+        if length is None:
+            length = source_size
+        devices = (os.fstat(src_fd).st_dev, os.fstat(dst_fd).st_dev)
+        unsupported = _unsupported.setdefault(devices, set())
+
+        strategy = None
+        if fcntl is not None and sys.platform.startswith("linux") and REFLINK not in unsupported:
+            strategy = _try_strategy(_copy_reflink, REFLINK, unsupported, src_fd, dst_fd, length, source_size)
+        if strategy is None and hasattr(os, "copy_file_range") and COPY_FILE_RANGE not in unsupported:
+            strategy = _try_strategy(_copy_file_range, COPY_FILE_RANGE, unsupported, src_fd, dst_fd, length, source_size)
+        if strategy is None and sys.platform.startswith("linux") and SENDFILE not in unsupported:
+            strategy = _try_strategy(_copy_sendfile, SENDFILE, unsupported, src_fd, dst_fd, length, source_size)
+        if strategy is None:
+            _copy_userspace(src, dst, length)
+            strategy = USERSPACE
+    shutil.copystat(source, dest)
+    if stats is not None:
+        stats[strategy] += 1
+    return strategy
+
+
+def copy_tree(source, dest, dirs_exist_ok=False, stats=None):
+    """
+    Copy a directory tree like shutil.copytree, copying every file with copy_file.
+    Args:
+        source (str | Path): The directory to copy.
+        dest (str | Path): The destination directory.
+        dirs_exist_ok (bool): Whether to copy into an existing destination directory.
+        stats (Counter | None): If given, incremented with the name of the strategy used for each file.
+    Returns:
+        Counter: The number of files copied with each strategy.
+    """
+    if stats is None:
+        stats = Counter()
+    shutil.copytree(source, dest, dirs_exist_ok=dirs_exist_ok, copy_function=lambda s, d: copy_file(s, d, stats=stats))
+    return stats
+
+
+def describe_copy_stats(stats):
+    """
+    Summarize the strategies recorded in a stats counter for logging.
+    Args:
+        stats (Counter): The strategy counts.
+    Returns:
+        str: eg. "24 files (reflink: 20, userspace: 4)".
+    """
+    total = sum(stats.values())
+    if not total:
+        return "0 files"
+    return f"{total} files (" + ", ".join(f"{strategy}: {count}" for strategy, count in stats.most_common()) + ")"
+
+
+def _try_strategy(function, name, unsupported, src_fd, dst_fd, length, source_size):
+    """
+    Run a copy strategy from the start of both files, remembering it as unsupported if the kernel rejects it.
+    Returns:
+        str | None: The strategy name if it succeeded, None if the next strategy should be tried.
+    """
+    try:
+        function(src_fd, dst_fd, length, source_size)
+        return name
+    except OSError as e:
+        if e.errno not in UNSUPPORTED_ERRNOS:
+            raise
+        unsupported.add(name)
+        # Undo any partial progress before the next strategy starts over
+        os.lseek(src_fd, 0, os.SEEK_SET)
+        os.lseek(dst_fd, 0, os.SEEK_SET)
+        os.ftruncate(dst_fd, 0)
+        return None
+
+
+def _copy_reflink(src_fd, dst_fd, length, source_size):
+    """Share the source's blocks with the destination (btrfs, XFS, bcachefs), then trim it to length."""
+    fcntl.ioctl(dst_fd, FICLONE, src_fd)
+    if length < source_size:
+        os.ftruncate(dst_fd, length)
+
+
+def _copy_file_range(src_fd, dst_fd, length, source_size):
+    """Copy inside the kernel, which may also offload to the filesystem or storage."""
+    remaining = length
+    while remaining > 0:
+        copied = os.copy_file_range(src_fd, dst_fd, _next_chunk(remaining, COPY_CHUNK_SIZE))
+        if copied == 0:
+            break
+        remaining -= copied
+
+
+def _copy_sendfile(src_fd, dst_fd, length, source_size):
+    """Copy inside the kernel without passing the data through userspace."""
+    offset = 0
+    while offset < length:
+        sent = os.sendfile(dst_fd, src_fd, offset, _next_chunk(length - offset, COPY_CHUNK_SIZE))
+        if sent == 0:
+            break
+        offset += sent
+
+
+def _copy_userspace(src, dst, length):
+    """Copy through a userspace buffer, the behaviour of shutil.copyfileobj."""
+    remaining = length
+    while remaining > 0:
+        chunk = src.read(_next_chunk(remaining, FALLBACK_BUFFER_SIZE))
+        if not chunk:
+            break
+        dst.write(chunk)
+        remaining -= len(chunk)
+
+
+def _next_chunk(remaining, chunk_size):
+    """Get the size of the next chunk to copy, waiting for the calling thread's limiter to allow it if one is set."""
+    limiter = getattr(_local, "limiter", None)
+    if limiter is None:
+        return min(remaining, chunk_size)
+    chunk = min(remaining, chunk_size, LIMITED_CHUNK_SIZE)
+    limiter.consume(chunk)
+    return chunk
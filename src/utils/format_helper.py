@@ -1,10 +1,14 @@
-from datetime import datetime
 import enum
 import re
-from webbrowser import get
+import time
 
 # Constants
 SPACING_LENGTH = 9
+TIMESTAMP_LENGTH = len("YYYY-MM-DD HH:MM:SS:MMM")
+# Regex to parse server log lines, compiled once at import since it runs for every line the server prints
+LOG_LINE_PATTERN = re.compile(r"\[(?P<timestamp>\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}[:,]\d{3}) (?P<level>\w+)\](?: (?P<message>.*))?")
+# Regex to parse a formatted prefix that has lost its LogPrefix type (eg. after being stored as a plain string)
+PREFIX_PATTERN = re.compile(r"(?P<timestamp>\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}[:,]\d{3}) (?P<level>\w+)")
 
 class LogLevel(enum.Enum):
     INFO = "INFO"
@@ -16,9 +20,77 @@ class LogLevel(enum.Enum):
     CRITICAL = "CRITICAL"
 
 
+class LogPrefix(str):
+    """
+    A formatted log prefix ("YYYY-MM-DD HH:MM:SS:MMM LEVEL    ") that also exposes its timestamp and level.
+    It is a normal string everywhere a prefix was used before, but consumers such as the CLI colouring can read
+    the parts directly instead of parsing the string again. Each level gets its own subclass (see prefix_type) so
+    the level and padding live on the class and creating a prefix is a single string construction.
+    """
+    __slots__ = ()
+    level = ""
+    suffix = ""
+
+    @property
+    def timestamp(self):
+        """The timestamp part of the prefix."""
+        return self[:TIMESTAMP_LENGTH]
+
+
+# LogPrefix subclass for each level seen so far
+_PREFIX_TYPES = {}
+# The second the cached timestamp text belongs to and the text itself, replaced together so readers never see a mix
+_timestamp_cache = (None, "")
+
+
+def prefix_type(level):
+    """
+    Get the LogPrefix subclass for a level, creating it the first time the level is seen.
+    Args:
+        level (str): The log level name.
+    Returns:
+        type: The LogPrefix subclass, call it with the complete prefix string.
+    """
+    cls = _PREFIX_TYPES.get(level)
+    if cls is None:
+        suffix = f" {level}{' ' * max(SPACING_LENGTH - len(level), 1)}"
+        cls = _PREFIX_TYPES.setdefault(level, type("LogPrefix", (LogPrefix,), {"__slots__": (), "level": level, "suffix": suffix}))
+    return cls
+
+
+def make_prefix(timestamp, level):
+    """
+    Build the prefix for a timestamp and level.
+    Args:
+        timestamp (str): The timestamp in the format YYYY-MM-DD HH:MM:SS:MMM.
+        level (str): The log level name.
+    Returns:
+        LogPrefix: The formatted prefix string.
+    """
+    cls = prefix_type(level)
+    return cls(timestamp + cls.suffix)
+
+
+def format_timestamp(epoch):
+    """
+    Format a UNIX time in the format YYYY-MM-DD HH:MM:SS:MMM, reusing the date and time text within the same second.
+    Args:
+        epoch (float): Seconds since the epoch, eg. time.time().
+    Returns:
+        str: The formatted timestamp.
+    """
+    global _timestamp_cache
+    second = int(epoch)
+    cached_second, cached_text = _timestamp_cache
+    if cached_second != second:
+        cached_text = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(second))
+        _timestamp_cache = (second, cached_text)
+    return f"{cached_text}:{int((epoch - second) * 1000):03d}"
+
+
 def get_timestamp():
     """Get the current timestamp in the format YYYY-MM-DD HH:MM:SS:MMM"""
-    return datetime.now().strftime("%Y-%m-%d %H:%M:%S") + f":{datetime.now().microsecond // 1000:03d}"
+    return format_timestamp(time.time())
 
 
 def get_spacing(level: LogLevel):
@@ -38,9 +110,9 @@ def get_prefix(level: LogLevel):
     Args:
         level (LogLevel): The log level.
     Returns:
-        str: The formatted prefix string.
+        LogPrefix: The formatted prefix string.
     """
-    return f"{get_timestamp()} {level.value}{get_spacing(level)}"
+    return make_prefix(get_timestamp(), level.value)
 
 
 def process_line(line):
@@ -49,22 +121,14 @@ def process_line(line):
     Args:
         line (str): The line to process.
     Returns:
-        list[str]: A list containing the formatted prefix and the message.
+        tuple[LogPrefix, str]: The formatted prefix and the message.
     """
-    # Regex to parse log lines
-    pattern = re.compile(r"\[(?P<timestamp>\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}[:,]\d{3}) (?P<level>\w+)\](?: (?P<message>.*))?")
-    match = pattern.match(line)
+    match = LOG_LINE_PATTERN.match(line)
     if match:
-        timestamp = match.group("timestamp")
-        # Replace comma with colon in timestamp for consistency
-        timestamp = timestamp.replace(",", ":")
-        level = match.group("level")
-        # Calculate spacing for alignment
-        spacing = " " * (max(SPACING_LENGTH - len(level), 1))
-        # Get the message part ('or ""' to handle None case)
-        message = match.group("message") or ""
-        # Return the formatted line
-        return [f"{timestamp} {level}{spacing}", message]
+        timestamp, level, message = match.groups()
+        cls = _PREFIX_TYPES.get(level) or prefix_type(level)
+        # Replace comma with colon in timestamp for consistency, and use "" if the line has no message
+        return cls(timestamp.replace(",", ":") + cls.suffix), message or ""
     else:
         # If the line doesn't contain a timestamp, return it with an 'RAW' level
-        return [f"{get_timestamp()} RAW{get_spacing(LogLevel.RAW)}", line]
+        return get_prefix(LogLevel.RAW), line
@@ -0,0 +1,187 @@
+import json
+import os
+import zlib
+from dataclasses import dataclass, field
+from pathlib import Path, PurePosixPath
+
+
+# Constants
+INSTALL_MANIFEST_NAME = ".install_manifest.json"  # Kept in the server folder, lists the files the last update installed
+CRC_CHUNK_SIZE = 1024 * 1024    # 1MB (in binary) per read when computing the CRC32 of an installed file
+
+
+@dataclass
+class UpdatePlan:
+    """
+    Dataclass holding what an update has to do to the server folder.
+    Attributes:
+        extract (list[zipfile.ZipInfo]): The archive members that are new or changed.
+        skipped (list[zipfile.ZipInfo]): The archive members already installed with the same size and CRC32.
+        protected (list[zipfile.ZipInfo]): The archive members left alone because they are protected.
+        removed (list[str]): The installed files the new version no longer ships.
+        manifest (dict[str, list[int]]): The manifest to save once the update is applied.
+    """
+    extract: list = field(default_factory=list)
+    skipped: list = field(default_factory=list)
+    protected: list = field(default_factory=list)
+    removed: list = field(default_factory=list)
+    manifest: dict = field(default_factory=dict)
+
+
+class ProtectedPaths:
+    """
+    A set of protected paths that matches a path if it or any of its parent folders is protected.
+    The paths are normalized into a set once, so a lookup costs one set check per path component instead of comparing
+    against every protected path.
+    """
+
+    def __init__(self, paths):
+        """
+        Initialize the set.
+        Args:
+            paths (list[str]): Files or folders relative to the server folder, eg. "server.properties" or "config".
+        """
+        self._prefixes = {PurePosixPath(path.replace("\\", "/")).as_posix() for path in paths}
+
+
+    def __contains__(self, relative_path):
+        """
+        Check if a path is protected.
+        Args:
+            relative_path (str): A path relative to the server folder using "/" separators, as stored in zip archives.
+        Returns:
+            bool: True if the path or one of its parent folders is protected.
+        """
+        parts = relative_path.strip("/").split("/")
+        prefix = ""
+        for part in parts:
+            prefix = f"{prefix}/{part}" if prefix else part
+            if prefix in self._prefixes:
+                return True
+        return False
+
+
+    def __iter__(self):
+        """Iterate over the protected paths, using "/" separators."""
+        return iter(self._prefixes)
+
+
+def file_crc32(path):
+    """
+    Compute the CRC32 of a file, the checksum zip archives store for each member.
+    Args:
+        path (str | Path): The file to read.
+    Returns:
+        int: The CRC32 of the file's contents.
+    """
+    crc = 0
+    with open(path, "rb") as f:
+        while chunk := f.read(CRC_CHUNK_SIZE):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def load_install_manifest(server_dir):
+    """
+    Load the manifest of the files installed by the last update.
+    Args:
+        server_dir (str | Path): The server folder.
+    Returns:
+        dict[str, list[int]] | None: Each installed path mapped to its [size, CRC32], or None if there is no manifest.
+    """
+    try:
+        with open(Path(server_dir) / INSTALL_MANIFEST_NAME, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest.get("files") if isinstance(manifest, dict) else None
+
+
+def load_installed_version(server_dir):
+    """
+    Get the server version recorded in the manifest of an install.
+    Args:
+        server_dir (str | Path): The server folder.
+    Returns:
+        str | None: The version, or None if there is no manifest or it does not record one.
+    """
+    try:
+        with open(Path(server_dir) / INSTALL_MANIFEST_NAME, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest.get("version") if isinstance(manifest, dict) else None
+
+
+def save_install_manifest(server_dir, files, version=None):
+    """
+    Save the manifest of installed files atomically, so a crash mid-write never leaves half a manifest.
+    Args:
+        server_dir (str | Path): The server folder.
+        files (dict[str, list[int]]): Each installed path mapped to its [size, CRC32].
+        version (str | None): The installed server version, recorded for reference.
+    """
+    manifest_path = Path(server_dir) / INSTALL_MANIFEST_NAME
+    temp_path = manifest_path.with_name(f".tmp{manifest_path.name}")
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": version, "files": files}, f)
+    os.replace(temp_path, manifest_path)
+
+
+def plan_update(members, server_dir, protected, manifest=None):
+    """
+    Compare an update archive's central directory with the installed files to find what has to be written.
+    A member is skipped if the installed file has the size and CRC32 the archive records for it. Installed files are
+    looked up in the manifest and confirmed with a stat() of their size; without a manifest entry, files of the right
+    size have their CRC32 computed once. Files listed in the manifest that the archive no longer contains are removed.
+    Args:
+        members (list[zipfile.ZipInfo]): The archive's members.
+        server_dir (str | Path): The server folder.
+        protected (ProtectedPaths): The paths that are never written or removed.
+        manifest (dict[str, list[int]] | None): The manifest of the installed files, or None if there is none.
+    Returns:
+        UpdatePlan: What to extract, skip and remove, and the manifest describing the result.
+    """
+    server_dir = Path(server_dir)
+    manifest = manifest or {}
+    plan = UpdatePlan()
+    for info in members:
+        if info.is_dir():
+            continue
+        name = info.filename
+        # Never follow a member out of the server folder
+        if not _is_inside(name):
+            continue
+        if name in protected:
+            plan.protected.append(info)
+            continue
+        plan.manifest[name] = [info.file_size, info.CRC]
+        if _is_installed(server_dir / name, info, manifest.get(name)):
+            plan.skipped.append(info)
+        else:
+            plan.extract.append(info)
+    # Only files the manager installed are removed, anything else in the server folder belongs to the user
+    plan.removed = [name for name in manifest if name not in plan.manifest and name not in protected and _is_inside(name)]
+    return plan
+
+
+def _is_inside(name):
+    """Check if an archive path stays inside the folder it is extracted to (not absolute and without "..")."""
+    path = PurePosixPath(name.replace("\\", "/"))
+    return not path.is_absolute() and ".." not in path.parts
+
+
+def _is_installed(path, info, entry):
+    """Check if the file at path already has the size and CRC32 of an archive member."""
+    try:
+        size = path.stat().st_size
+    except OSError:
+        return False
+    if size != info.file_size:
+        return False
+    if entry is not None:
+        return entry == [info.file_size, info.CRC]
+    try:
+        return file_crc32(path) == info.CRC
+    except OSError:
+        return False
@@ -0,0 +1,107 @@
+import os
+from pathlib import Path
+from .file_copy import copy_file
+
+
+# Constants
+# LevelDB never modifies table files after writing them (it only deletes them), so they can be shared by hard links
+IMMUTABLE_SUFFIXES = (".ldb", ".sst")
+HARDLINK = "hardlink"
+
+
+def create_link_snapshot(source_dir, dest_dir, previous_dir=None, stats=None):
+    """
+    Copy a directory tree in the style of 'rsync --link-dest'.
+    Files whose size and modification time match the same file in the previous snapshot are hard-linked to it,
+    everything else is copied. The result is a normal directory that can be used on its own.
+    Args:
+        source_dir (str | Path): The directory to snapshot.
+        dest_dir (str | Path): The snapshot directory to create, must not exist yet.
+        previous_dir (str | Path | None): The previous snapshot to link unchanged files against.
+        stats (Counter | None): If given, incremented with the copy strategy used for each copied file.
+    Returns:
+        tuple[int, int]: The number of files hard-linked and the number of files copied.
+    """
+    source_dir = Path(source_dir)
+    dest_dir = Path(dest_dir)
+    previous_dir = Path(previous_dir) if previous_dir is not None else None
+    linked = 0
+    copied = 0
+    dest_dir.mkdir(parents=True)
+    for root, dirs, files in os.walk(source_dir):
+        relative_root = Path(root).relative_to(source_dir)
+        for name in dirs:
+            (dest_dir / relative_root / name).mkdir()
+        for name in files:
+            source = Path(root) / name
+            dest = dest_dir / relative_root / name
+            if previous_dir is not None and _is_unchanged(source, previous_dir / relative_root / name):
+                try:
+                    os.link(previous_dir / relative_root / name, dest)
+                    linked += 1
+                    continue
+                except OSError:
+                    # Fall back to copying (eg. the link count limit was hit or the filesystem does not support links)
+                    pass
+            copy_file(source, dest, stats=stats)
+            copied += 1
+    return linked, copied
+
+
+def _is_unchanged(source, previous):
+    """
+    Check if a file matches its copy in the previous snapshot by size and modification time.
+    Args:
+        source (Path): The current file.
+        previous (Path): The file in the previous snapshot.
+    Returns:
+        bool: True if both files have the same size and modification time, False otherwise.
+    """
+    try:
+        source_stat = source.stat()
+        previous_stat = previous.stat()
+    except OSError:
+        return False
+    return source_stat.st_size == previous_stat.st_size and source_stat.st_mtime_ns == previous_stat.st_mtime_ns
+
+
+def link_or_copy(source, dest, stats=None):
+    """
+    Hard-link a file if it is never modified in place, otherwise copy it (with a reflink where possible).
+    Whether the file is immutable is decided by the destination's name, so blobs stored without one can be linked too.
+    Args:
+        source (str | Path): The file to link or copy.
+        dest (str | Path): The new file, must not exist yet.
+        stats (Counter | None): If given, incremented with "hardlink" or the copy strategy that was used.
+    Returns:
+        str: "hardlink" or the copy strategy that was used.
+    """
+    if Path(dest).suffix in IMMUTABLE_SUFFIXES:
+        try:
+            os.link(source, dest)
+            if stats is not None:
+                stats[HARDLINK] += 1
+            return HARDLINK
+        except OSError:
+            # Fall back to copying (eg. across filesystems or the link count limit was hit)
+            pass
+    return copy_file(source, dest, stats=stats)
+
+
+def link_or_copy_tree(source_dir, dest_dir, stats=None):
+    """
+    Recreate a directory tree, hard-linking files that are never modified in place and copying the rest.
+    Args:
+        source_dir (str | Path): The directory to recreate.
+        dest_dir (str | Path): The new directory, must not exist yet.
+        stats (Counter | None): If given, incremented with "hardlink" or the copy strategy used for each file.
+    """
+    source_dir = Path(source_dir)
+    dest_dir = Path(dest_dir)
+    dest_dir.mkdir(parents=True)
+    for root, dirs, files in os.walk(source_dir):
+        relative_root = Path(root).relative_to(source_dir)
+        for name in dirs:
+            (dest_dir / relative_root / name).mkdir()
+        for name in files:
+            link_or_copy(Path(root) / name, dest_dir / relative_root / name, stats)
@@ -0,0 +1,281 @@
+import json
+import os
+import re
+import struct
+import zlib
+from datetime import date, datetime, time
+from pathlib import Path
+
+
+# Constants
+LOG_FILE_PATTERN = re.compile(r"log_(?P<date>\d{4}-\d{2}-\d{2})\.(?P<suffix>txt|logz)")
+TEXT_SUFFIX = ".txt"
+ARCHIVE_SUFFIX = ".logz"
+ARCHIVE_MAGIC = b"BSLOGZ1\n"
+ARCHIVE_VERSION = 1
+# Trailer at the very end of an archive: offset and length of the compressed index, then a marker
+FOOTER = struct.Struct("<QI4s")
+FOOTER_MAGIC = b"LOGI"
+BLOCK_SIZE = 256 * 1024         # 256KB (in binary) of log text per compressed block
+COMPRESSION_LEVEL = 9
+ENCODING = "utf-8"
+# Logger lines start with a timestamp in the format YYYY-MM-DD HH:MM:SS:MMM
+TIMESTAMP_LENGTH = 23
+TIMESTAMP_PATTERN = re.compile(rb"\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}:\d{3}")
+TIMESTAMP_TEXT_PATTERN = re.compile(TIMESTAMP_PATTERN.pattern.decode("ascii"))
+# Formats accepted by parse_log_time, dates without a time cover the whole day
+TIME_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d")
+# Pattern syntax that can match a single line but not the same line inside a block of lines
+LINE_ONLY_SYNTAX = (r"\A", r"\Z", "(?=", "(?!", "(?<")
+
+
+def parse_log_time(text, end_of_range=False):
+    """
+    Parse a time given to a log search.
+    Args:
+        text (str): "now", "today", "YYYY-MM-DD", "YYYY-MM-DDTHH:MM[:SS]", or "HH:MM[:SS]" for today.
+        end_of_range (bool): If True, a date without a time means the end of that day instead of the start.
+    Returns:
+        datetime: The parsed time.
+    Raises:
+        ValueError: If the text is not in a supported format.
+    """
+    text = text.strip().lower()
+    if text == "now":
+        return datetime.now()
+    if text == "today":
+        text = date.today().isoformat()
+    # Times without a date are today
+    if re.fullmatch(r"\d{1,2}:\d{2}(:\d{2})?", text):
+        text = f"{date.today().isoformat()} {text}"
+    text = text.replace("t", " ")
+    for time_format in TIME_FORMATS:
+        try:
+            parsed = datetime.strptime(text, time_format)
+        except ValueError:
+            continue
+        if time_format == "%Y-%m-%d" and end_of_range:
+            parsed = datetime.combine(parsed.date(), time.max)
+        return parsed
+    raise ValueError(f"{text}: invalid time, expected YYYY-MM-DD, YYYY-MM-DDTHH:MM[:SS], HH:MM[:SS], today or now")
+
+
+class LogArchive:
+    """
+    Block-compressed archive of past days' logs with a sparse time index.
+    Each day's log_YYYY-MM-DD.txt is compressed into log_YYYY-MM-DD.logz, made of zlib blocks of whole lines followed by
+    an index of the first and last timestamp of every block. Searches only read and decompress the blocks overlapping
+    the requested time range, and only open the files of the days in that range.
+    """
+
+    def __init__(self, log_dir):
+        """
+        Initialize the archive for a log folder.
+        Args:
+            log_dir (str | Path): The folder BufferedDailyLogger writes its daily log files to.
+        """
+        self.log_dir = Path(log_dir)
+
+
+    def _day_files(self):
+        """
+        Find the log file of every day, preferring the archive if both exist.
+        Returns:
+            dict: Mapping of date to the path of that day's archive or text log.
+        """
+        files = {}
+        for path in self.log_dir.iterdir():
+            match = LOG_FILE_PATTERN.fullmatch(path.name)
+            if not match:
+                continue
+            day = date.fromisoformat(match.group("date"))
+            if day not in files or path.suffix == ARCHIVE_SUFFIX:
+                files[day] = path
+        return files
+
+
+    def archive_day(self, text_path):
+        """
+        Compress a day's text log into an archive, then delete the text log.
+        Args:
+            text_path (Path): The log_YYYY-MM-DD.txt file to archive.
+        Returns:
+            tuple[int, int]: The size of the text log and the size of the archive in bytes.
+        """
+        text_path = Path(text_path)
+        archive_path = text_path.with_suffix(ARCHIVE_SUFFIX)
+        # Lines before the first timestamp (there should be none) are placed at the start of the day
+        day_start = f"{LOG_FILE_PATTERN.fullmatch(text_path.name).group('date')} 00:00:00:000"
+        # Write to a temporary name first so an interrupted archive never replaces anything
+        temp_path = archive_path.with_name(f".tmp_{archive_path.name}")
+        blocks = []
+        with open(text_path, "rb") as source, open(temp_path, "wb") as archive:
+            archive.write(ARCHIVE_MAGIC)
+            lines = []
+            size = 0
+            current = day_start
+            first = None
+            for line in source:
+                # Lines without a timestamp (eg. multi-line messages) belong to the last timestamp seen
+                if TIMESTAMP_PATTERN.match(line):
+                    current = line[:TIMESTAMP_LENGTH].decode("ascii")
+                if first is None:
+                    first = current
+                lines.append(line)
+                size += len(line)
+                if size >= BLOCK_SIZE:
+                    blocks.append(self._write_block(archive, lines, first, current))
+                    lines, size, first = [], 0, None
+            if lines:
+                blocks.append(self._write_block(archive, lines, first, current))
+            # The index goes after the blocks so the archive is written in a single pass
+            index = zlib.compress(json.dumps({"version": ARCHIVE_VERSION, "blocks": blocks}).encode(ENCODING), COMPRESSION_LEVEL)
+            index_offset = archive.tell()
+            archive.write(index)
+            archive.write(FOOTER.pack(index_offset, len(index), FOOTER_MAGIC))
+            archive.flush()
+            os.fsync(archive.fileno())
+            archive_size = archive.tell()
+        text_size = text_path.stat().st_size
+        os.replace(temp_path, archive_path)
+        text_path.unlink()
+        return text_size, archive_size
+
+
+    @staticmethod
+    def _write_block(archive, lines, first, last):
+        """
+        Compress and write one block of lines.
+        Returns:
+            list: The block's index entry, [first timestamp, last timestamp, offset, compressed length, line count].
+        """
+        data = zlib.compress(b"".join(lines), COMPRESSION_LEVEL)
+        offset = archive.tell()
+        archive.write(data)
+        return [first, last, offset, len(data), len(lines)]
+
+
+    def archive_past_days(self, current_log_path=None):
+        """
+        Archive the text logs of every day before today.
+        Args:
+            current_log_path (str | Path | None): The file the logger is writing to, never archived even if its day has passed.
+        Returns:
+            tuple[int, int, int]: The number of files archived, their total size, and the total size of the archives in bytes.
+        """
+        today = date.today()
+        current_log_path = Path(current_log_path) if current_log_path is not None else None
+        archived = 0
+        text_bytes = 0
+        archive_bytes = 0
+        for text_path in sorted(self.log_dir.glob(f"log_*{TEXT_SUFFIX}")):
+            match = LOG_FILE_PATTERN.fullmatch(text_path.name)
+            if not match or date.fromisoformat(match.group("date")) >= today or text_path == current_log_path:
+                continue
+            # If an earlier run was interrupted after writing the archive, archiving again simply replaces it
+            text_size, archive_size = self.archive_day(text_path)
+            archived += 1
+            text_bytes += text_size
+            archive_bytes += archive_size
+        return archived, text_bytes, archive_bytes
+
+
+    def _read_index(self, archive):
+        """
+        Read the block index of an open archive.
+        Args:
+            archive (BinaryIO): The archive opened in binary mode.
+        Returns:
+            list[list]: The index entries of every block.
+        Raises:
+            ValueError: If the file is not a valid archive.
+        """
+        if archive.read(len(ARCHIVE_MAGIC)) != ARCHIVE_MAGIC:
+            raise ValueError(f"{archive.name}: not a log archive")
+        archive.seek(-FOOTER.size, os.SEEK_END)
+        index_offset, index_length, magic = FOOTER.unpack(archive.read(FOOTER.size))
+        if magic != FOOTER_MAGIC:
+            raise ValueError(f"{archive.name}: log archive is truncated")
+        archive.seek(index_offset)
+        index = json.loads(zlib.decompress(archive.read(index_length)))
+        if index.get("version") != ARCHIVE_VERSION:
+            raise ValueError(f"{archive.name}: unsupported log archive version {index.get('version')}")
+        return index["blocks"]
+
+
+    @staticmethod
+    def _filter(lines, current, start_text, end_text, pattern):
+        """
+        Yield the lines within the time range that match the pattern.
+        Args:
+            lines (Iterable[str]): The lines to filter.
+            current (str): The timestamp that lines without one belong to until a timestamped line is seen.
+            start_text (str): The start of the range as a timestamp string.
+            end_text (str): The end of the range as a timestamp string.
+            pattern (re.Pattern | None): If given, only lines containing a match are yielded.
+        """
+        for line in lines:
+            if TIMESTAMP_TEXT_PATTERN.match(line):
+                current = line[:TIMESTAMP_LENGTH]
+            # Keep going past the end of the range, the clock may have been set back later in the file
+            if current < start_text or current > end_text:
+                continue
+            if pattern is None or pattern.search(line):
+                yield line
+
+
+    @staticmethod
+    def _block_pattern(pattern):
+        """
+        Make a copy of a line pattern that can be searched for in a whole block of lines at once.
+        Args:
+            pattern (re.Pattern): The pattern lines are matched against.
+        Returns:
+            re.Pattern | None: The pattern with ^ and $ matching at every line, or None if it cannot rule out a block
+                (it anchors to the start or end of the text, or uses lookarounds that would see the neighbouring lines).
+        """
+        if any(syntax in pattern.pattern for syntax in LINE_ONLY_SYNTAX):
+            return None
+        return re.compile(pattern.pattern, pattern.flags | re.MULTILINE)
+
+
+    def search(self, start, end, pattern=None):
+        """
+        Find the log lines between two times, oldest first.
+        Archived blocks are skipped by their first and last timestamps, which assumes the log's timestamps increase,
+        so a block written after the clock was set back can be missed.
+        Args:
+            start (datetime): The start of the range (inclusive).
+            end (datetime): The end of the range (inclusive).
+            pattern (re.Pattern | None): If given, only lines containing a match are returned.
+        Yields:
+            str: The matching lines, without line endings.
+        """
+        start_text = start.strftime("%Y-%m-%d %H:%M:%S:") + f"{start.microsecond // 1000:03d}"
+        end_text = end.strftime("%Y-%m-%d %H:%M:%S:") + f"{end.microsecond // 1000:03d}"
+        block_pattern = self._block_pattern(pattern) if pattern is not None else None
+        files = self._day_files()
+        for day in sorted(day for day in files if start.date() <= day <= end.date()):
+            path = files[day]
+            day_start = f"{day.isoformat()} 00:00:00:000"
+            if path.suffix == ARCHIVE_SUFFIX:
+                with open(path, "rb") as archive:
+                    for first, last, offset, length, _ in self._read_index(archive):
+                        # Skip blocks entirely outside the range without reading them
+                        if last < start_text or first > end_text:
+                            continue
+                        archive.seek(offset)
+                        text = zlib.decompress(archive.read(length)).decode(ENCODING, errors="replace")
+                        # One search over the whole block rules out most blocks for a rare pattern
+                        if block_pattern is not None and not block_pattern.search(text):
+                            continue
+                        lines = text.removesuffix("\n").split("\n")
+                        # Blocks entirely inside the range need no per-line timestamp checks
+                        if start_text <= first and last <= end_text:
+                            yield from (lines if pattern is None else (line for line in lines if pattern.search(line)))
+                        else:
+                            yield from self._filter(lines, first, start_text, end_text, pattern)
+            else:
+                # Today's log (or one not archived yet) is searched as plain text
+                with open(path, "r", encoding=ENCODING, errors="replace") as f:
+                    yield from self._filter((line.rstrip("\n") for line in f), day_start, start_text, end_text, pattern)
@@ -0,0 +1,126 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .file_copy import set_copy_limiter
+from .thread_priority import lower_thread_priority, set_thread_io_priority
+
+
+# Constants
+BUCKET_SECONDS = 1      # How many seconds of the rate a token bucket can save up, the largest burst it allows
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket that holds a shared rate, eg. the bytes per second copied by every maintenance worker together.
+    Tokens are added continuously at the rate up to a burst limit, and consume() waits until there are enough.
+    """
+
+    def __init__(self, rate, burst=None):
+        """
+        Initialize a full bucket.
+        Args:
+            rate (float): Tokens added per second.
+            burst (float | None): The most tokens the bucket holds, defaults to BUCKET_SECONDS of the rate.
+        """
+        self.rate = rate
+        self.burst = burst if burst is not None else rate * BUCKET_SECONDS
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+
+    def consume(self, amount):
+        """
+        Take tokens from the bucket, waiting until they have been added if there are not enough.
+        Amounts larger than the burst are allowed, the bucket goes into debt and later callers wait for it to refill.
+        Args:
+            amount (float): The number of tokens to take.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Reserve the tokens now, so callers waiting at the same time are served in order
+            self._tokens -= amount
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+
+class MaintenanceWorkers:
+    """
+    Worker threads for maintenance work that runs beside the server (copying, compressing, pruning, staging updates).
+    The threads run at a lowered I/O and CPU priority, optionally away from the CPUs the server is pinned to, and their
+    copies share a token bucket rate limit. Processes they start (eg. compression workers) inherit the priority and CPUs.
+    The server must never be started from a worker, as it would inherit them too.
+    """
+
+    def __init__(self, workers, priority="normal", cpus=None, copy_limit=0):
+        """
+        Initialize the workers, the threads are started when the first work is run.
+        Args:
+            workers (int): The number of threads.
+            priority (str): The priority of the threads, see lower_thread_priority.
+            cpus (set[int] | None): The CPUs the threads are restricted to, or None for every CPU.
+            copy_limit (int): The bytes per second the workers may copy together, 0 for no limit.
+        """
+        self.priority = priority
+        self.cpus = cpus
+        self.limiter = TokenBucket(copy_limit) if copy_limit else None
+        self._local = threading.local()
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="maintenance", initializer=self._initialize)
+
+
+    def _initialize(self):
+        """Set up each worker thread when it starts."""
+        lower_thread_priority(self.priority, self.cpus)
+        set_copy_limiter(self.limiter)
+        self._local.worker = True
+
+
+    def run(self, function, *args, **kwargs):
+        """
+        Run a function on a worker and wait for it, so the caller keeps its normal priority.
+        Args:
+            function (func): The function to run, it must not start the server or take the runner's lock.
+            *args: Positional arguments for the function.
+            **kwargs: Keyword arguments for the function.
+        Returns:
+            Any: What the function returns.
+        Raises:
+            Exception: Whatever the function raises.
+        """
+        # Already on a worker, so waiting for another one could deadlock
+        if getattr(self._local, "worker", False):
+            return function(*args, **kwargs)
+        return self._pool.submit(function, *args, **kwargs).result()
+
+
+    def run_urgent(self, function, *args, **kwargs):
+        """
+        Run work the server is waiting on (eg. copies made while its saves are held) on a worker and wait for it.
+        An idle disk priority is raised to the lowest best-effort one while it runs, so it cannot be starved by the server.
+        This only changes anything when maintenance_priority is "idle": "low" already uses the lowest best-effort disk
+        priority, and "normal" (the default) leaves the workers at the server's priority, so the work runs as with run().
+        Args:
+            function (func): The function to run, it must not start the server or take the runner's lock.
+            *args: Positional arguments for the function.
+            **kwargs: Keyword arguments for the function.
+        Returns:
+            Any: What the function returns.
+        Raises:
+            Exception: Whatever the function raises.
+        """
+        if self.priority != "idle":
+            return self.run(function, *args, **kwargs)
+        return self.run(self._run_best_effort, function, args, kwargs)
+
+
+    @staticmethod
+    def _run_best_effort(function, args, kwargs):
+        """Run a function with the calling worker at the lowest best-effort disk priority, then return it to idle."""
+        set_thread_io_priority("best-effort")
+        try:
+            return function(*args, **kwargs)
+        finally:
+            set_thread_io_priority("idle")
@@ -0,0 +1,369 @@
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter
+
+
+# Constants
+# Default histogram buckets in seconds, from sub-millisecond dispatches to multi-minute backups
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+METRICS_PATH = "/metrics"
+
+
+def _format_value(value):
+    """Format a sample value the way Prometheus expects."""
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _escape_label(value):
+    """Escape a label value for the text format."""
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    """Format a label dictionary as {name="value",...}, or "" if there are none."""
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in labels.items()) + "}"
+
+
+class _Shards:
+    """
+    Per-thread cells of numbers that only their own thread writes to, summed when scraped.
+    Updating a cell needs no lock, a lock is only taken the first time a thread updates the metric.
+    """
+    def __init__(self, size):
+        """
+        Initialize the shards.
+        Args:
+            size (int): The number of values in each thread's cell.
+        """
+        self.size = size
+        self._local = threading.local()
+        self._cells = []
+        self._lock = threading.Lock()
+
+    def cell(self):
+        """Get the calling thread's cell, creating it on first use."""
+        try:
+            return self._local.cell
+        except AttributeError:
+            cell = [0] * self.size
+            with self._lock:
+                self._cells.append(cell)
+            self._local.cell = cell
+            return cell
+
+    def totals(self):
+        """Sum every thread's cell, the cells of threads that have exited are kept so totals never go backwards."""
+        with self._lock:
+            cells = list(self._cells)
+        return [sum(values) for values in zip(*cells)] if cells else [0] * self.size
+
+
+class _Metric:
+    """Base class of the metric types, a metric with label names is a family of children, one per label value combination."""
+    TYPE = ""
+
+    def __init__(self, name, description, labelnames=(), labels=None):
+        """
+        Initialize the metric.
+        Args:
+            name (str): The metric name.
+            description (str): The help text.
+            labelnames (tuple[str]): The label names of the family, empty for a single metric.
+            labels (dict | None): The label values of a child, set by labels().
+        """
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._labels = labels or {}
+        self._children = {}
+        self._children_lock = threading.Lock()
+        self._function = None
+
+    def labels(self, *values):
+        """
+        Get the child metric for the given label values, creating it on first use.
+        Args:
+            *values (str): One value per label name, in order.
+        Returns:
+            _Metric: The child metric.
+        Raises:
+            ValueError: If the number of values does not match the label names.
+        """
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name}: expected {len(self.labelnames)} label values, got {len(values)}")
+        child = self._children.get(values)
+        if child is None:
+            with self._children_lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._new_child(dict(zip(self.labelnames, values)))
+                    self._children[values] = child
+        return child
+
+    def _new_child(self, labels):
+        """Create a child of the same type with the given label values."""
+        return type(self)(self.name, self.description, labels=labels)
+
+    def set_function(self, function):
+        """
+        Compute the value when scraped instead of tracking it, eg. for values read from /proc.
+        Args:
+            function (func): Called with no arguments, returns the value or None to leave the sample out.
+        """
+        self._function = function
+
+    def _samples(self):
+        """
+        Get the metric's samples.
+        Returns:
+            list[tuple[str, dict, float]]: Sample name suffix, labels and value.
+        """
+        raise NotImplementedError
+
+    def collect(self):
+        """
+        Get the samples of the metric or of every child of the family.
+        Returns:
+            list[tuple[str, dict, float]]: Sample name suffix, labels and value.
+        """
+        if self.labelnames:
+            with self._children_lock:
+                children = list(self._children.values())
+            return [sample for child in children for sample in child._samples()]
+        return self._samples()
+
+
+class Counter(_Metric):
+    """A value that only goes up, eg. lines read or bytes written. inc() is lock-free."""
+    TYPE = "counter"
+
+    def __init__(self, name, description, labelnames=(), labels=None):
+        super().__init__(name, description, labelnames, labels)
+        self._shards = _Shards(1)
+
+    def inc(self, amount=1):
+        """
+        Increase the counter.
+        Args:
+            amount (float): The amount to add, must not be negative.
+        """
+        self._shards.cell()[0] += amount
+
+    def _samples(self):
+        if self._function is not None:
+            value = self._function()
+            return [] if value is None else [("", self._labels, value)]
+        return [("", self._labels, self._shards.totals()[0])]
+
+
+class Gauge(_Metric):
+    """A value that goes up and down, eg. a queue depth or memory use."""
+    TYPE = "gauge"
+
+    def __init__(self, name, description, labelnames=(), labels=None):
+        super().__init__(name, description, labelnames, labels)
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        """Set the gauge to a value."""
+        self._value = value
+
+    def inc(self, amount=1):
+        """Increase the gauge."""
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1):
+        """Decrease the gauge."""
+        with self._lock:
+            self._value -= amount
+
+    def _samples(self):
+        if self._function is not None:
+            value = self._function()
+            return [] if value is None else [("", self._labels, value)]
+        return [("", self._labels, self._value)]
+
+
+class Histogram(_Metric):
+    """Counts observations in buckets, eg. durations. observe() is lock-free."""
+    TYPE = "histogram"
+
+    def __init__(self, name, description, labelnames=(), labels=None, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, description, labelnames, labels)
+        self.buckets = tuple(sorted(buckets))
+        # One count per bucket, then one for +Inf, then the sum and the count of observations
+        self._shards = _Shards(len(self.buckets) + 3)
+
+    def _new_child(self, labels):
+        return Histogram(self.name, self.description, labels=labels, buckets=self.buckets)
+
+    def observe(self, value):
+        """
+        Record an observation.
+        Args:
+            value (float): The observed value.
+        """
+        cell = self._shards.cell()
+        cell[bisect_left(self.buckets, value)] += 1
+        cell[-2] += value
+        cell[-1] += 1
+
+    @contextmanager
+    def time(self):
+        """Context manager observing how many seconds its block took."""
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(perf_counter() - start)
+
+    def _samples(self):
+        totals = self._shards.totals()
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), totals):
+            cumulative += count
+            samples.append(("_bucket", {**self._labels, "le": _format_value(float(bound))}, cumulative))
+        samples.append(("_sum", self._labels, totals[-2]))
+        samples.append(("_count", self._labels, totals[-1]))
+        return samples
+
+
+class MetricsRegistry:
+    """Holds the metrics of the application and renders them in the Prometheus text format."""
+    def __init__(self):
+        """Initialize an empty registry."""
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric_type, name, description, labelnames, **options):
+        """Get the metric with this name, creating it if it does not exist yet, so modules can declare metrics independently."""
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = metric_type(name, description, labelnames, **options)
+                self._metrics[name] = metric
+            elif not isinstance(metric, metric_type):
+                raise ValueError(f"{name}: already registered as a {metric.TYPE}")
+            return metric
+
+    def counter(self, name, description, labelnames=()):
+        """
+        Get or create a counter.
+        Args:
+            name (str): The metric name, by convention ending in _total.
+            description (str): The help text.
+            labelnames (tuple[str]): The label names, if the counter is a family.
+        Returns:
+            Counter: The counter.
+        """
+        return self._register(Counter, name, description, labelnames)
+
+    def gauge(self, name, description, labelnames=()):
+        """
+        Get or create a gauge.
+        Args:
+            name (str): The metric name.
+            description (str): The help text.
+            labelnames (tuple[str]): The label names, if the gauge is a family.
+        Returns:
+            Gauge: The gauge.
+        """
+        return self._register(Gauge, name, description, labelnames)
+
+    def histogram(self, name, description, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """
+        Get or create a histogram.
+        Args:
+            name (str): The metric name.
+            description (str): The help text.
+            labelnames (tuple[str]): The label names, if the histogram is a family.
+            buckets (tuple[float]): The upper bounds of the buckets.
+        Returns:
+            Histogram: The histogram.
+        """
+        return self._register(Histogram, name, description, labelnames, buckets=buckets)
+
+    def render(self):
+        """
+        Render every metric in the Prometheus text exposition format.
+        Returns:
+            str: The exposition text.
+        """
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.TYPE}")
+            for suffix, labels, value in metric.collect():
+                lines.append(f"{metric.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# The registry all of the application's metrics are declared in
+REGISTRY = MetricsRegistry()
+
+
+class MetricsServer:
+    """Serves a registry over HTTP at /metrics for Prometheus to scrape."""
+    def __init__(self, port, host="127.0.0.1", registry=REGISTRY):
+        """
+        Initialize the server, it does not listen until started.
+        Args:
+            port (int): The port to listen on.
+            host (str): The address to listen on, local only by default.
+            registry (MetricsRegistry): The registry to serve.
+        """
+        self.port = port
+        self.host = host
+        self.registry = registry
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        """
+        Start listening on a background thread.
+        Raises:
+            OSError: If the port cannot be bound.
+        """
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != METRICS_PATH:
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # Scrapes are frequent, keep them out of the console
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop listening."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,213 @@
+import multiprocessing
+import os
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+
+# Constants
+CHUNK_SIZE = 1024 * 1024                # 1MB (in binary), the unit of work handed to each compression worker
+DICTIONARY_SIZE = 32 * 1024             # Deflate window size, each chunk is primed with the tail of the previous one
+PENDING_CHUNKS_PER_WORKER = 4           # Bounds memory use to roughly workers * 4 * CHUNK_SIZE
+STORED_SUFFIXES = {".ldb"}              # LevelDB tables are already compressed, deflating them again only burns CPU
+# Compression processes are never forked straight from the manager, which has many threads that may hold locks (logger,
+# metrics, broadcaster queues) at the moment of the fork; a forkserver forks them from a clean single-threaded process
+START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def _deflate_chunk(data, level, dictionary, last):
+    """
+    Compress one chunk of a member into raw deflate data. Run in a worker process.
+    Non-final chunks end with a sync flush so the outputs of all chunks can be concatenated into one deflate stream.
+    Args:
+        data (bytes): The chunk to compress.
+        level (int): The zlib compression level.
+        dictionary (bytes): The tail of the previous chunk, used to keep the compression ratio close to a single stream.
+        last (bool): Whether this is the final chunk of the member.
+    Returns:
+        bytes: The raw deflate data for the chunk.
+    """
+    if dictionary:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=dictionary)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+class ParallelZipWriter:
+    """
+    Writes a standard zip archive while deflating members on several cores.
+    Members are split into chunks that are compressed in a process pool and written back in order, so the
+    result can be read by zipfile, shutil.unpack_archive, or any other zip tool.
+    """
+
+    def __init__(self, archive_path, workers=1, level=zlib.Z_DEFAULT_COMPRESSION):
+        """
+        Create the archive file.
+        Args:
+            archive_path (str | Path): The path of the zip file to create.
+            workers (int): The number of compression processes, 1 compresses in the calling thread.
+            level (int): The zlib compression level (0-9).
+        """
+        self.level = level
+        self._file = open(archive_path, "wb")
+        self._zip = zipfile.ZipFile(self._file, "w")
+        self._pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(START_METHOD)) if workers > 1 else None
+        self._max_pending = max(workers, 1) * PENDING_CHUNKS_PER_WORKER
+        # Ordered queue of pending write actions, each either ("header", zinfo), ("data", bytes | Future) or ("end", zinfo)
+        self._pending = deque()
+        self._pending_chunks = 0
+        # State of the member currently being written, members are always written one at a time in order
+        self._member_zip64 = False
+        self._member_compress_size = 0
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+    def add_directory(self, source, arcname):
+        """
+        Add a directory entry to the archive.
+        Args:
+            source (str | Path): The directory on disk, used for its timestamp and permissions.
+            arcname (str): The name of the directory inside the archive.
+        """
+        zinfo = zipfile.ZipInfo.from_file(source, arcname)
+        zinfo.CRC = 0
+        # Directory entries are written immediately, so everything queued before it has to be written first
+        self._drain(0)
+        self._zip.mkdir(zinfo)
+
+
+    def add_file(self, source, arcname, size=None):
+        """
+        Add a file to the archive, compressing it in the pool unless it is already compressed.
+        Args:
+            source (str | Path): The file on disk.
+            arcname (str): The name of the file inside the archive.
+            size (int | None): The number of bytes to read from the start of the file, or None for the whole file.
+        """
+        zinfo = zipfile.ZipInfo.from_file(source, arcname)
+        if size is not None:
+            zinfo.file_size = size
+        stored = Path(source).suffix in STORED_SUFFIXES or self.level == 0
+        zinfo.compress_type = zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED
+        zinfo.CRC = 0
+        zinfo.compress_size = 0
+        self._pending.append(("header", zinfo))
+
+        crc = 0
+        remaining = zinfo.file_size
+        dictionary = b""
+        with open(source, "rb") as f:
+            while True:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                remaining -= len(chunk)
+                # A file that shrank while being read is archived with what was read
+                last = remaining <= 0 or len(chunk) == 0
+                crc = zlib.crc32(chunk, crc)
+                if stored:
+                    self._pending.append(("data", chunk))
+                elif self._pool is not None:
+                    self._pending.append(("data", self._pool.submit(_deflate_chunk, chunk, self.level, dictionary, last)))
+                else:
+                    self._pending.append(("data", _deflate_chunk(chunk, self.level, dictionary, last)))
+                dictionary = chunk[-DICTIONARY_SIZE:]
+                self._pending_chunks += 1
+                self._drain(self._max_pending)
+                if last:
+                    break
+
+        zinfo.CRC = crc
+        zinfo.file_size = zinfo.file_size - max(remaining, 0)
+        self._pending.append(("end", zinfo))
+
+
+    def _drain(self, max_pending):
+        """
+        Write queued actions in order until at most 'max_pending' chunks are still queued.
+        Args:
+            max_pending (int): The number of queued chunks to leave in the queue.
+        """
+        while self._pending and (self._pending_chunks > max_pending or self._pending[0][0] != "data"):
+            action, value = self._pending.popleft()
+            if action == "header":
+                # Reserve a zip64 header if the member might need one, the header is rewritten once the sizes are known
+                value.header_offset = self._file.tell()
+                self._member_zip64 = value.file_size > zipfile.ZIP64_LIMIT * 0.9
+                self._member_compress_size = 0
+                self._file.write(value.FileHeader(self._member_zip64))
+            elif action == "data":
+                data = value if isinstance(value, bytes) else value.result()
+                self._file.write(data)
+                self._member_compress_size += len(data)
+                self._pending_chunks -= 1
+            else:
+                # Go back and write the final header now the CRC and compressed size are known
+                value.compress_size = self._member_compress_size
+                end = self._file.tell()
+                self._file.seek(value.header_offset)
+                self._file.write(value.FileHeader(self._member_zip64))
+                self._file.seek(end)
+                self._zip.filelist.append(value)
+                self._zip.NameToInfo[value.filename] = value
+                self._zip.start_dir = end
+
+
+    def close(self):
+        """Write all queued members and the central directory, then close the archive."""
+        try:
+            self._drain(0)
+            self._zip.close()
+        finally:
+            self._file.close()
+            if self._pool is not None:
+                self._pool.shutdown()
+
+
+    def abort(self):
+        """Close the archive without finishing it. The caller is responsible for deleting the incomplete file."""
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+        self._file.close()
+
+
+def make_zip_archive(base_name, root_dir, base_dir, workers=1, level=zlib.Z_DEFAULT_COMPRESSION):
+    """
+    Drop-in replacement for shutil.make_archive(base_name, 'zip', root_dir, base_dir) that compresses in parallel.
+    Args:
+        base_name (str | Path): The path of the archive to create, without the .zip suffix.
+        root_dir (str | Path): The directory that archive names are relative to.
+        base_dir (str): The directory inside root_dir to archive.
+        workers (int): The number of compression processes.
+        level (int): The zlib compression level (0-9).
+    Returns:
+        str: The path of the created archive.
+    Raises:
+        OSError: If the archive cannot be written, the incomplete archive is removed.
+    """
+    archive_path = str(base_name) + ".zip"
+    root_dir = Path(root_dir)
+    try:
+        with ParallelZipWriter(archive_path, workers, level) as writer:
+            writer.add_directory(root_dir / base_dir, base_dir)
+            for dirpath, dirnames, filenames in os.walk(root_dir / base_dir):
+                relative_dir = Path(dirpath).relative_to(root_dir)
+                for name in sorted(dirnames):
+                    writer.add_directory(Path(dirpath) / name, (relative_dir / name).as_posix())
+                for name in filenames:
+                    writer.add_file(Path(dirpath) / name, (relative_dir / name).as_posix())
+    except BaseException:
+        Path(archive_path).unlink(missing_ok=True)
+        raise
+    return archive_path
@@ -0,0 +1,51 @@
+import io
+import os
+
+
+# Constants
+READ_CHUNK_SIZE = 64 * 1024     # 64KB (in binary), the size of a pipe buffer on Linux
+ENCODING = "utf-8"
+
+
+def read_line_batches(fd, chunk_size=READ_CHUNK_SIZE):
+    """
+    Read a binary pipe in large chunks and yield the complete lines in each chunk.
+    Lines are decoded with invalid bytes replaced and stripped of trailing whitespace (including '\\r').
+    Args:
+        fd (int): The file descriptor of the pipe to read.
+        chunk_size (int): The maximum number of bytes to read per call.
+    Yields:
+        list[str]: The lines completed by each read, a partial last line is held back until its newline arrives.
+    """
+    pending = b""
+    while True:
+        data = os.read(fd, chunk_size)
+        # End of file, flush whatever is left without a trailing newline
+        if not data:
+            if pending:
+                yield [pending.decode(ENCODING, errors="replace").rstrip()]
+            return
+        data = pending + data
+        end = data.rfind(b"\n")
+        if end == -1:
+            pending = data
+            continue
+        pending = data[end + 1:]
+        # Decode all complete lines in one call, then split them
+        yield [line.rstrip() for line in data[:end].decode(ENCODING, errors="replace").split("\n")]
+
+
+def read_lines(stream):
+    """
+    Read a binary stream one line at a time, yielding single-line batches with the same decoding as read_line_batches.
+    An unbuffered stream (eg. a pipe opened with bufsize=0) is wrapped in a buffer first, otherwise every line would be
+    read one byte per system call. A buffered read still returns as soon as any output is available.
+    Args:
+        stream (BinaryIO): The stream to read, closing the buffer closes it.
+    Yields:
+        list[str]: A list holding one line.
+    """
+    if isinstance(stream, io.RawIOBase):
+        stream = io.BufferedReader(stream, READ_CHUNK_SIZE)
+    for raw_line in stream:
+        yield [raw_line.decode(ENCODING, errors="replace").rstrip()]
@@ -0,0 +1,204 @@
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+
+
+# Constants
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100  # Units of the CPU times in /proc/<pid>/stat
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096  # Unit of the resident set size in /proc/<pid>/stat
+
+
+@dataclass
+class ProcessStats:
+    """
+    Dataclass holding a snapshot of a process's resource use.
+    Attributes:
+        cpu_seconds (float): User and system CPU time used so far.
+        rss_bytes (int): Resident memory.
+    """
+    cpu_seconds: float
+    rss_bytes: int
+
+
+def read_process_stats(pid):
+    """
+    Read a process's CPU time and memory from /proc (Linux only).
+    Args:
+        pid (int): The process ID.
+    Returns:
+        ProcessStats | None: The snapshot, or None if /proc is unavailable or the process has exited.
+    """
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    # The command name can contain spaces and parentheses, the other fields start after its closing parenthesis
+    fields = data[data.rfind(b")") + 2:].split()
+    utime, stime, rss_pages = int(fields[11]), int(fields[12]), int(fields[21])
+    return ProcessStats((utime + stime) / CLOCK_TICKS, rss_pages * PAGE_SIZE)
+
+
+@dataclass
+class ProcessSample:
+    """
+    Dataclass holding one sample of a process's resource use, as collected by ProcessSampler.
+    Attributes:
+        time (float): The unix timestamp of the sample.
+        pid (int): The process sampled.
+        cpu_seconds (float): User and system CPU time used so far.
+        cpu_percent (float | None): CPU use since the previous sample in percent of one core, None for the first sample.
+        rss_bytes (int): Resident memory.
+        peak_rss_bytes (int | None): The highest resident memory so far, None if /proc/<pid>/status could not be read.
+        read_bytes (int | None): Bytes read from storage so far, None if /proc/<pid>/io could not be read.
+        write_bytes (int | None): Bytes written to storage so far, None if /proc/<pid>/io could not be read.
+        threads (int): The number of threads.
+        open_files (int | None): The number of open file descriptors, None if /proc/<pid>/fd could not be listed.
+    """
+    time: float
+    pid: int
+    cpu_seconds: float
+    cpu_percent: float | None
+    rss_bytes: int
+    peak_rss_bytes: int | None
+    read_bytes: int | None
+    write_bytes: int | None
+    threads: int
+    open_files: int | None
+
+
+def _read_key_values(path, separator):
+    """Read a /proc file of "key<separator> value" lines into a dict, or None if it cannot be read."""
+    try:
+        with open(path, "r") as f:
+            return dict(line.split(separator, 1) for line in f if separator in line)
+    except OSError:
+        return None
+
+
+def read_process_sample(pid, previous=None):
+    """
+    Read a full sample of a process's resource use from /proc/<pid>/stat, status, io and fd (Linux only).
+    Args:
+        pid (int): The process ID.
+        previous (tuple[float, float] | None): The (cpu_seconds, monotonic time) of the previous sample of the same
+            process, used to compute the CPU use.
+    Returns:
+        tuple[ProcessSample, tuple[float, float]] | None: The sample and the value to pass as 'previous' next time, or
+            None if /proc is unavailable or the process has exited.
+    """
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    now = time.monotonic()
+    fields = data[data.rfind(b")") + 2:].split()
+    cpu_seconds = (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+    cpu_percent = None
+    if previous is not None and now > previous[1]:
+        cpu_percent = (cpu_seconds - previous[0]) * 100 / (now - previous[1])
+
+    # VmHWM is the peak resident memory, reported in kB
+    status = _read_key_values(f"/proc/{pid}/status", ":")
+    peak_rss = int(status["VmHWM"].split()[0]) * 1024 if status and "VmHWM" in status else None
+    io = _read_key_values(f"/proc/{pid}/io", ":")
+    try:
+        open_files = len(os.listdir(f"/proc/{pid}/fd"))
+    except OSError:
+        open_files = None
+
+    sample = ProcessSample(
+        time=time.time(),
+        pid=pid,
+        cpu_seconds=cpu_seconds,
+        cpu_percent=cpu_percent,
+        rss_bytes=int(fields[21]) * PAGE_SIZE,
+        peak_rss_bytes=peak_rss,
+        read_bytes=int(io["read_bytes"]) if io and "read_bytes" in io else None,
+        write_bytes=int(io["write_bytes"]) if io and "write_bytes" in io else None,
+        threads=int(fields[17]),
+        open_files=open_files,
+    )
+    return sample, (cpu_seconds, now)
+
+
+class ProcessSampler:
+    """
+    Samples a process's resource use at a fixed rate on its own thread, keeping the history in a fixed-size ring buffer.
+    The process is looked up before every sample, so the sampler follows the server across restarts.
+    """
+
+    def __init__(self, get_pid, interval, history, on_sample=None):
+        """
+        Initialize the sampler, nothing is read until start() is called.
+        Args:
+            get_pid (func): Returns the process ID to sample, or None if there is no process.
+            interval (float): Seconds between samples.
+            history (int): The number of samples kept, older ones are dropped.
+            on_sample (func | None): Called with each ProcessSample on the sampler thread.
+        """
+        self.get_pid = get_pid
+        self.interval = interval
+        self.on_sample = on_sample
+        self._history = deque(maxlen=history)
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+
+    def start(self):
+        """Start the sampler thread, does nothing if it is already running."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+
+    def stop(self):
+        """Stop sampling."""
+        self._stopped.set()
+
+
+    def samples(self):
+        """
+        Get the sample history.
+        Returns:
+            list[ProcessSample]: The samples kept, oldest first.
+        """
+        with self._lock:
+            return list(self._history)
+
+
+    def latest(self):
+        """
+        Get the most recent sample.
+        Returns:
+            ProcessSample | None: The sample, or None if nothing has been sampled yet.
+        """
+        with self._lock:
+            return self._history[-1] if self._history else None
+
+
+    def _run(self):
+        """Take a sample every interval until stopped."""
+        previous_pid = None
+        previous = None
+        while not self._stopped.wait(self.interval):
+            pid = self.get_pid()
+            if pid is None:
+                previous_pid = previous = None
+                continue
+            # CPU use is only comparable between samples of the same process
+            result = read_process_sample(pid, previous if pid == previous_pid else None)
+            if result is None:
+                previous_pid = previous = None
+                continue
+            sample, previous = result
+            previous_pid = pid
+            with self._lock:
+                self._history.append(sample)
+            if self.on_sample is not None:
+                self.on_sample(sample)
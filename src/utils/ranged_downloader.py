@@ -0,0 +1,347 @@
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+import requests
+
+
+# Constants
+CONNECT_TIMEOUT_SECONDS = 10
+READ_TIMEOUT_SECONDS = 300
+CHUNK_SIZE = 1024 * 1024        # 1MB (in binary) per read from a connection
+MIN_SEGMENT_SIZE = 4 * 1024 * 1024  # 4MB (in binary), smaller downloads use fewer connections
+SEGMENT_ATTEMPTS = 5            # Attempts per segment before the download fails, progress is kept between attempts
+RETRY_BACKOFF_SECONDS = 1       # Doubled after every failed attempt
+PART_SUFFIX = ".part"           # eg. "bedrock-server-1.21.0.zip.part", the file being downloaded
+STATE_SUFFIX = ".part.json"     # The validator and the progress of each segment, used to resume
+STATE_SAVE_INTERVAL = 1         # Seconds between saves of the progress while downloading
+HEADERS = {
+    "User-Agent": "BedrockUpdater",
+    "Accept": "*/*",
+    "Accept-Encoding": "identity",  # Disable compression so Content-Length and byte ranges refer to the file itself
+}
+
+
+class ValidatorChanged(requests.RequestException):
+    """The file on the server changed since the partial download was started, so the download must start over."""
+
+
+def _probe(session, url):
+    """
+    Ask the server for the size of the file and whether it can be downloaded in ranges.
+    Returns:
+        tuple[int | None, str | None]: The size (None if unknown) and the ETag or Last-Modified validator, which is
+            None if the server does not support ranges.
+    """
+    with session.get(url, headers={**HEADERS, "Range": "bytes=0-0"}, stream=True, timeout=(CONNECT_TIMEOUT_SECONDS, READ_TIMEOUT_SECONDS)) as resp:
+        resp.raise_for_status()
+        # If-Range only accepts strong validators
+        etag = resp.headers.get("ETag")
+        if etag and etag.startswith("W/"):
+            etag = None
+        validator = etag or resp.headers.get("Last-Modified")
+        if resp.status_code == 206 and "/" in resp.headers.get("Content-Range", ""):
+            total = resp.headers["Content-Range"].rsplit("/", 1)[1]
+            return (int(total) if total.isdigit() else None), validator
+        # The server ignored the range, fall back to a single connection
+        length = resp.headers.get("Content-Length")
+        return (int(length) if length and length.isdigit() else None), None
+
+
+def _segments(size, connections):
+    """Split [0, size) into at most 'connections' contiguous [start, end] ranges of at least MIN_SEGMENT_SIZE."""
+    count = max(1, min(connections, size // MIN_SEGMENT_SIZE))
+    step = -(-size // count)
+    return [[start, min(start + step, size) - 1] for start in range(0, size, step)]
+
+
+class RangedDownload:
+    """
+    Downloads a file over several connections, each fetching its own byte range into a shared partial file.
+    Progress is saved next to the partial file, so a download interrupted by an error or a restart resumes where it
+    left off. Resumed ranges are requested with If-Range, so if the file changed on the server the download starts over
+    instead of mixing two versions. Servers that do not support ranges are downloaded over a single connection.
+    """
+
+    def __init__(self, url, dest, connections=4, session=None, progress=None):
+        """
+        Initialize the download, nothing is fetched until run() is called.
+        Args:
+            url (str): The URL to download.
+            dest (str | Path): The file to create, the partial download is kept beside it until it is complete.
+            connections (int): The maximum number of connections to download with.
+            session (requests.Session | None): The session to use, or None for a new one.
+            progress (func | None): Called with (downloaded, total) as data arrives, total is None if unknown.
+        """
+        self.url = url
+        self.dest = Path(dest)
+        self.part_path = self.dest.with_name(self.dest.name + PART_SUFFIX)
+        self.state_path = self.dest.with_name(self.dest.name + STATE_SUFFIX)
+        self.connections = connections
+        self.session = session or requests.Session()
+        self.progress = progress
+        self.downloaded = 0
+        self.total = None
+        self._last_save = 0
+        # Guards the segment progress, the state file and the progress callback
+        self._lock = threading.Lock()
+
+
+    def run(self):
+        """
+        Download the file, resuming a previous partial download if there is one.
+        Returns:
+            tuple[int, int]: The size of the file and the number of bytes fetched by this run.
+        Raises:
+            requests.RequestException: If the server cannot be reached or a range keeps failing.
+            OSError: If the file cannot be written, or its size does not match what the server reported.
+        """
+        self.dest.parent.mkdir(parents=True, exist_ok=True)
+        total, validator = _probe(self.session, self.url)
+        try:
+            fetched = self._download(total, validator)
+        except ValidatorChanged:
+            # The file was replaced on the server while we were downloading it, discard what we have and start again
+            # with the new file's size and validator
+            self._discard()
+            total, validator = _probe(self.session, self.url)
+            fetched = self._download(total, validator)
+        size = self.part_path.stat().st_size
+        if total is not None and size != total:
+            raise OSError(f"{self.dest.name}: downloaded {size} bytes, expected {total}")
+        os.replace(self.part_path, self.dest)
+        self.state_path.unlink(missing_ok=True)
+        return size, fetched
+
+
+    def _download(self, total, validator):
+        """Download the file in ranges if the probe allows it, otherwise over a single connection."""
+        self.total = total
+        if not total or validator is None:
+            return self._download_single()
+        return self._download_ranges(total, validator)
+
+
+    def _discard(self):
+        """Delete the partial download and its saved progress."""
+        self.part_path.unlink(missing_ok=True)
+        self.state_path.unlink(missing_ok=True)
+
+
+    def _load_state(self, total, validator):
+        """Load the progress of a previous run, or None if there is none for this exact file."""
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if state.get("url") != self.url or state.get("size") != total or state.get("validator") != validator or not self.part_path.exists():
+            return None
+        return state
+
+
+    def _save_state(self, state):
+        """Write the progress atomically so a crash mid-write never loses it."""
+        temp_path = self.state_path.with_name(f".tmp_{self.state_path.name}")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(temp_path, self.state_path)
+
+
+    def _report(self, count):
+        """Record bytes received and call the progress callback (the caller holds the lock)."""
+        self.downloaded += count
+        if self.progress is not None:
+            self.progress(self.downloaded, self.total)
+
+
+    def _download_ranges(self, total, validator):
+        """Download every incomplete segment on its own thread, returning the number of bytes fetched."""
+        state = self._load_state(total, validator)
+        if state is None:
+            # Start a new download, the partial file is allocated at full size so every segment can write in place
+            segments = _segments(total, self.connections)
+            state = {"url": self.url, "size": total, "validator": validator, "segments": segments, "done": [0] * len(segments)}
+            with open(self.part_path, "wb") as f:
+                f.truncate(total)
+            self._save_state(state)
+        self.downloaded = sum(state["done"])
+        fetched_before = self.downloaded
+        errors = []
+        threads = []
+        for index, (start, end) in enumerate(state["segments"]):
+            if start + state["done"][index] > end:
+                continue
+            thread = threading.Thread(target=self._run_segment, args=(state, index, validator, errors), daemon=True)
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+        return self.downloaded - fetched_before
+
+
+    def _run_segment(self, state, index, validator, errors):
+        """Fetch one segment, retrying from the last byte written with exponential backoff."""
+        backoff = RETRY_BACKOFF_SECONDS
+        for attempt in range(SEGMENT_ATTEMPTS):
+            try:
+                self._fetch_segment(state, index, validator)
+                return
+            except ValidatorChanged as e:
+                errors.append(e)
+                return
+            except (requests.RequestException, OSError) as e:
+                if attempt == SEGMENT_ATTEMPTS - 1 or errors:
+                    errors.append(e)
+                    return
+                time.sleep(backoff)
+                backoff *= 2
+
+
+    def _fetch_segment(self, state, index, validator):
+        """Request the rest of a segment and write it at its offset in the partial file."""
+        start, end = state["segments"][index]
+        offset = start + state["done"][index]
+        headers = {**HEADERS, "Range": f"bytes={offset}-{end}", "If-Range": validator}
+        with self.session.get(self.url, headers=headers, stream=True, timeout=(CONNECT_TIMEOUT_SECONDS, READ_TIMEOUT_SECONDS)) as resp:
+            resp.raise_for_status()
+            # A full response to If-Range means the validator no longer matches the file on the server
+            if resp.status_code != 206:
+                raise ValidatorChanged(f"{self.url}: file changed on the server")
+            # Every segment has its own handle, so seeking never races with another thread
+            with open(self.part_path, "r+b") as f:
+                f.seek(offset)
+                for chunk in resp.iter_content(chunk_size=CHUNK_SIZE):
+                    if not chunk:
+                        continue
+                    # Never write past the segment even if the server sends more than asked for
+                    chunk = chunk[:end + 1 - offset]
+                    f.write(chunk)
+                    offset += len(chunk)
+                    with self._lock:
+                        state["done"][index] = offset - start
+                        self._report(len(chunk))
+                        now = time.monotonic()
+                        if now - self._last_save >= STATE_SAVE_INTERVAL or offset > end:
+                            self._save_state(state)
+                            self._last_save = now
+                    if offset > end:
+                        break
+        if offset <= end:
+            raise requests.ConnectionError(f"{self.url}: connection closed {end + 1 - offset} bytes before the end of the range")
+
+
+    def _download_single(self):
+        """Download the whole file over one connection, returning the number of bytes fetched."""
+        self._discard()
+        self.downloaded = 0
+        with self.session.get(self.url, headers=HEADERS, stream=True, timeout=(CONNECT_TIMEOUT_SECONDS, READ_TIMEOUT_SECONDS)) as resp:
+            resp.raise_for_status()
+            with open(self.part_path, "wb") as f:
+                for chunk in resp.iter_content(chunk_size=CHUNK_SIZE):
+                    if chunk:
+                        f.write(chunk)
+                        with self._lock:
+                            self._report(len(chunk))
+        return self.downloaded
+
+
+class ArtifactCache:
+    """
+    Keeps downloaded server archives in a folder per version, evicting the least recently used versions.
+    Reinstalling or rolling back to a cached version needs no download.
+    """
+
+    def __init__(self, cache_dir, max_versions):
+        """
+        Initialize the cache.
+        Args:
+            cache_dir (str | Path): The folder the archives are kept in.
+            max_versions (int): The number of versions kept, the least recently used are deleted first.
+        """
+        self.cache_dir = Path(cache_dir)
+        self.max_versions = max_versions
+        self._lock = threading.Lock()
+
+
+    def path(self, version, filename):
+        """Get where an archive of a version is cached, eg. "<cache_dir>/1.21.0/bedrock-server-1.21.0.zip"."""
+        return self.cache_dir / version / filename
+
+
+    def get(self, version, filename):
+        """
+        Look up a cached archive, marking it as used.
+        Args:
+            version (str): The server version.
+            filename (str): The archive's file name.
+        Returns:
+            Path | None: The archive, or None if it is not cached.
+        """
+        path = self.path(version, filename)
+        if not path.is_file():
+            return None
+        # The modification time orders the versions for eviction
+        os.utime(path)
+        return path
+
+
+    def fetch(self, version, url, connections=4, progress=None):
+        """
+        Get an archive from the cache, downloading it (or resuming its partial download) if it is not cached.
+        Args:
+            version (str): The server version.
+            url (str): The URL of the archive, its last path component is used as the file name.
+            connections (int): The maximum number of connections to download with.
+            progress (func | None): Called with (downloaded, total) during the download.
+        Returns:
+            tuple[Path, int]: The cached archive and the number of bytes downloaded to get it (0 if it was cached).
+        Raises:
+            requests.RequestException: If the download fails.
+            OSError: If the archive cannot be written or has the wrong size.
+        """
+        filename = url.rsplit("/", 1)[-1]
+        cached = self.get(version, filename)
+        if cached is not None:
+            return cached, 0
+        dest = self.path(version, filename)
+        _, fetched = RangedDownload(url, dest, connections, progress=progress).run()
+        self.evict(keep=version)
+        return dest, fetched
+
+
+    def versions(self):
+        """
+        List the cached versions.
+        Returns:
+            list[tuple[str, float]]: The versions and when they were last used, most recent first.
+        """
+        if not self.cache_dir.exists():
+            return []
+        entries = []
+        for folder in self.cache_dir.iterdir():
+            files = [file for file in folder.iterdir() if file.is_file() and not file.name.endswith((PART_SUFFIX, STATE_SUFFIX))] if folder.is_dir() else []
+            if files:
+                entries.append((folder.name, max(file.stat().st_mtime for file in files)))
+        return sorted(entries, key=lambda entry: entry[1], reverse=True)
+
+
+    def evict(self, keep=None):
+        """
+        Delete the least recently used versions beyond max_versions.
+        Args:
+            keep (str | None): A version that is never evicted, eg. the one just downloaded.
+        Returns:
+            list[str]: The versions that were deleted.
+        """
+        with self._lock:
+            versions = [version for version, _ in self.versions() if version != keep]
+            limit = self.max_versions - (1 if keep is not None else 0)
+            evicted = versions[max(limit, 0):]
+            for version in evicted:
+                shutil.rmtree(self.cache_dir / version, ignore_errors=True)
+            return evicted
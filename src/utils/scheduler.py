@@ -0,0 +1,426 @@
+import heapq
+import itertools
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+
+# Constants
+MAX_WAIT_SECONDS = 30           # Longest the scheduler sleeps before reading the clock again, so clock changes are noticed
+MISSED_GRACE_SECONDS = 60       # A job that fires later than this after its time has missed its run
+RUN_ONCE = "run_once"           # Missed runs are collapsed into one run as soon as possible
+SKIP = "skip"                   # Missed runs are dropped and the job waits for its next time
+MISSED_RUN_POLICIES = (RUN_ONCE, SKIP)
+CRON_FIELDS = (("minute", 0, 59), ("hour", 0, 23), ("day", 1, 31), ("month", 1, 12), ("weekday", 0, 7))
+CRON_SEARCH_DAYS = 5 * 366      # Long enough to reach any valid date (eg. the 29th of February)
+
+
+class IntervalTrigger:
+    """Fires every fixed number of seconds, on a grid anchored at the first run so runs do not drift."""
+
+    def __init__(self, seconds, first_delay=None):
+        """
+        Initialize the trigger.
+        Args:
+            seconds (float): The time between runs.
+            first_delay (float | None): The time before the first run, or None to wait a full interval.
+        """
+        if seconds <= 0:
+            raise ValueError("interval must be positive")
+        self.seconds = seconds
+        self.first_delay = seconds if first_delay is None else first_delay
+        self._anchor = None
+
+
+    def next_fire(self, after):
+        """
+        Get the next time the trigger fires.
+        Args:
+            after (float): A unix timestamp, the first call schedules the first run relative to it.
+        Returns:
+            float: The unix timestamp of the next run after 'after'.
+        """
+        if self._anchor is None:
+            self._anchor = after + self.first_delay
+            return self._anchor
+        if after < self._anchor:
+            return self._anchor
+        return self._anchor + ((after - self._anchor) // self.seconds + 1) * self.seconds
+
+
+    def describe(self):
+        """Describe the trigger for listings, eg. "every 1h30m"."""
+        minutes, seconds = divmod(int(self.seconds), 60)
+        hours, minutes = divmod(minutes, 60)
+        return "every " + "".join(f"{value}{unit}" for value, unit in ((hours, "h"), (minutes, "m"), (seconds, "s")) if value)
+
+
+class OnceTrigger:
+    """Fires a single time, after a delay."""
+
+    def __init__(self, delay=0):
+        """
+        Initialize the trigger.
+        Args:
+            delay (float): The time before the run in seconds.
+        """
+        self.delay = delay
+        self._fired = False
+
+
+    def next_fire(self, after):
+        """
+        Get the time of the run.
+        Args:
+            after (float): A unix timestamp, the run is scheduled relative to it.
+        Returns:
+            float | None: The unix timestamp of the run, or None once it has been scheduled.
+        """
+        if self._fired:
+            return None
+        self._fired = True
+        return after + self.delay
+
+
+    def describe(self):
+        """Describe the trigger for listings."""
+        return "once"
+
+
+class CronTrigger:
+    """
+    Fires at the local times matching a cron expression ("minute hour day month weekday").
+    Each field accepts "*", numbers, ranges ("1-5"), lists ("0,30") and steps ("*/15"). Weekdays are 0-7 with Sunday as
+    0 or 7, and as in cron, if both the day and the weekday are restricted a time matching either fires.
+    """
+
+    def __init__(self, expression):
+        """
+        Initialize the trigger.
+        Args:
+            expression (str): The cron expression, eg. "30 3 * * *" for 03:30 every day.
+        Raises:
+            ValueError: If the expression is not valid.
+        """
+        fields = expression.split()
+        if len(fields) != len(CRON_FIELDS):
+            raise ValueError(f"{expression}: expected {len(CRON_FIELDS)} fields (minute hour day month weekday)")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            _parse_cron_field(text, name, low, high) for text, (name, low, high) in zip(fields, CRON_FIELDS)
+        )
+        # Cron counts Sunday as 0 (or 7), Python counts Monday as 0
+        self.weekdays = {(weekday - 1) % 7 for weekday in weekdays}
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+
+
+    @classmethod
+    def daily(cls, hour, minute):
+        """Create a trigger that fires every day at a local time."""
+        return cls(f"{minute} {hour} * * *")
+
+
+    def _day_matches(self, moment):
+        """Check the day of the month and the weekday, matching either if both are restricted."""
+        day = moment.day in self.days
+        weekday = moment.weekday() in self.weekdays
+        if self._any_day or self._any_weekday:
+            return day and weekday
+        return day or weekday
+
+
+    def next_fire(self, after):
+        """
+        Get the next time the trigger fires.
+        Args:
+            after (float): A unix timestamp.
+        Returns:
+            float: The unix timestamp of the first matching minute after 'after'.
+        Raises:
+            ValueError: If the expression never matches (eg. the 31st of February).
+        """
+        moment = datetime.fromtimestamp(after).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        end = moment + timedelta(days=CRON_SEARCH_DAYS)
+        # Skip whole months, days and hours that cannot match before stepping through minutes
+        while moment < end:
+            if moment.month not in self.months:
+                moment = (moment.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(moment):
+                moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + timedelta(hours=1)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment.timestamp()
+        raise ValueError(f"{self.expression}: never fires")
+
+
+    def describe(self):
+        """Describe the trigger for listings, eg. "cron 30 3 * * *"."""
+        return f"cron {self.expression}"
+
+
+def _parse_cron_field(text, name, low, high):
+    """
+    Parse one field of a cron expression into the set of values it matches.
+    Raises:
+        ValueError: If the field is not valid or out of range.
+    """
+    values = set()
+    for part in text.split(","):
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/", 1)
+            step = int(step_text)
+            if step < 1:
+                raise ValueError(f"{name}: step must be positive")
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = (int(value) for value in part.split("-", 1))
+        else:
+            # "5/15" means every 15 starting at 5
+            start = int(part)
+            end = high if step > 1 else start
+        if start < low or end > high or start > end:
+            raise ValueError(f"{name}: {part} is not within {low}-{high}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+@dataclass
+class ScheduledJob:
+    """
+    Dataclass holding a job and its schedule, updated by the scheduler as it runs.
+    Attributes:
+        name (str): The job's unique name.
+        function (func): Called with no arguments on a worker thread.
+        trigger (IntervalTrigger | CronTrigger | OnceTrigger): When the job runs.
+        missed (str): One of MISSED_RUN_POLICIES, what to do when a run was missed (eg. the machine was asleep).
+        jitter (float): Up to this many seconds are added to every run time at random.
+        urgent (bool): Whether the job runs on the urgent workers, which long jobs on the shared workers cannot hold up.
+        scheduled (float | None): The unix timestamp of the next run before jitter, None if the job is not scheduled.
+        next_run (float | None): The unix timestamp the next run fires at.
+        last_run (float | None): When the job last started.
+        last_duration (float | None): How long the last run took in seconds.
+        last_error (str | None): The error the last run raised, None if it succeeded.
+        runs (int): The number of completed runs.
+        missed_runs (int): The number of runs skipped because they were missed or the previous run was still going.
+        running (bool): Whether the job is running now.
+    """
+    name: str
+    function: object
+    trigger: object
+    missed: str = RUN_ONCE
+    jitter: float = 0
+    urgent: bool = False
+    scheduled: float | None = None
+    next_run: float | None = None
+    last_run: float | None = None
+    last_duration: float | None = None
+    last_error: str | None = None
+    runs: int = 0
+    missed_runs: int = 0
+    running: bool = False
+
+
+class Scheduler:
+    """
+    Runs jobs on interval and cron triggers from a single thread waiting on a min-heap of run times.
+    The thread never sleeps longer than MAX_WAIT_SECONDS, so wall clock changes are picked up instead of drifting. Jobs
+    run on a small pool of worker threads so a long job does not delay the others, and a job is never run twice at once.
+    Urgent jobs (eg. restarts) have their own workers, so they still start on time while every shared worker is busy.
+    Cancelled and rescheduled jobs leave their old heap entries behind, which are dropped when they reach the top.
+    """
+
+    def __init__(self, workers=2, on_error=None, urgent_workers=1):
+        """
+        Initialize the scheduler, jobs can be added before or after it is started.
+        Args:
+            workers (int): The number of jobs that can run at the same time.
+            on_error (func | None): Called with (job, exception) when a job raises.
+            urgent_workers (int): The number of urgent jobs that can run at the same time, beside the other jobs.
+        """
+        self.on_error = on_error
+        self._jobs = {}
+        self._heap = []
+        # Tie-breaker for entries with the same run time, and the identity of each job's current entry
+        self._sequence = itertools.count()
+        self._entries = {}
+        self._condition = threading.Condition()
+        # The worker threads live as long as the scheduler, which matters for jobs that start bedrock_server: on Linux
+        # its parent death signal fires when the thread that started it exits
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="scheduler")
+        self._urgent_pool = ThreadPoolExecutor(urgent_workers, thread_name_prefix="scheduler_urgent")
+        self._thread = None
+        self._stopped = False
+
+
+    def start(self):
+        """Start the scheduler thread."""
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+
+    def stop(self):
+        """Stop firing jobs, runs already started are left to finish."""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+
+
+    def add(self, name, function, trigger, missed=RUN_ONCE, jitter=0, urgent=False):
+        """
+        Schedule a job, replacing any job with the same name.
+        Args:
+            name (str): The job's unique name.
+            function (func): Called with no arguments on a worker thread.
+            trigger (IntervalTrigger | CronTrigger | OnceTrigger): When the job runs.
+            missed (str): One of MISSED_RUN_POLICIES.
+            jitter (float): Up to this many seconds are added to every run time at random, less than the interval.
+            urgent (bool): Run the job on the urgent workers, for short jobs that must not wait behind long ones.
+        Returns:
+            ScheduledJob: The scheduled job.
+        """
+        if missed not in MISSED_RUN_POLICIES:
+            raise ValueError(f"missed: must be one of {MISSED_RUN_POLICIES}")
+        job = ScheduledJob(name, function, trigger, missed, jitter, urgent)
+        with self._condition:
+            self._jobs[name] = job
+            self._schedule(job, trigger.next_fire(time.time()))
+        return job
+
+
+    def cancel(self, name):
+        """
+        Remove a job, a run in progress is left to finish.
+        Args:
+            name (str): The job's name.
+        Returns:
+            bool: True if the job existed.
+        """
+        with self._condition:
+            job = self._jobs.pop(name, None)
+            self._entries.pop(name, None)
+            if job is not None:
+                job.scheduled = job.next_run = None
+            return job is not None
+
+
+    def reschedule(self, name, trigger):
+        """
+        Give a job a new trigger, its next run is computed from now.
+        Args:
+            name (str): The job's name.
+            trigger (IntervalTrigger | CronTrigger): The new trigger.
+        Returns:
+            bool: True if the job exists.
+        """
+        with self._condition:
+            job = self._jobs.get(name)
+            if job is None:
+                return False
+            job.trigger = trigger
+            self._schedule(job, trigger.next_fire(time.time()))
+            return True
+
+
+    def run_now(self, name):
+        """
+        Run a job as soon as possible, then continue with its normal schedule.
+        Args:
+            name (str): The job's name.
+        Returns:
+            bool: True if the job exists.
+        """
+        with self._condition:
+            job = self._jobs.get(name)
+            if job is None:
+                return False
+            self._schedule(job, time.time(), jitter=False)
+            return True
+
+
+    def jobs(self):
+        """
+        List the scheduled jobs.
+        Returns:
+            list[ScheduledJob]: The jobs, soonest first.
+        """
+        with self._condition:
+            return sorted(self._jobs.values(), key=lambda job: job.next_run if job.next_run is not None else float("inf"))
+
+
+    def _schedule(self, job, when, jitter=True):
+        """Push a job's next run onto the heap, superseding its previous entry (the caller holds the lock)."""
+        job.scheduled = when
+        job.next_run = when + (random.uniform(0, job.jitter) if jitter and job.jitter else 0)
+        entry = next(self._sequence)
+        self._entries[job.name] = entry
+        heapq.heappush(self._heap, (job.next_run, entry, job))
+        self._condition.notify()
+
+
+    def _run(self):
+        """Fire jobs as their run times arrive until the scheduler is stopped."""
+        with self._condition:
+            while not self._stopped:
+                # Drop entries left behind by cancelled and rescheduled jobs
+                while self._heap and self._entries.get(self._heap[0][2].name) != self._heap[0][1]:
+                    heapq.heappop(self._heap)
+                now = time.time()
+                if not self._heap or self._heap[0][0] > now:
+                    timeout = MAX_WAIT_SECONDS if not self._heap else min(self._heap[0][0] - now, MAX_WAIT_SECONDS)
+                    self._condition.wait(timeout)
+                    continue
+                _, _, job = heapq.heappop(self._heap)
+                self._fire(job, now)
+
+
+    def _fire(self, job, now):
+        """Start a job's run if it is due and not missed, then schedule its next run (the caller holds the lock)."""
+        missed = now - job.next_run > MISSED_GRACE_SECONDS
+        if job.running or (missed and job.missed == SKIP):
+            job.missed_runs += 1
+        else:
+            try:
+                (self._urgent_pool if job.urgent else self._pool).submit(self._execute, job)
+            except RuntimeError:
+                # The pool is shut down when the interpreter exits
+                self._stopped = True
+                return
+            job.running = True
+        # The next run is always after now, so runs missed while the machine was asleep or the clock jumped are not
+        # fired one after another
+        when = job.trigger.next_fire(max(job.scheduled, now))
+        if when is None:
+            # A one-off job is done once it has fired
+            self._jobs.pop(job.name, None)
+            self._entries.pop(job.name, None)
+            job.scheduled = job.next_run = None
+            return
+        self._schedule(job, when)
+
+
+    def _execute(self, job):
+        """Run a job on a worker thread and record the outcome."""
+        started = time.time()
+        start = time.perf_counter()
+        error = None
+        try:
+            job.function()
+        except Exception as e:
+            error = e
+        with self._condition:
+            job.running = False
+            job.last_run = started
+            job.last_duration = time.perf_counter() - start
+            job.last_error = str(error) if error is not None else None
+            job.runs += 1
+        if error is not None and self.on_error is not None:
+            self.on_error(job, error)
@@ -0,0 +1,247 @@
+import re
+from dataclasses import dataclass
+from .broadcaster import EventBroadcaster
+
+
+# Constants
+# The leading word of a line or pattern, used to pick the patterns that can possibly match a line
+WORD_PATTERN = re.compile(r"[A-Za-z0-9_]*")
+
+
+@dataclass(frozen=True)
+class ServerEvent:
+    """
+    Base class of the events recognized in the server's output.
+    Attributes:
+        timestamp (str): The formatted prefix of the line (see process_line).
+        line (str): The message of the line.
+    """
+    timestamp: str
+    line: str
+
+
+@dataclass(frozen=True)
+class VersionDetected(ServerEvent):
+    """The server printed its version while starting."""
+    version: str
+
+
+@dataclass(frozen=True)
+class ServerStarted(ServerEvent):
+    """The server finished starting and accepts players."""
+
+
+@dataclass(frozen=True)
+class PlayerConnected(ServerEvent):
+    """A player joined the server."""
+    name: str
+    xuid: str
+
+
+@dataclass(frozen=True)
+class PlayerDisconnected(ServerEvent):
+    """A player left the server."""
+    name: str
+    xuid: str
+
+
+@dataclass(frozen=True)
+class SaveCompleted(ServerEvent):
+    """A 'save query' found the save finished, the world files are ready to be copied."""
+
+
+@dataclass(frozen=True)
+class SavePending(ServerEvent):
+    """A 'save query' found the save still in progress."""
+
+
+@dataclass(frozen=True)
+class SaveResumed(ServerEvent):
+    """Saving was resumed after a 'save resume'."""
+
+
+@dataclass(frozen=True)
+class PropertiesMissing(ServerEvent):
+    """The server could not open server.properties and is waiting for input before exiting."""
+
+
+@dataclass(frozen=True)
+class CrashHint(ServerEvent):
+    """A line that usually precedes or explains a crash."""
+
+
+@dataclass(frozen=True)
+class ErrorLogged(ServerEvent):
+    """Any other line the server logged at the ERROR level."""
+
+
+class EventPattern:
+    """A named regular expression and the function that builds an event from its match."""
+    def __init__(self, name, pattern, build, anywhere=False):
+        """
+        Initialize the pattern.
+        Args:
+            name (str): The name of the pattern's group in the combined matcher, a valid identifier unique among all patterns.
+            pattern (str): The regular expression. Its named groups must also be unique among all patterns.
+            build (func): Called with (timestamp, line, match), returns the ServerEvent for the line.
+            anywhere (bool): If False the pattern must match at the start of a line's message. If True it is searched for
+                anywhere in the message, but only in lines that are not logged at the INFO level, which keeps the
+                unanchored search off the bulk of the server's output.
+        """
+        self.name = name
+        self.pattern = pattern
+        self.build = build
+        self.anywhere = anywhere
+
+
+# Everything recognized out of the box, the first pattern that matches a line wins
+DEFAULT_PATTERNS = (
+    EventPattern("version", r"Version:? (?P<version_number>\S+)", lambda t, l, m: VersionDetected(t, l, m.group("version_number"))),
+    EventPattern("started", r"Server started\.", lambda t, l, m: ServerStarted(t, l)),
+    EventPattern("connected", r"Player connected: (?P<connected_name>.+?), xuid: (?P<connected_xuid>\d*)", lambda t, l, m: PlayerConnected(t, l, m.group("connected_name"), m.group("connected_xuid"))),
+    EventPattern("disconnected", r"Player disconnected: (?P<disconnected_name>.+?), xuid: (?P<disconnected_xuid>\d*)", lambda t, l, m: PlayerDisconnected(t, l, m.group("disconnected_name"), m.group("disconnected_xuid"))),
+    EventPattern("save_completed", r"Data saved\. Files are now ready to be copied\.", lambda t, l, m: SaveCompleted(t, l)),
+    EventPattern("save_pending", r"A previous save has not been completed\.", lambda t, l, m: SavePending(t, l)),
+    EventPattern("save_resumed", r"Changes to the world are resumed\.", lambda t, l, m: SaveResumed(t, l)),
+    EventPattern("properties_missing", r"Error opening file: server\.properties", lambda t, l, m: PropertiesMissing(t, l), anywhere=True),
+    EventPattern("crash_hint", r"Segmentation fault|terminate called|Unhandled exception|Assertion failed|[Cc]rash", lambda t, l, m: CrashHint(t, l), anywhere=True),
+)
+
+
+class ServerEventMatcher:
+    """
+    Recognizes server events with combined regular expressions.
+    Anchored patterns are grouped by the literal word they start with, and each group is compiled into one alternation
+    of named groups. A line's first word picks the only group that can match it, so the cost per line stays the same
+    however many patterns there are, and the name of the alternative that matched picks the event to build. Patterns
+    without a literal first word are combined into a group tried on every line, and patterns that can appear anywhere
+    in a line are combined into an expression that is only searched on non-INFO lines.
+    """
+    def __init__(self, patterns=DEFAULT_PATTERNS):
+        """
+        Initialize the matcher.
+        Args:
+            patterns (Iterable[EventPattern]): The patterns to recognize, in priority order.
+        """
+        self.patterns = list(patterns)
+        self._compile()
+
+
+    def _compile(self):
+        """Combine the patterns into one expression per leading word, one for the rest, and one for unanchored patterns."""
+        self._builders = {pattern.name: pattern.build for pattern in self.patterns}
+        by_word = {}
+        for pattern in self.patterns:
+            if not pattern.anywhere:
+                by_word.setdefault(self._leading_word(pattern.pattern), []).append(pattern)
+        self._by_word = {word: self._combine(patterns) for word, patterns in by_word.items() if word}
+        self._unprefixed = self._combine(by_word.get("", []))
+        self._anywhere = self._combine(pattern for pattern in self.patterns if pattern.anywhere)
+
+
+    @staticmethod
+    def _leading_word(pattern):
+        """
+        Get the literal word a pattern always starts with.
+        Args:
+            pattern (str): The regular expression.
+        Returns:
+            str: The word, or "" if the pattern does not start with a whole literal word.
+        """
+        word = WORD_PATTERN.match(pattern).group()
+        # The word must end at a literal space or colon, otherwise it may be quantified or continue with other characters
+        if word and pattern[len(word):len(word) + 1] in (" ", ":"):
+            return word
+        return ""
+
+
+    @staticmethod
+    def _combine(patterns):
+        """Compile patterns into a single alternation of named groups, or None if there are none."""
+        alternatives = [f"(?P<{pattern.name}>{pattern.pattern})" for pattern in patterns]
+        return re.compile("|".join(alternatives)) if alternatives else None
+
+
+    def register(self, pattern):
+        """
+        Add a pattern, recognized after the existing ones.
+        Args:
+            pattern (EventPattern): The pattern to add.
+        Raises:
+            ValueError: If another pattern already has the same name.
+            re.error: If the pattern is invalid or reuses a group name.
+        """
+        if pattern.name in self._builders:
+            raise ValueError(f"{pattern.name}: an event pattern with this name is already registered")
+        self.patterns.append(pattern)
+        try:
+            self._compile()
+        except re.error:
+            self.patterns.pop()
+            self._compile()
+            raise
+
+
+    def match(self, timestamp, line):
+        """
+        Recognize the event in a line of server output.
+        Args:
+            timestamp (str): The formatted prefix of the line.
+            line (str): The message of the line.
+        Returns:
+            ServerEvent | None: The event, or None if the line is not an event.
+        """
+        match = None
+        combined = self._by_word.get(WORD_PATTERN.match(line).group())
+        if combined is not None:
+            match = combined.match(line)
+        if match is None and self._unprefixed is not None:
+            match = self._unprefixed.match(line)
+        level = getattr(timestamp, "level", None)
+        # Most output is INFO, only the rarer levels (and plain strings) pay for the unanchored search
+        if match is None and level != "INFO" and self._anywhere is not None:
+            match = self._anywhere.search(line)
+        if match is not None:
+            # The outermost group is the last one to close, so lastgroup names the alternative that matched
+            return self._builders[match.lastgroup](timestamp, line, match)
+        # Prefixes from process_line carry their level, errors need no pattern
+        if level == "ERROR":
+            return ErrorLogged(timestamp, line)
+        return None
+
+
+class ServerEventPipeline:
+    """Recognizes events in server output and delivers them to the subscribers of each event type."""
+    def __init__(self, matcher=None):
+        """
+        Initialize the pipeline.
+        Args:
+            matcher (ServerEventMatcher | None): The matcher to use, or None for one with the default patterns.
+        """
+        self.matcher = matcher if matcher is not None else ServerEventMatcher()
+        self._broadcasters = {}
+
+
+    def subscribe(self, event_type, callback, **options):
+        """
+        Register a callback for an event type, subscribing to ServerEvent receives every event.
+        Args:
+            event_type (type): The ServerEvent subclass to receive, including its subclasses.
+            callback (func): Called with the event.
+            **options: Passed to Broadcaster.subscribe, eg. priority or asynchronous.
+        """
+        self._broadcasters.setdefault(event_type, EventBroadcaster(f"event_{event_type.__name__}")).subscribe(callback, **options)
+
+
+    def publish(self, events):
+        """
+        Deliver events to the subscribers of their type and its base classes.
+        Args:
+            events (Iterable[ServerEvent]): The events to deliver, in order.
+        """
+        broadcasters = self._broadcasters
+        for event in events:
+            for event_type in type(event).__mro__:
+                broadcaster = broadcasters.get(event_type)
+                if broadcaster is not None:
+                    broadcaster.publish(event)
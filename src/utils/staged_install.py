@@ -0,0 +1,125 @@
+import os
+import shutil
+import zipfile
+from pathlib import Path, PurePosixPath
+from .file_copy import copy_file, copy_tree
+from .install_manifest import INSTALL_MANIFEST_NAME, plan_update
+from .world_restore import swap_directory
+
+
+def stage_install(archive_path, live_dir, staged_dir, protected, manifest=None, stats=None):
+    """
+    Build a complete install of an update archive in a new directory beside the live install, which keeps running.
+    Files the live install already has with the same size and CRC32 are copied from it (a reflink where the filesystem
+    supports it), only new or changed files are decompressed from the archive. Protected paths are left out, they are
+    copied from the live install when it is swapped.
+    Args:
+        archive_path (str | Path): The update zip.
+        live_dir (str | Path): The install currently in use.
+        staged_dir (str | Path): The directory to build the new install in, must not exist yet.
+        protected (ProtectedPaths): The paths that belong to the user rather than to the release.
+        manifest (dict[str, list[int]] | None): The manifest of the live install, or None if there is none.
+        stats (Counter | None): If given, incremented with the copy strategy used for each unchanged file.
+    Returns:
+        UpdatePlan: The files extracted, copied from the live install (skipped) and protected.
+    """
+    live_dir = Path(live_dir)
+    staged_dir = Path(staged_dir)
+    staged_dir.mkdir(parents=True)
+    with zipfile.ZipFile(archive_path, "r") as zf:
+        plan = plan_update(zf.infolist(), live_dir, protected, manifest)
+        for info in plan.skipped:
+            dest = staged_dir / info.filename
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            copy_file(live_dir / info.filename, dest, stats=stats)
+        for info in plan.extract:
+            dest = staged_dir / info.filename
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            with zf.open(info) as src, open(dest, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            _apply_mode(info, dest, live_dir / info.filename)
+    return plan
+
+
+def _apply_mode(info, dest, live_file):
+    """Give an extracted file the permissions recorded in the archive, or those of the file it replaces (eg. the executable bit)."""
+    mode = (info.external_attr >> 16) & 0o777
+    if mode:
+        os.chmod(dest, mode)
+    elif live_file.is_file():
+        shutil.copymode(live_file, dest)
+
+
+def swap_install(staged_dir, live_dir, aside_dir, protected, installed=None):
+    """
+    Make a staged install the live one, keeping the user's data and the replaced install.
+    Everything in the live install that the staged one does not provide and that was not installed by the release (eg.
+    worlds, logs, packs added by hand) is moved across with renames, protected paths are copied across, and then the
+    directories are swapped with two renames. The server must be stopped. If any step fails, the moved data is put back
+    and the live install is left as it was.
+    Args:
+        staged_dir (Path): The new install, on the same filesystem as live_dir.
+        live_dir (Path): The install in use, its path stays the same.
+        aside_dir (Path): Where the replaced install is moved to, must not exist yet.
+        protected (ProtectedPaths): The paths copied from the live install, replacing the staged copies.
+        installed (set[str] | dict | None): The paths the release installed in the live install (its manifest), these
+            are never moved across. If None, everything the staged install does not provide is moved.
+    Returns:
+        int: The number of files and folders moved across.
+    Raises:
+        OSError: If the swap fails, after the live install has been restored.
+    """
+    moved = []
+    try:
+        _move_user_data(live_dir, staged_dir, "", protected, installed, _parent_folders(installed), moved)
+        _copy_protected(live_dir, staged_dir, protected)
+        swap_directory(staged_dir, live_dir, aside_dir)
+    except OSError:
+        # Move everything back in reverse order, so folders are restored after the files moved out of them
+        for name in reversed(moved):
+            os.rename(staged_dir / name, live_dir / name)
+        raise
+    return len(moved)
+
+
+def _parent_folders(installed):
+    """Get every folder that contains an installed file, eg. "behavior_packs" and "behavior_packs/vanilla"."""
+    if installed is None:
+        return set()
+    return {parent.as_posix() for name in installed for parent in PurePosixPath(name).parents if parent.name}
+
+
+def _move_user_data(source_dir, dest_dir, relative, protected, installed, installed_folders, moved):
+    """Rename the entries of one folder of the live install that the staged install does not provide."""
+    for entry in os.scandir(source_dir / relative):
+        name = f"{relative}/{entry.name}" if relative else entry.name
+        # Protected paths are copied instead, so the replaced install keeps its own
+        if name == INSTALL_MANIFEST_NAME or name in protected:
+            continue
+        dest = dest_dir / name
+        if entry.is_dir(follow_symlinks=False):
+            if not dest.exists() and name not in installed_folders:
+                # A folder the release never touched (eg. worlds) is moved whole
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                os.rename(entry.path, dest)
+                moved.append(name)
+            elif dest.is_dir() or not dest.exists():
+                # A folder the release installs files in, only the files added by hand are moved
+                _move_user_data(source_dir, dest_dir, name, protected, installed, installed_folders, moved)
+        elif not dest.exists() and not dest.is_symlink() and (installed is None or name not in installed):
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            os.rename(entry.path, dest)
+            moved.append(name)
+
+
+def _copy_protected(source_dir, dest_dir, protected):
+    """Copy the protected paths of the live install over the staged ones."""
+    for name in protected:
+        source = source_dir / name
+        dest = dest_dir / name
+        if source.is_dir():
+            shutil.rmtree(dest, ignore_errors=True)
+            copy_tree(source, dest)
+        elif source.is_file():
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            copy_file(source, dest)
@@ -0,0 +1,88 @@
+import ctypes
+import ctypes.util
+import os
+import platform
+import threading
+
+
+# Constants
+# ioprio_set(2) is not wrapped by the os module, so it is called by syscall number (Linux only)
+IOPRIO_SET_SYSCALLS = {"x86_64": 251, "amd64": 251, "aarch64": 30, "arm64": 30, "i386": 289, "i686": 289, "armv7l": 314}
+IOPRIO_WHO_PROCESS = 1          # With a thread id, applies to that thread only
+IOPRIO_CLASS_SHIFT = 13
+IOPRIO_CLASSES = {"realtime": 1, "best-effort": 2, "idle": 3}
+MAINTENANCE_NICE = 10           # How much lower than the server maintenance threads are scheduled
+
+
+def set_thread_io_priority(io_class, level=7):
+    """
+    Set the I/O scheduling class of the calling thread (Linux only, a no-op elsewhere).
+    Args:
+        io_class (str): One of IOPRIO_CLASSES, "idle" only gets disk time nobody else wants.
+        level (int): The priority within the best-effort or realtime class, 0 (highest) to 7 (lowest).
+    Returns:
+        bool: True if the priority was set.
+    """
+    number = IOPRIO_SET_SYSCALLS.get(platform.machine().lower())
+    if number is None or platform.system() != "Linux":
+        return False
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    except OSError:
+        return False
+    value = (IOPRIO_CLASSES[io_class] << IOPRIO_CLASS_SHIFT) | (0 if io_class == "idle" else level)
+    return libc.syscall(number, IOPRIO_WHO_PROCESS, threading.get_native_id(), value) == 0
+
+
+def set_thread_nice(increment):
+    """
+    Lower the CPU priority of the calling thread (Linux schedules threads individually, elsewhere this is a no-op).
+    Args:
+        increment (int): How much to raise the thread's nice value by, it cannot be lowered again without privileges.
+    Returns:
+        bool: True if the nice value was changed.
+    """
+    if not hasattr(os, "setpriority") or platform.system() != "Linux":
+        return False
+    try:
+        thread_id = threading.get_native_id()
+        os.setpriority(os.PRIO_PROCESS, thread_id, min(os.getpriority(os.PRIO_PROCESS, thread_id) + increment, 19))
+        return True
+    except OSError:
+        return False
+
+
+def set_thread_cpus(cpus):
+    """
+    Restrict the calling thread to a set of CPUs (Linux only, a no-op elsewhere). Threads and processes it starts afterwards inherit the set.
+    Args:
+        cpus (set[int]): The CPU numbers the thread may run on.
+    Returns:
+        bool: True if the affinity was set.
+    """
+    if not hasattr(os, "sched_setaffinity"):
+        return False
+    try:
+        # pid 0 is the calling thread, affinity is per thread on Linux
+        os.sched_setaffinity(0, cpus)
+        return True
+    except OSError:
+        return False
+
+
+def lower_thread_priority(priority, cpus=None):
+    """
+    Lower the priority of the calling thread for background work that must not slow down the server.
+    Args:
+        priority (str): "idle" only gets disk time nobody else wants, "low" gets the lowest best-effort disk priority,
+            both also raise the nice value. "normal" leaves the thread as it is.
+        cpus (set[int] | None): If given, the CPUs the thread is restricted to (eg. those the server is not pinned to).
+    """
+    if priority == "idle":
+        set_thread_io_priority("idle")
+        set_thread_nice(MAINTENANCE_NICE)
+    elif priority == "low":
+        set_thread_io_priority("best-effort", 7)
+        set_thread_nice(MAINTENANCE_NICE)
+    if cpus:
+        set_thread_cpus(cpus)
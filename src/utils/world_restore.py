@@ -0,0 +1,109 @@
+import os
+import shutil
+import zipfile
+from pathlib import Path, PurePosixPath
+from .backup_formats import detect_archive_format, open_tar_archive
+
+
+# Constants
+EXTRACT_CHUNK_SIZE = 1024 * 1024    # 1MB (in binary)
+
+
+def extract_archive_folder(archive_path, dest_dir):
+    """
+    Extract the single top-level folder of a backup archive into a directory, without the folder's own name.
+    The archive's format (zip, tar_zstd or tar_xz) is detected from its first bytes. Members are streamed to disk in
+    fixed-size chunks, and members that would land outside dest_dir, links and special files are skipped.
+    Args:
+        archive_path (str | Path): The archive, made with the backup folder as its only top-level entry.
+        dest_dir (Path): The directory to extract into, must not exist yet.
+    Returns:
+        tuple[int, int]: The number of files and bytes extracted.
+    Raises:
+        ValueError: If the file is not a backup archive.
+    """
+    archive_format = detect_archive_format(archive_path)
+    if archive_format is None:
+        raise ValueError(f"{Path(archive_path).name}: not a zip, tar.zst or tar.xz archive")
+    dest_dir.mkdir(parents=True)
+    if archive_format == "zip":
+        return _extract_zip(archive_path, dest_dir)
+    return _extract_tar(archive_path, archive_format, dest_dir)
+
+
+def _target_path(name, dest_dir):
+    """Get where an archive member is extracted to, or None if it is the top-level folder or would leave dest_dir."""
+    parts = PurePosixPath(name).parts
+    # Drop the top-level folder, and never follow absolute or parent paths out of the destination
+    relative = parts[1:]
+    if not relative or any(part in ("", "..") for part in relative) or PurePosixPath(name).is_absolute():
+        return None
+    return dest_dir.joinpath(*relative)
+
+
+def _extract_zip(archive_path, dest_dir):
+    """Extract a zip backup, see extract_archive_folder."""
+    files = 0
+    total = 0
+    with zipfile.ZipFile(archive_path) as archive:
+        for info in archive.infolist():
+            target = _target_path(info.filename, dest_dir)
+            if target is None:
+                continue
+            if info.is_dir():
+                target.mkdir(parents=True, exist_ok=True)
+                continue
+            target.parent.mkdir(parents=True, exist_ok=True)
+            with archive.open(info) as source, open(target, "wb") as dest:
+                shutil.copyfileobj(source, dest, EXTRACT_CHUNK_SIZE)
+            files += 1
+            total += info.file_size
+    return files, total
+
+
+def _extract_tar(archive_path, archive_format, dest_dir):
+    """Extract a compressed tar backup in one pass over the stream, see extract_archive_folder."""
+    files = 0
+    total = 0
+    with open_tar_archive(archive_path, archive_format) as archive:
+        for member in archive:
+            target = _target_path(member.name, dest_dir)
+            if target is None:
+                continue
+            if member.isdir():
+                target.mkdir(parents=True, exist_ok=True)
+                continue
+            # Backups only hold folders and regular files, anything else did not come from a world
+            if not member.isfile():
+                continue
+            target.parent.mkdir(parents=True, exist_ok=True)
+            with archive.extractfile(member) as source, open(target, "wb") as dest:
+                shutil.copyfileobj(source, dest, EXTRACT_CHUNK_SIZE)
+            files += 1
+            total += member.size
+    return files, total
+
+
+def swap_directory(staged_dir, target_dir, aside_dir):
+    """
+    Replace a directory with a staged one using two renames, so the target path always holds a complete directory.
+    Args:
+        staged_dir (Path): The new directory, on the same filesystem as target_dir.
+        target_dir (Path): The directory to replace, it does not have to exist.
+        aside_dir (Path): Where the old directory is moved to, must not exist yet.
+    Returns:
+        bool: True if an old directory was moved to aside_dir, False if target_dir did not exist.
+    Raises:
+        OSError: If either rename fails, in which case the old directory is back at target_dir.
+    """
+    had_target = target_dir.exists()
+    if had_target:
+        os.rename(target_dir, aside_dir)
+    try:
+        os.rename(staged_dir, target_dir)
+    except OSError:
+        # Put the old directory back before reporting the failure
+        if had_target:
+            os.rename(aside_dir, target_dir)
+        raise
+    return had_target